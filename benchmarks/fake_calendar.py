@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import copy
+import itertools
+import json
+from collections import Counter
+from typing import Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+
+class _Response(dict):
+    # Enough of httplib2.Response for HttpError and gcal._error_status.
+    def __init__(self, status: int):
+        super().__init__()
+        self.status = status
+        self.reason = "fake"
+
+
+class _Request:
+    def __init__(self, service: "FakeCalendarService", method: str, fn: Callable[[], object]):
+        self._service = service
+        self._method = method
+        self._fn = fn
+
+    def execute(self):
+        self._service._maybe_throttle(self._method)
+        return self._fn()
+
+
+class _Batch:
+    def __init__(self, service: "FakeCalendarService", callback):
+        self.service = service
+        self.callback = callback
+        self.requests: list[tuple[str, _Request]] = []
+
+    def add(self, request: _Request, request_id: str) -> None:
+        self.requests.append((request_id, request))
+
+    def execute(self) -> None:
+        self.service.calls["batch"] += 1
+        for request_id, request in self.requests:
+            try:
+                response = request.execute()
+            except HttpError as exc:
+                self.callback(request_id, None, exc)
+            else:
+                self.callback(request_id, response, None)
+
+
+class _Events:
+    def __init__(self, service: "FakeCalendarService"):
+        self.service = service
+
+    def list(
+        self,
+        calendarId: str,
+        timeMin: Optional[str] = None,
+        timeMax: Optional[str] = None,
+        pageToken: Optional[str] = None,
+        syncToken: Optional[str] = None,
+        privateExtendedProperty: Optional[str] = None,
+        maxResults: int = 250,
+        **_kwargs,
+    ) -> _Request:
+        return _Request(
+            self.service,
+            "list",
+            lambda: self.service._list(timeMin, timeMax, pageToken, syncToken, privateExtendedProperty, maxResults),
+        )
+
+    def insert(self, calendarId: str, body: dict) -> _Request:
+        return _Request(self.service, "insert", lambda: self.service._insert(body))
+
+    def update(self, calendarId: str, eventId: str, body: dict) -> _Request:
+        return _Request(self.service, "update", lambda: self.service._update(eventId, body))
+
+    def patch(self, calendarId: str, eventId: str, body: dict) -> _Request:
+        return _Request(self.service, "patch", lambda: self.service._patch(eventId, body))
+
+    def delete(self, calendarId: str, eventId: str) -> _Request:
+        return _Request(self.service, "delete", lambda: self.service._delete(eventId))
+
+
+class FakeCalendarService:
+    """In-memory stand-in for the Calendar v3 ``service`` object.
+
+    Covers what ``gcal`` uses: ``events().list/insert/update/patch/delete``
+    with ``.execute()``, batch requests, pagination, ``privateExtendedProperty``
+    filters and sync tokens. ``calls`` counts requests per method, and
+    ``inject_throttling`` makes the next requests fail like an exhausted quota.
+    """
+
+    def __init__(self):
+        self.events_by_id: dict[str, dict] = {}
+        self.calls: Counter[str] = Counter()
+        self.expire_sync_token = False
+        self._ids = itertools.count(1)
+        self._seq = 0
+        self._changed: dict[str, int] = {}
+        self._tombstones: dict[str, int] = {}
+        self._throttled: list[tuple[Optional[str], int, str]] = []
+
+    def events(self) -> _Events:
+        return _Events(self)
+
+    def new_batch_http_request(self, callback=None) -> _Batch:
+        return _Batch(self, callback)
+
+    def reset_calls(self) -> None:
+        self.calls.clear()
+
+    def inject_throttling(
+        self, count: int, method: Optional[str] = None, status: int = 403, reason: str = "rateLimitExceeded"
+    ) -> None:
+        # The next ``count`` requests to ``method`` (any method if None), sent
+        # alone or in a batch, fail with this error.
+        self._throttled.extend([(method, status, reason)] * count)
+
+    def _maybe_throttle(self, method: str) -> None:
+        match = next((i for i, (m, _s, _r) in enumerate(self._throttled) if m in (None, method)), None)
+        if match is None:
+            return
+        _method, status, reason = self._throttled.pop(match)
+        self.calls["throttled"] += 1
+        error = {
+            "code": status,
+            "message": "Rate Limit Exceeded",
+            "errors": [{"domain": "usageLimits", "reason": reason}],
+        }
+        raise HttpError(_Response(status), json.dumps({"error": error}).encode("utf-8"))
+
+    def _touch(self, event_id: str) -> None:
+        self._seq += 1
+        self._changed[event_id] = self._seq
+        self.events_by_id[event_id]["etag"] = f'"{self._seq}"'
+
+    def _list(self, time_min, time_max, page_token, sync_token, private_property, max_results) -> dict:
+        self.calls["list"] += 1
+        if sync_token is not None:
+            if self.expire_sync_token:
+                raise HttpError(_Response(410), b"{}")
+            since = int(sync_token)
+            items = [event for event_id, event in self.events_by_id.items() if self._changed[event_id] > since]
+            items += [
+                {"id": event_id, "status": "cancelled"}
+                for event_id, seq in self._tombstones.items()
+                if seq > since
+            ]
+        else:
+            items = [
+                event
+                for event in self.events_by_id.values()
+                if (time_min is None or event["end"]["dateTime"] > time_min)
+                and (time_max is None or event["start"]["dateTime"] < time_max)
+            ]
+        filters = [private_property] if isinstance(private_property, str) else private_property or []
+        for private_filter in filters:
+            key, value = private_filter.split("=", 1)
+            items = [e for e in items if e.get("extendedProperties", {}).get("private", {}).get(key) == value]
+
+        offset = int(page_token or 0)
+        page = items[offset : offset + max_results]
+        response = {"items": copy.deepcopy(page)}
+        if offset + max_results < len(items):
+            response["nextPageToken"] = str(offset + max_results)
+        else:
+            response["nextSyncToken"] = str(self._seq)
+        return response
+
+    def _insert(self, body: dict) -> dict:
+        self.calls["insert"] += 1
+        event_id = f"evt{next(self._ids)}"
+        self.events_by_id[event_id] = dict(copy.deepcopy(body), id=event_id)
+        self._touch(event_id)
+        return self.events_by_id[event_id]
+
+    def _update(self, event_id: str, body: dict) -> dict:
+        self.calls["update"] += 1
+        if event_id not in self.events_by_id:
+            raise HttpError(_Response(404), b"{}")
+        self.events_by_id[event_id] = dict(copy.deepcopy(body), id=event_id)
+        self._touch(event_id)
+        return self.events_by_id[event_id]
+
+    def _patch(self, event_id: str, body: dict) -> dict:
+        self.calls["patch"] += 1
+        event = self.events_by_id.get(event_id)
+        if event is None:
+            raise HttpError(_Response(404), b"{}")
+        _merge(event, copy.deepcopy(body))
+        self._touch(event_id)
+        return event
+
+    def _delete(self, event_id: str) -> str:
+        self.calls["delete"] += 1
+        if self.events_by_id.pop(event_id, None) is None:
+            raise HttpError(_Response(410), b"{}")
+        self._seq += 1
+        self._changed.pop(event_id, None)
+        self._tombstones[event_id] = self._seq
+        return ""
+
+
+def _merge(target: dict, patch: dict) -> None:
+    # Patch semantics: nested objects merge, None clears a field.
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional
+from zoneinfo import ZoneInfo
+
+from msal_sync.gcal import SyncState, sync_events
+from msal_sync.models import Event
+from msal_sync.parser import PARSER_ENGINES, parse_events_from_html
+from msal_sync.ratelimit import RateLimiter
+from msal_sync.series import DEFAULT_MIN_SERIES_LENGTH
+
+from .fake_calendar import FakeCalendarService
+from .synthetic import iter_weeks
+
+CALENDAR_ID = "bench@example.com"
+RESULTS_DIR = "benchmarks/results"
+
+
+def _measure(setup: Callable[[], object], run: Callable[[object], object], repeat: int) -> dict:
+    # Best wall time over repeat runs, then one more run under tracemalloc for
+    # the peak; setup is excluded from both.
+    best = float("inf")
+    outcome = None
+    for _ in range(max(1, repeat)):
+        prepared = setup()
+        started = time.perf_counter()
+        outcome = run(prepared)
+        best = min(best, time.perf_counter() - started)
+    prepared = setup()
+    tracemalloc.start()
+    try:
+        run(prepared)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_kib": round(peak / 1024, 1), "outcome": outcome}
+
+
+def bench_parse(pages: List[str], tz: ZoneInfo, engine: str, repeat: int) -> dict:
+    def run(_prepared) -> int:
+        return sum(len(parse_events_from_html(html, tz, engine=engine)) for html in pages)
+
+    measured = _measure(lambda: None, run, repeat)
+    events = measured.pop("outcome")
+    measured.update(
+        pages=len(pages),
+        events=events,
+        pages_per_second=round(len(pages) / measured["seconds"], 1),
+        events_per_second=round(events / measured["seconds"], 1),
+    )
+    return measured
+
+
+def _sync(
+    service: FakeCalendarService,
+    events: List[Event],
+    state: Optional[SyncState],
+    batch_size: int,
+    series_min_length: int = 0,
+    limiter: Optional[RateLimiter] = None,
+) -> dict:
+    tz = events[0].start.tzinfo
+    time_min = datetime.combine(min(e.start for e in events).date(), datetime.min.time(), tzinfo=tz)
+    time_max = datetime.combine(max(e.end for e in events).date(), datetime.max.time(), tzinfo=tz)
+    service.reset_calls()
+    result = sync_events(
+        service,
+        CALENDAR_ID,
+        events,
+        time_min,
+        time_max,
+        batch_size=batch_size,
+        state=state,
+        server_filter=state is None,
+        series_min_length=series_min_length,
+        # Benchmarks measure the client, not waiting on a quota.
+        limiter=limiter or RateLimiter(quota_per_minute=10**9, sleep=lambda _seconds: None),
+    )
+    return {"calls": dict(service.calls), "succeeded": result.succeeded, "failed": result.failed}
+
+
+def _seeded(events: List[Event], batch_size: int, series_min_length: int = 0) -> FakeCalendarService:
+    service = FakeCalendarService()
+    _sync(service, events, None, batch_size, series_min_length)
+    return service
+
+
+def _changed(events: List[Event], fraction: float) -> List[Event]:
+    step = max(1, round(1 / fraction)) if fraction > 0 else 0
+    return [
+        Event(e.title, e.start, e.end, e.location, (e.description or "") + "\nИзменено", e.source_id)
+        if step and index % step == 0
+        else e
+        for index, e in enumerate(events)
+    ]
+
+
+def bench_sync(
+    events: List[Event], repeat: int, batch_size: int, changed_fraction: float, series_events: List[Event]
+) -> dict:
+    results = {}
+    state_dir = Path(tempfile.mkdtemp(prefix="msal-bench-"))
+
+    def scenario(name: str, setup: Callable[[], tuple], parsed: List[Event], series_min_length: int = 0) -> None:
+        measured = _measure(
+            setup,
+            lambda prepared: _sync(prepared[0], parsed, prepared[1], batch_size, series_min_length, *prepared[2:]),
+            repeat,
+        )
+        measured.update(measured.pop("outcome"), events=len(parsed))
+        results[name] = measured
+
+    def incremental_setup() -> tuple:
+        service = _seeded(events, batch_size)
+        state = SyncState(str(state_dir / "gcal_state.json"), CALENDAR_ID)
+        _sync(service, events, state, batch_size)
+        return service, state
+
+    scenario("sync.initial", lambda: (FakeCalendarService(), None), events)
+    scenario("sync.steady", lambda: (_seeded(events, batch_size), None), events)
+    scenario("sync.changed", lambda: (_seeded(events, batch_size), None), _changed(events, changed_fraction))
+    scenario("sync.steady_incremental", incremental_setup, events)
+
+    def throttled_setup() -> tuple:
+        # The first list call and a batch's worth of writes hit the quota; the
+        # limiter retries them and narrows later batches.
+        service = FakeCalendarService()
+        service.inject_throttling(1, method="list")
+        service.inject_throttling(batch_size // 2, method="insert", status=429)
+        return service, None, RateLimiter(quota_per_minute=10**9, sleep=lambda _seconds: None)
+
+    scenario("sync.initial_throttled", throttled_setup, events)
+    # Same timetable every week, one event per lesson vs recurring series.
+    scenario("sync.repeating_single", lambda: (FakeCalendarService(), None), series_events)
+    scenario(
+        "sync.repeating_series",
+        lambda: (FakeCalendarService(), None),
+        series_events,
+        series_min_length=DEFAULT_MIN_SERIES_LENGTH,
+    )
+    scenario(
+        "sync.repeating_series_steady",
+        lambda: (_seeded(series_events, batch_size, DEFAULT_MIN_SERIES_LENGTH), None),
+        series_events,
+        series_min_length=DEFAULT_MIN_SERIES_LENGTH,
+    )
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict) -> List[str]:
+    lines = []
+    for name, metrics in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        parts = []
+        for key in ("seconds", "peak_kib"):
+            if before.get(key):
+                parts.append(f"{key} {before[key]} -> {metrics[key]} ({metrics[key] / before[key]:.2f}x)")
+        if "calls" in metrics and metrics["calls"] != before.get("calls"):
+            parts.append(f"calls {before.get('calls')} -> {metrics['calls']}")
+        lines.append(f"{name}: " + "; ".join(parts))
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark parsing and calendar sync against local stand-ins")
+    parser.add_argument("--weeks", type=int, default=16, help="Synthetic weeks to generate")
+    parser.add_argument("--rows", type=int, default=6, help="Lesson rows per week")
+    parser.add_argument("--max-cards", type=int, default=2, help="Maximum cards per day and row")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark (best is kept)")
+    parser.add_argument("--engines", default=",".join(sorted(PARSER_ENGINES)), help="Parser engines to compare")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--changed", type=float, default=0.1, help="Fraction of events changed in sync.changed")
+    parser.add_argument("--output", help=f"Results file (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    tz = ZoneInfo("Europe/Moscow")
+    pages = [html for _f, _t, html in iter_weeks(date(2025, 9, 1), args.weeks, rows=args.rows, max_cards=args.max_cards)]
+    results = {}
+    for engine in args.engines.split(","):
+        results[f"parse.{engine}"] = bench_parse(pages, tz, engine, args.repeat)
+
+    events = [event for html in pages for event in parse_events_from_html(html, tz)]
+    repeating = [
+        event
+        for _f, _t, html in iter_weeks(
+            date(2025, 9, 1), args.weeks, rows=args.rows, max_cards=args.max_cards, repeating=True
+        )
+        for event in parse_events_from_html(html, tz)
+    ]
+    results.update(bench_sync(events, args.repeat, args.batch_size, args.changed, repeating))
+
+    started_at = datetime.now(timezone.utc)
+    report = {
+        "meta": {
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    output = Path(args.output or f"{RESULTS_DIR}/{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    for name, metrics in results.items():
+        extra = metrics.get("calls") or f"{metrics['events_per_second']} events/s"
+        print(f"{name:28} {metrics['seconds'] * 1000:9.1f} ms  peak {metrics['peak_kib']:9.1f} KiB  {extra}")
+    if args.compare:
+        for line in compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8"))):
+            print(line)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator
+
+from msal_sync.config import MONTHS_RU
+
+_MONTH_NAMES = {number: name for name, number in MONTHS_RU.items()}
+_LESSON_TYPES = ["Лекция", "Семинар", "Практическое занятие"]
+_TEACHERS = ["Иванов И.И.", "Петрова А.С.", "Сидоров П.П.", "Кузнецова Е.В."]
+
+
+def _header(start: date) -> str:
+    columns = []
+    for offset in range(7):
+        day = start + timedelta(days=offset)
+        columns.append(
+            f'<div class="table-header-columns"><p>День</p><p>{day.day} {_MONTH_NAMES[day.month]} {day.year}</p></div>'
+        )
+    return f'<div class="table-header">{"".join(columns)}</div>'
+
+
+def _card(rng: random.Random, row: int, index: int, subjects: int) -> str:
+    hour = 9 + row * 2
+    lesson_type = rng.choice(_LESSON_TYPES)
+    remote = '<button title="Удаленное занятие">R</button>' if rng.random() < 0.2 else ""
+    subgroup = '<p class="text-[10px] text-gray">Подгруппы: 1</p>' if rng.random() < 0.3 else ""
+    return (
+        '<div class="rounded shadow-md p-2">'
+        f'<div class="flex"><span>{hour:02d}:00</span> - <span>{hour + 1:02d}:30</span>'
+        f'<span title="{lesson_type}">{lesson_type}</span>{remote}</div>'
+        f'<div class="mb-1 subject"><button><div class="text-left font-bold">Предмет {rng.randint(1, subjects)}'
+        "</div></button></div>"
+        f'<p class="text-[10px] text-gray">Ауд. {rng.randint(100, 400)}</p>{subgroup}'
+        f'<p class="text-[10px]">Корпус {index}</p>'
+        f'<p class="text-[12px] teacher">{rng.choice(_TEACHERS)}</p>'
+        "</div>"
+    )
+
+
+def render_week(start: date, rows: int = 6, max_cards: int = 2, subjects: int = 12, seed: int = 0) -> str:
+    # Same structure the portal renders: a days-schedule root, a header row
+    # with one dated column per day and table-data rows of shadow-md cards.
+    rng = random.Random(seed)
+    body = []
+    for row in range(rows):
+        cells = []
+        for _day in range(7):
+            cards = [_card(rng, row, index, subjects) for index in range(rng.randint(0, max_cards))]
+            cells.append(f'<div class="border cell">{"".join(cards)}</div>')
+        body.append(f'<div class="table-data">{"".join(cells)}</div>')
+    return (
+        "<html><head><title>Расписание</title></head><body>"
+        f'<div class="days-schedule">{_header(start)}{"".join(body)}</div>'
+        "</body></html>"
+    )
+
+
+def iter_weeks(
+    start: date, weeks: int, rows: int = 6, max_cards: int = 2, seed: int = 0, repeating: bool = False
+) -> Iterator[tuple[date, date, str]]:
+    # repeating=True gives every week the same timetable, like a real semester.
+    for index in range(weeks):
+        from_date = start + timedelta(days=7 * index)
+        yield from_date, from_date + timedelta(days=6), render_week(
+            from_date, rows=rows, max_cards=max_cards, seed=seed if repeating else seed + index
+        )
+
+
+def write_archive(out_dir: str, start: date, weeks: int, rows: int = 6, max_cards: int = 2, seed: int = 0) -> int:
+    path = Path(out_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    for from_date, to_date, html in iter_weeks(start, weeks, rows=rows, max_cards=max_cards, seed=seed):
+        (path / f"{from_date.isoformat()}_{to_date.isoformat()}.html").write_text(html, encoding="utf-8")
+    return weeks
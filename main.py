@@ -1,87 +1,195 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/main.py b/main.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..def39045712a6450e4b8a18f00158570f28026c6
---- /dev/null
-+++ b/main.py
-@@ -0,0 +1,77 @@
-+from __future__ import annotations
-+
-+import argparse
-+import logging
-+from datetime import date, datetime, timedelta
-+from pathlib import Path
-+
-+from msal_sync.browser import ensure_login
-+from msal_sync.config import get_settings
-+from msal_sync.gcal import build_service, sync_events
-+from msal_sync.schedule import fetch_schedule_for_week
-+
-+
-+def parse_args() -> argparse.Namespace:
-+    parser = argparse.ArgumentParser(description="Sync MSAL schedule to Google Calendar")
-+    parser.add_argument("--start", type=str, help="Start date YYYY-MM-DD", default=None)
-+    parser.add_argument("--weeks", type=int, default=4, help="Number of weeks to sync")
-+    parser.add_argument("--headful", action="store_true", help="Open browser headful for captcha/2FA")
-+    parser.add_argument("--dry-run", action="store_true", help="Show actions without modifying calendar")
-+    parser.add_argument("--delete-missing", action="store_true", help="Delete events missing from schedule")
-+    return parser.parse_args()
-+
-+
-+def main() -> int:
-+    args = parse_args()
-+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-+
-+    settings = get_settings()
-+    tz = settings.timezone
-+
-+    if args.start:
-+        start_date = date.fromisoformat(args.start)
-+    else:
-+        start_date = datetime.now(tz).date()
-+
-+    Path("artifacts/pages").mkdir(parents=True, exist_ok=True)
-+    Path("artifacts/screenshots").mkdir(parents=True, exist_ok=True)
-+
-+    playwright, browser, context, page = ensure_login(settings, headful=args.headful)
-+
-+    all_events = []
-+    try:
-+        for i in range(args.weeks):
-+            from_date = start_date + timedelta(days=7 * i)
-+            to_date = from_date + timedelta(days=6)
-+            events = fetch_schedule_for_week(page, from_date, to_date, tz)
-+            all_events.extend(events)
-+    finally:
-+        context.storage_state(path=settings.storage_state_path)
-+        context.close()
-+        browser.close()
-+        playwright.stop()
-+
-+    if not all_events:
-+        logging.warning("No events parsed; nothing to sync")
-+        return 0
-+
-+    service = build_service(settings.google_client_secrets, settings.google_token_file)
-+    time_min = datetime.combine(start_date, datetime.min.time(), tzinfo=tz)
-+    time_max = datetime.combine(start_date + timedelta(days=args.weeks * 7), datetime.max.time(), tzinfo=tz)
-+
-+    sync_events(
-+        service=service,
-+        calendar_id=settings.calendar_id,
-+        parsed_events=all_events,
-+        time_min=time_min,
-+        time_max=time_max,
-+        dry_run=args.dry_run,
-+        delete_missing=args.delete_missing,
-+    )
-+
-+    logging.info("Done")
-+    return 0
-+
-+
-+if __name__ == "__main__":
-+    raise SystemExit(main())
- 
-EOF
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from datetime import date
+from functools import partial
+from typing import List
+
+from playwright.async_api import async_playwright
+
+from msal_sync import metrics, ratelimit
+from msal_sync.artifacts import prune_artifacts
+from msal_sync.browser_async import launch_browser
+from msal_sync.config import get_settings
+from msal_sync.daemon import BACKENDS, Account, load_accounts
+from msal_sync.gcal import SyncResult
+from msal_sync.pipeline import DEFAULT_QUEUE_SIZE
+from msal_sync.schedule import DEFAULT_CONCURRENCY
+from msal_sync.sync import (
+    SyncOptions,
+    fetch_account_async,
+    fetch_with_browser,
+    fetch_with_replay,
+    run_sync,
+    run_sync_async,
+    run_sync_streaming,
+    stream_with_browser,
+    stream_with_replay,
 )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sync MSAL schedule to Google Calendar")
+    parser.add_argument("--start", type=str, help="Start date YYYY-MM-DD", default=None)
+    parser.add_argument("--weeks", type=int, default=4, help="Number of weeks to sync")
+    parser.add_argument("--headful", action="store_true", help="Open browser headful for captcha/2FA")
+    parser.add_argument("--dry-run", action="store_true", help="Show actions without modifying calendar")
+    parser.add_argument("--delete-missing", action="store_true", help="Delete events missing from schedule")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Number of browser pages fetching weeks in parallel",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=list(BACKENDS),
+        default="browser",
+        help="Render weeks in Chromium, or replay recorded pages from MSAL_BASE_URL (msal_sync.stub_server)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse and sync each week while the next one is still being fetched",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="Weeks buffered between pipeline stages in --stream mode",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Refetch and resync every week, ignoring the cache")
+    parser.add_argument("--ics", type=str, default=None, help="Also write the fetched weeks to this .ics file")
+    parser.add_argument("--ics-only", action="store_true", help="Only write the --ics feed, skip Google Calendar")
+    parser.add_argument(
+        "--list-mode",
+        choices=["incremental", "filtered", "full"],
+        default="incremental",
+        help="How existing events are read: syncToken deltas, a managed-only server-side query, or a full range listing",
+    )
+    parser.add_argument(
+        "--full-resync",
+        action="store_true",
+        help="Discard the stored calendar sync token and list the whole calendar again",
+    )
+    parser.add_argument(
+        "--series",
+        action="store_true",
+        help="Write lessons repeating weekly as one recurring event instead of one event per week",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Drive Chromium through Playwright's asyncio API, fetching all weeks concurrently",
+    )
+    parser.add_argument(
+        "--accounts",
+        help="JSON accounts file (as for the daemon); sync every account at once in one browser (implies --async)",
+    )
+    parser.add_argument("--state-dir", default="state", help="Directory for per-account state with --accounts")
+    parser.add_argument(
+        "--metrics-file", help="Append timing spans as JSON lines to this file (default: METRICS_FILE)"
+    )
+    args = parser.parse_args()
+    if args.accounts:
+        args.use_async = True
+    if args.use_async and args.stream:
+        parser.error("--stream cannot be combined with --async or --accounts")
+    return args
+
+
+async def sync_accounts(
+    accounts: List[Account], headful: bool = False, concurrency: int = DEFAULT_CONCURRENCY
+) -> int:
+    # One Chromium and one semaphore for every account, so concurrency caps
+    # the pages open across all of them rather than per account.
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async with async_playwright() as playwright:
+        browser = None
+        if any(account.backend == "browser" for account in accounts):
+            browser = await launch_browser(
+                playwright, headful=headful, lean=all(account.settings.lean_browser for account in accounts)
+            )
+
+        async def sync_account(account: Account) -> SyncResult:
+            if account.backend == "replay":
+                fetch = partial(fetch_with_replay, concurrency=account.concurrency)
+                result = await asyncio.to_thread(run_sync, account.settings, account.options, fetch)
+            else:
+                fetch = partial(fetch_account_async, browser, semaphore=semaphore)
+                result = await run_sync_async(account.settings, account.options, fetch)
+            logging.info(
+                "[%s] Sync finished: %d succeeded, %d failed", account.name, result.succeeded, result.failed
+            )
+            await asyncio.to_thread(prune_artifacts, account.settings)
+            return result
+
+        try:
+            results = await asyncio.gather(*(sync_account(a) for a in accounts), return_exceptions=True)
+        finally:
+            if browser is not None:
+                await browser.close()
+
+    failed = 0
+    for account, result in zip(accounts, results):
+        if isinstance(result, BaseException):
+            logging.error("[%s] Sync failed: %s", account.name, result)
+            failed += 1
+    return 1 if failed else 0
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    settings = get_settings()
+    metrics.configure(args.metrics_file or settings.metrics_path)
+    ratelimit.configure(settings.gcal_quota_per_minute, settings.gcal_max_in_flight)
+    options = SyncOptions(
+        start=date.fromisoformat(args.start) if args.start else None,
+        weeks=args.weeks,
+        dry_run=args.dry_run,
+        delete_missing=args.delete_missing,
+        use_cache=not args.no_cache,
+        list_mode=args.list_mode,
+        full_resync=args.full_resync,
+        ics=args.ics,
+        ics_only=args.ics_only,
+        series=args.series,
+    )
+    if args.use_async:
+        if args.accounts:
+            accounts = load_accounts(args.accounts, settings, state_dir=args.state_dir)
+        else:
+            accounts = [
+                Account(
+                    name=settings.account_name,
+                    settings=settings,
+                    options=options,
+                    backend=args.backend,
+                    concurrency=args.concurrency,
+                )
+            ]
+        status = asyncio.run(sync_accounts(accounts, headful=args.headful, concurrency=args.concurrency))
+        metrics.log_summary()
+        logging.info("Done")
+        return status
+    if args.stream:
+        streamer = stream_with_replay if args.backend == "replay" else stream_with_browser
+        stream = partial(streamer, headful=args.headful, concurrency=args.concurrency)
+        run_sync_streaming(settings, options, stream, queue_size=args.queue_size)
+    else:
+        fetcher = fetch_with_replay if args.backend == "replay" else fetch_with_browser
+        fetch = partial(fetcher, headful=args.headful, concurrency=args.concurrency)
+        run_sync(settings, options, fetch)
+    prune_artifacts(settings)
+    metrics.log_summary()
+    logging.info("Done")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import IO, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .cache import html_digest
+
+DEFAULT_RETENTION = timedelta(days=90)
+# Blobs this fresh are never pruned, even when no index line refers to them
+# yet: a writer may be between the blob rename and its index append.
+BLOB_GRACE = timedelta(minutes=10)
+COMPRESSIONS = {"gzip": ".html.gz", "zstd": ".html.zst"}
+
+# Shared by every store instance: the daemon opens one per account and sync,
+# and pruning must not race a concurrent put into the same directory. The
+# lock on <root>/.lock extends that to other processes (cron runs).
+_LOCK = threading.Lock()
+
+
+def _lock_file(fp: IO[str]) -> None:
+    if fcntl is not None:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        return
+    fp.seek(0)
+    while True:
+        try:
+            # LK_LOCK retries for about ten seconds before giving up; keep waiting.
+            msvcrt.locking(fp.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(fp: IO[str]) -> None:
+    if fcntl is not None:
+        fcntl.flock(fp, fcntl.LOCK_UN)
+        return
+    fp.seek(0)
+    msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@dataclass
+class Snapshot:
+    account: str
+    from_date: date
+    to_date: date
+    fetched_at: datetime
+    digest: str
+    blob: str  # path relative to the store root
+
+    def to_dict(self) -> dict:
+        return {
+            "account": self.account,
+            "from": self.from_date.isoformat(),
+            "to": self.to_date.isoformat(),
+            "fetched_at": self.fetched_at.isoformat(),
+            "digest": self.digest,
+            "blob": self.blob,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Snapshot":
+        return cls(
+            account=data["account"],
+            from_date=date.fromisoformat(data["from"]),
+            to_date=date.fromisoformat(data["to"]),
+            fetched_at=datetime.fromisoformat(data["fetched_at"]),
+            digest=data["digest"],
+            blob=data["blob"],
+        )
+
+
+def open_blob(path: str) -> IO[str]:
+    # Text stream over a stored page, decompressing on the fly.
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed; install the zstandard package to read it")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_blob(path: str) -> str:
+    with open_blob(path) as fp:
+        return fp.read()
+
+
+class ArtifactStore:
+    # Week pages are stored once per distinct content under blobs/<aa>/<sha256>
+    # and index.jsonl records every capture as (account, week, fetched_at) -> digest.
+
+    def __init__(self, root: str, compression: str = "gzip"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown artifact compression {compression!r}")
+        if compression == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed; storing artifacts with gzip")
+            compression = "gzip"
+        self.root = Path(root)
+        self.compression = compression
+        self.index_path = self.root / "index.jsonl"
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with _LOCK, open(self.root / ".lock", "a+") as lock_file:
+            _lock_file(lock_file)
+            try:
+                yield
+            finally:
+                _unlock_file(lock_file)
+
+    def _blob_name(self, digest: str) -> Optional[str]:
+        for suffix in COMPRESSIONS.values():
+            name = f"blobs/{digest[:2]}/{digest}{suffix}"
+            if (self.root / name).exists():
+                return name
+        return None
+
+    def _write_blob(self, digest: str, html: str) -> str:
+        name = f"blobs/{digest[:2]}/{digest}{COMPRESSIONS[self.compression]}"
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = html.encode("utf-8")
+        if self.compression == "zstd":
+            data = zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            data = gzip.compress(data, compresslevel=6, mtime=0)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+        return name
+
+    def put(
+        self, html: str, account: str, from_date: date, to_date: date, fetched_at: Optional[datetime] = None
+    ) -> Snapshot:
+        digest = html_digest(html)
+        with self._locked():
+            blob = self._blob_name(digest) or self._write_blob(digest, html)
+            snapshot = Snapshot(
+                account=account,
+                from_date=from_date,
+                to_date=to_date,
+                fetched_at=fetched_at or datetime.now(timezone.utc),
+                digest=digest,
+                blob=blob,
+            )
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.index_path.open("a", encoding="utf-8") as fp:
+                fp.write(json.dumps(snapshot.to_dict()) + "\n")
+        return snapshot
+
+    def snapshots(self) -> List[Snapshot]:
+        if not self.index_path.exists():
+            return []
+        snapshots = []
+        with self.index_path.open(encoding="utf-8") as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+                try:
+                    snapshots.append(Snapshot.from_dict(json.loads(line)))
+                except (ValueError, KeyError) as exc:
+                    logging.warning("Ignoring bad artifact index line: %s", exc)
+        return snapshots
+
+    def latest(
+        self, account: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None
+    ) -> List[Snapshot]:
+        newest: dict[tuple[str, date, date], Snapshot] = {}
+        for snapshot in self.snapshots():
+            if account is not None and snapshot.account != account:
+                continue
+            if start is not None and snapshot.from_date < start:
+                continue
+            if end is not None and snapshot.from_date > end:
+                continue
+            key = (snapshot.account, snapshot.from_date, snapshot.to_date)
+            if key not in newest or snapshot.fetched_at >= newest[key].fetched_at:
+                newest[key] = snapshot
+        return sorted(newest.values(), key=lambda s: (s.from_date, s.account))
+
+    def blob_path(self, snapshot: Snapshot) -> str:
+        return str(self.root / snapshot.blob)
+
+    def open(self, snapshot: Snapshot) -> IO[str]:
+        return open_blob(self.blob_path(snapshot))
+
+    def read(self, snapshot: Snapshot) -> str:
+        with self.open(snapshot) as fp:
+            return fp.read()
+
+    def iter_pages(
+        self, account: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None
+    ) -> Iterator[tuple[Snapshot, IO[str]]]:
+        for snapshot in self.latest(account, start, end):
+            with self.open(snapshot) as fp:
+                yield snapshot, fp
+
+    def prune(self, keep: timedelta = DEFAULT_RETENTION, now: Optional[datetime] = None) -> tuple[int, int]:
+        # Drops captures older than keep, except the newest capture of each
+        # account and week, then deletes blobs no capture refers to once they
+        # are older than BLOB_GRACE. Temporary files of in-flight writes are left.
+        now = now or datetime.now(timezone.utc)
+        grace_cutoff = time.time() - BLOB_GRACE.total_seconds()
+        with self._locked():
+            snapshots = self.snapshots()
+            newest: dict[tuple[str, date, date], Snapshot] = {}
+            for snapshot in sorted(snapshots, key=lambda s: s.fetched_at):
+                newest[(snapshot.account, snapshot.from_date, snapshot.to_date)] = snapshot
+            kept = [
+                s
+                for s in snapshots
+                if now - s.fetched_at <= keep or newest[(s.account, s.from_date, s.to_date)] is s
+            ]
+            if len(kept) < len(snapshots):
+                tmp_path = self.index_path.with_suffix(".jsonl.tmp")
+                with tmp_path.open("w", encoding="utf-8") as fp:
+                    for snapshot in kept:
+                        fp.write(json.dumps(snapshot.to_dict()) + "\n")
+                tmp_path.replace(self.index_path)
+
+            referenced = {s.blob for s in kept}
+            removed_blobs = 0
+            for path in self.root.glob("blobs/*/*"):
+                if path.suffix == ".tmp" or path.relative_to(self.root).as_posix() in referenced:
+                    continue
+                try:
+                    if path.stat().st_mtime > grace_cutoff:
+                        continue
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                removed_blobs += 1
+        return len(snapshots) - len(kept), removed_blobs
+
+    def export(self, pages_dir: str, account: Optional[str] = None) -> int:
+        # Writes the newest capture of each week as plain <from>_<to>.html files,
+        # the layout the stub server and ICS builder read.
+        out = Path(pages_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        count = 0
+        for snapshot, fp in self.iter_pages(account):
+            target = out / f"{snapshot.from_date.isoformat()}_{snapshot.to_date.isoformat()}.html"
+            with target.open("w", encoding="utf-8") as dst:
+                while chunk := fp.read(1 << 16):
+                    dst.write(chunk)
+            count += 1
+        return count
+
+
+class AccountArtifacts:
+    def __init__(self, store: ArtifactStore, account: str):
+        self.store = store
+        self.account = account
+
+    def save(self, html: str, from_date: date, to_date: date) -> Snapshot:
+        return self.store.put(html, self.account, from_date, to_date)
+
+
+def open_artifacts(settings) -> Optional[AccountArtifacts]:
+    if not settings.artifact_store_path:
+        return None
+    return AccountArtifacts(
+        ArtifactStore(settings.artifact_store_path, settings.artifact_compression), settings.account_name
+    )
+
+
+def prune_artifacts(settings) -> None:
+    if not settings.artifact_store_path or settings.artifact_retention_days <= 0:
+        return
+    store = ArtifactStore(settings.artifact_store_path, settings.artifact_compression)
+    dropped, removed = store.prune(timedelta(days=settings.artifact_retention_days))
+    if dropped or removed:
+        logging.info("Artifact retention dropped %d captures and %d blobs", dropped, removed)
+
+
+def main() -> int:
+    from .config import get_settings
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Inspect and maintain the compressed page store")
+    parser.add_argument("--store", default=settings.artifact_store_path or "artifacts/store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_cmd = sub.add_parser("list", help="Show the newest capture of each week")
+    list_cmd.add_argument("--account")
+    export_cmd = sub.add_parser("export", help="Write the newest captures as plain HTML pages")
+    export_cmd.add_argument("--account")
+    export_cmd.add_argument("--pages-dir", default="artifacts/pages")
+    prune_cmd = sub.add_parser("prune", help="Apply the retention policy")
+    prune_cmd.add_argument("--days", type=int, default=settings.artifact_retention_days)
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.store, settings.artifact_compression)
+    if args.command == "list":
+        for snapshot in store.latest(args.account):
+            print(
+                f"{snapshot.account}\t{snapshot.from_date}_{snapshot.to_date}\t"
+                f"{snapshot.fetched_at.isoformat(timespec='seconds')}\t{snapshot.digest[:12]}"
+            )
+    elif args.command == "export":
+        count = store.export(args.pages_dir, args.account)
+        logging.info("Exported %d pages to %s", count, args.pages_dir)
+    else:
+        dropped, removed = store.prune(timedelta(days=args.days))
+        logging.info("Dropped %d captures and %d blobs", dropped, removed)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,86 +1,278 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/msal_sync/browser.py b/msal_sync/browser.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..c98f4623055d09de04254b2dd6e12b87ae7b954e
---- /dev/null
-+++ b/msal_sync/browser.py
-@@ -0,0 +1,76 @@
-+from __future__ import annotations
-+
-+import logging
-+from pathlib import Path
-+from typing import Optional, Tuple
-+
-+from playwright.sync_api import Browser, BrowserContext, Page, Playwright, sync_playwright
-+
-+from .config import Settings
-+
-+LOGIN_URL = "https://lk.msal.ru/auth"
-+
-+
-+def _find_first(page: Page, selectors: list[str]) -> Optional[str]:
-+    for selector in selectors:
-+        el = page.query_selector(selector)
-+        if el:
-+            return selector
-+    return None
-+
-+
-+def create_context(settings: Settings, headful: bool = False) -> Tuple[Playwright, Browser, BrowserContext]:
-+    playwright = sync_playwright().start()
-+    browser = playwright.chromium.launch(headless=not headful)
-+    storage_state = Path(settings.storage_state_path)
-+    context = browser.new_context(storage_state=str(storage_state) if storage_state.exists() else None)
-+    return playwright, browser, context
-+
-+
-+def ensure_login(settings: Settings, headful: bool = False) -> tuple[Playwright, Browser, BrowserContext, Page]:
-+    playwright, browser, context = create_context(settings, headful=headful)
-+    page = context.new_page()
-+    page.goto(LOGIN_URL)
-+
-+    if page.url.startswith(LOGIN_URL):
-+        logging.info("Attempting interactive login...")
-+        login_selector = _find_first(
-+            page,
-+            [
-+                "input[name*='login' i]",
-+                "input[name*='user' i]",
-+                "input[type='email']",
-+                "input[type='text']",
-+            ],
-+        )
-+        password_selector = _find_first(page, ["input[type='password']"])
-+        if not login_selector or not password_selector:
-+            raise RuntimeError("Unable to locate login form fields")
-+
-+        page.fill(login_selector, settings.msal_login)
-+        page.fill(password_selector, settings.msal_password)
-+
-+        submit = page.query_selector("button[type='submit']")
-+        if submit:
-+            submit.click()
-+        else:
-+            page.press(password_selector, "Enter")
-+
-+        page.wait_for_timeout(1000)
-+        page.wait_for_load_state("networkidle")
-+
-+    try:
-+        page.goto("https://lk.msal.ru/schedule", wait_until="networkidle")
-+    except Exception:
-+        logging.error("Navigation to schedule failed; captcha or 2FA may be required")
-+        context.storage_state(path=settings.storage_state_path)
-+        raise
-+
-+    if page.url.startswith(LOGIN_URL):
-+        logging.error("Still on login page; manual intervention may be required")
-+        context.storage_state(path=settings.storage_state_path)
-+        raise RuntimeError("Login failed, captcha/2FA may be required")
-+
-+    logging.info("Login successful, session stored at %s", settings.storage_state_path)
-+    context.storage_state(path=settings.storage_state_path)
-+    return playwright, browser, context, page
- 
-EOF
-)
+from __future__ import annotations
+
+import contextvars
+import logging
+import queue
+import re
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from playwright.sync_api import Browser, BrowserContext, Page, Playwright, Route, sync_playwright
+
+from . import metrics
+from .config import Settings
+from .session import record_session
+
+LOGIN_URL = "https://lk.msal.ru/auth"
+SCHEDULE_URL = "https://lk.msal.ru/schedule"
+
+T = TypeVar("T")
+
+LOGIN_FIELD_SELECTORS = [
+    "input[name*='login' i]",
+    "input[name*='user' i]",
+    "input[type='email']",
+    "input[type='text']",
+]
+PASSWORD_FIELD_SELECTORS = ["input[type='password']"]
+_PASSWORD_INPUT = re.compile(r"<input[^>]+type=[\"']?password", re.IGNORECASE)
+
+# Chromium switches that drop background services the scraper never uses and
+# keep pages in background tabs rendering at full speed for wave fetching.
+LEAN_CHROMIUM_ARGS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--blink-settings=imagesEnabled=false",
+]
+
+
+def _find_first(page: Page, selectors: list[str]) -> Optional[str]:
+    for selector in selectors:
+        el = page.query_selector(selector)
+        if el:
+            return selector
+    return None
+
+
+def _host_matches(host: str, patterns: list[str]) -> bool:
+    return any(host == pattern or host.endswith("." + pattern) for pattern in patterns)
+
+
+class RequestFilter:
+    def __init__(self, blocked_types: list[str], allowed_hosts: list[str], blocked_hosts: list[str]):
+        self.blocked_types = set(blocked_types)
+        self.allowed_hosts = allowed_hosts
+        self.blocked_hosts = blocked_hosts
+        self.blocked: Counter[str] = Counter()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "RequestFilter":
+        return cls(settings.block_resource_types, settings.allowed_hosts, settings.blocked_hosts)
+
+    def should_block(self, resource_type: str, url: str) -> Optional[str]:
+        if resource_type in self.blocked_types:
+            return resource_type
+        host = urlparse(url).hostname
+        if not host:
+            return None
+        if _host_matches(host, self.blocked_hosts):
+            return "denied-host"
+        if self.allowed_hosts and not _host_matches(host, self.allowed_hosts):
+            return "third-party"
+        return None
+
+    def verdict(self, request) -> Optional[str]:
+        reason = self.should_block(request.resource_type, request.url)
+        if reason is not None:
+            self.blocked[reason] += 1
+            metrics.inc("blocked_requests_total", reason=reason)
+            logging.debug("Blocked %s request %s", reason, request.url)
+        return reason
+
+    def __call__(self, route: Route) -> None:
+        if self.verdict(route.request) is None:
+            route.continue_()
+        else:
+            route.abort("blockedbyclient")
+
+
+def launch_browser(playwright: Playwright, headful: bool = False, lean: bool = True) -> Browser:
+    return playwright.chromium.launch(headless=not headful, args=LEAN_CHROMIUM_ARGS if lean else None)
+
+
+def create_context(settings: Settings, headful: bool = False) -> Tuple[Playwright, Browser, BrowserContext]:
+    playwright = sync_playwright().start()
+    browser = launch_browser(playwright, headful=headful, lean=settings.lean_browser)
+    context = new_account_context(browser, settings)
+    return playwright, browser, context
+
+
+def new_account_context(browser: Browser, settings: Settings) -> BrowserContext:
+    storage_state = Path(settings.storage_state_path)
+    context = browser.new_context(storage_state=str(storage_state) if storage_state.exists() else None)
+    if settings.block_resource_types or settings.allowed_hosts or settings.blocked_hosts:
+        context.route("**/*", RequestFilter.from_settings(settings))
+    return context
+
+
+def ensure_login(
+    settings: Settings, headful: bool = False, refresh: bool = False
+) -> tuple[Playwright, Browser, BrowserContext, Page]:
+    playwright, browser, context = create_context(settings, headful=headful)
+    page = login_context(context, settings, refresh=refresh)
+    return playwright, browser, context, page
+
+
+def session_probe_url(settings: Settings) -> str:
+    # SESSION_PROBE_URL overrides the default with an endpoint that enforces
+    # auth on the server (an API route answering 401 or a redirect).
+    return settings.session_probe_url or f"{settings.portal_base_url.rstrip('/')}/schedule"
+
+
+def session_is_valid(context: BrowserContext, probe_url: str) -> bool:
+    # context.request shares the context's cookie jar, so this checks the
+    # stored session with one plain HTTP request instead of rendering the SPA.
+    # A redirect to the login page or a login form in the body means expired.
+    try:
+        response = context.request.get(probe_url, max_redirects=0, timeout=10_000)
+        body = response.text()
+    except Exception as exc:
+        logging.debug("Session probe failed: %s", exc)
+        return False
+    return _probe_accepted(response.status, response.url, body)
+
+
+def _probe_accepted(status: int, url: str, body: str) -> bool:
+    return status == 200 and not url.startswith(LOGIN_URL) and not _PASSWORD_INPUT.search(body)
+
+
+# Login decisions shared with browser_async.py; both files only issue the
+# Playwright calls around them.
+
+
+def _session_reused(settings: Settings) -> None:
+    logging.info("Stored session is still valid; skipping login")
+    record_session(settings.storage_state_path, valid=True)
+
+
+def _finish_login(settings: Settings, url: str) -> None:
+    # Called once the context's cookies are saved to storage_state_path.
+    if url.startswith(LOGIN_URL):
+        logging.error("Still on login page; manual intervention may be required")
+        record_session(settings.storage_state_path, valid=False)
+        raise RuntimeError("Login failed, captcha/2FA may be required")
+    logging.info("Login successful, session stored at %s", settings.storage_state_path)
+    record_session(settings.storage_state_path, valid=True)
+
+
+def login_context(context: BrowserContext, settings: Settings, refresh: bool = False) -> Page:
+    with metrics.span("login", refresh=refresh):
+        return _login(context, settings, refresh)
+
+
+def _fill_login_form(page: Page, settings: Settings) -> None:
+    logging.info("Attempting interactive login...")
+    login_selector = _find_first(page, LOGIN_FIELD_SELECTORS)
+    password_selector = _find_first(page, PASSWORD_FIELD_SELECTORS)
+    if not login_selector or not password_selector:
+        raise RuntimeError("Unable to locate login form fields")
+
+    page.fill(login_selector, settings.msal_login)
+    page.fill(password_selector, settings.msal_password)
+
+    submit = page.query_selector("button[type='submit']")
+    if submit:
+        submit.click()
+    else:
+        page.press(password_selector, "Enter")
+
+    try:
+        page.wait_for_url(lambda url: not url.startswith(LOGIN_URL), timeout=15_000)
+    except Exception:
+        logging.warning("Login form did not redirect; checking the schedule page anyway")
+
+
+def _login(context: BrowserContext, settings: Settings, refresh: bool) -> Page:
+    Path(settings.storage_state_path).parent.mkdir(parents=True, exist_ok=True)
+    if refresh:
+        # Drop the old cookies so the portal issues a fresh session.
+        context.clear_cookies()
+    elif Path(settings.storage_state_path).exists() and (
+        session_is_valid(context, session_probe_url(settings))
+    ):
+        _session_reused(settings)
+        return context.new_page()
+
+    page = context.new_page()
+    page.goto(LOGIN_URL)
+    if page.url.startswith(LOGIN_URL):
+        _fill_login_form(page, settings)
+
+    try:
+        page.goto(SCHEDULE_URL, wait_until="networkidle")
+    except Exception:
+        logging.error("Navigation to schedule failed; captcha or 2FA may be required")
+        context.storage_state(path=settings.storage_state_path)
+        raise
+
+    context.storage_state(path=settings.storage_state_path)
+    _finish_login(settings, page.url)
+    return page
+
+
+class BrowserPool:
+    # Playwright's sync API is bound to the thread that started it, so one
+    # warm Chromium lives on a dedicated thread and other threads submit work
+    # to it. Each job typically opens its own BrowserContext.
+
+    def __init__(self, headful: bool = False, lean: bool = True):
+        self.headful = headful
+        self.lean = lean
+        self._jobs: "queue.Queue[Optional[tuple[Callable[[Browser], object], Future]]]" = queue.Queue()
+        self._ready = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="browser-pool", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    def _run(self) -> None:
+        try:
+            playwright = sync_playwright().start()
+            browser = launch_browser(playwright, headful=self.headful, lean=self.lean)
+        except BaseException as exc:
+            self._startup_error = exc
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(browser))
+                except BaseException as exc:
+                    future.set_exception(exc)
+        finally:
+            browser.close()
+            playwright.stop()
+
+    def submit(self, fn: Callable[[Browser], T]) -> "Future[T]":
+        # Run the job in the caller's context so its metrics keep the account label.
+        context = contextvars.copy_context()
+        future: Future = Future()
+        self._jobs.put((lambda browser: context.run(fn, browser), future))
+        return future
+
+    def close(self) -> None:
+        self._jobs.put(None)
+        self._thread.join()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, Route, async_playwright
+
+from . import metrics
+from .browser import (
+    LEAN_CHROMIUM_ARGS,
+    LOGIN_FIELD_SELECTORS,
+    LOGIN_URL,
+    PASSWORD_FIELD_SELECTORS,
+    SCHEDULE_URL,
+    RequestFilter,
+    _finish_login,
+    _probe_accepted,
+    _session_reused,
+    session_probe_url,
+)
+from .config import Settings
+
+# asyncio counterparts of browser.py on playwright.async_api. Selectors,
+# request filtering and the login decisions come from browser.py; only the
+# Playwright calls are repeated here.
+
+
+async def _find_first(page: Page, selectors: list[str]) -> Optional[str]:
+    for selector in selectors:
+        if await page.query_selector(selector):
+            return selector
+    return None
+
+
+class AsyncRequestFilter(RequestFilter):
+    async def __call__(self, route: Route) -> None:
+        if self.verdict(route.request) is None:
+            await route.continue_()
+        else:
+            await route.abort("blockedbyclient")
+
+
+async def launch_browser(playwright: Playwright, headful: bool = False, lean: bool = True) -> Browser:
+    return await playwright.chromium.launch(headless=not headful, args=LEAN_CHROMIUM_ARGS if lean else None)
+
+
+async def create_context(settings: Settings, headful: bool = False) -> Tuple[Playwright, Browser, BrowserContext]:
+    playwright = await async_playwright().start()
+    browser = await launch_browser(playwright, headful=headful, lean=settings.lean_browser)
+    context = await new_account_context(browser, settings)
+    return playwright, browser, context
+
+
+async def new_account_context(browser: Browser, settings: Settings) -> BrowserContext:
+    storage_state = Path(settings.storage_state_path)
+    context = await browser.new_context(storage_state=str(storage_state) if storage_state.exists() else None)
+    if settings.block_resource_types or settings.allowed_hosts or settings.blocked_hosts:
+        await context.route("**/*", AsyncRequestFilter.from_settings(settings))
+    return context
+
+
+async def ensure_login(
+    settings: Settings, headful: bool = False, refresh: bool = False
+) -> tuple[Playwright, Browser, BrowserContext, Page]:
+    playwright, browser, context = await create_context(settings, headful=headful)
+    page = await login_context(context, settings, refresh=refresh)
+    return playwright, browser, context, page
+
+
+async def session_is_valid(context: BrowserContext, probe_url: str) -> bool:
+    try:
+        response = await context.request.get(probe_url, max_redirects=0, timeout=10_000)
+        body = await response.text()
+    except Exception as exc:
+        logging.debug("Session probe failed: %s", exc)
+        return False
+    return _probe_accepted(response.status, response.url, body)
+
+
+async def login_context(context: BrowserContext, settings: Settings, refresh: bool = False) -> Page:
+    with metrics.span("login", refresh=refresh):
+        return await _login(context, settings, refresh)
+
+
+async def _fill_login_form(page: Page, settings: Settings) -> None:
+    logging.info("Attempting interactive login...")
+    login_selector = await _find_first(page, LOGIN_FIELD_SELECTORS)
+    password_selector = await _find_first(page, PASSWORD_FIELD_SELECTORS)
+    if not login_selector or not password_selector:
+        raise RuntimeError("Unable to locate login form fields")
+
+    await page.fill(login_selector, settings.msal_login)
+    await page.fill(password_selector, settings.msal_password)
+
+    submit = await page.query_selector("button[type='submit']")
+    if submit:
+        await submit.click()
+    else:
+        await page.press(password_selector, "Enter")
+
+    try:
+        await page.wait_for_url(lambda url: not url.startswith(LOGIN_URL), timeout=15_000)
+    except Exception:
+        logging.warning("Login form did not redirect; checking the schedule page anyway")
+
+
+async def _login(context: BrowserContext, settings: Settings, refresh: bool) -> Page:
+    Path(settings.storage_state_path).parent.mkdir(parents=True, exist_ok=True)
+    if refresh:
+        await context.clear_cookies()
+    elif Path(settings.storage_state_path).exists() and (
+        await session_is_valid(context, session_probe_url(settings))
+    ):
+        _session_reused(settings)
+        return await context.new_page()
+
+    page = await context.new_page()
+    await page.goto(LOGIN_URL)
+    if page.url.startswith(LOGIN_URL):
+        await _fill_login_form(page, settings)
+
+    try:
+        await page.goto(SCHEDULE_URL, wait_until="networkidle")
+    except Exception:
+        logging.error("Navigation to schedule failed; captcha or 2FA may be required")
+        await context.storage_state(path=settings.storage_state_path)
+        raise
+
+    await context.storage_state(path=settings.storage_state_path)
+    _finish_login(settings, page.url)
+    return page
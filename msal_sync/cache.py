@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+from . import metrics
+from .models import Event
+from .parser import parse_events_from_html
+
+NEAR_WEEKS_DAYS = 14
+NEAR_TTL = timedelta(hours=1)
+FAR_TTL = timedelta(hours=24)
+
+
+def html_digest(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def _week_key(from_date: date, to_date: date) -> str:
+    return f"{from_date.isoformat()}_{to_date.isoformat()}"
+
+
+def events_digest(events: Iterable[Event], salt: str = "") -> str:
+    # Order-independent digest of a week's lessons as they would be written.
+    digest = hashlib.sha256(salt.encode("utf-8"))
+    for key in sorted(f"{event.source_id}:{event.fingerprint}" for event in events):
+        digest.update(key.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+@dataclass
+class WeekDigests:
+    # Digest of the events last synced to the calendar for each week; weeks
+    # whose parsed content still matches are neither listed nor diffed again.
+    path: str
+    calendar_id: str
+    weeks: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str, calendar_id: str) -> "WeekDigests":
+        digests = cls(path=path, calendar_id=calendar_id)
+        state_file = Path(path)
+        if not state_file.exists():
+            return digests
+        try:
+            data = json.loads(state_file.read_text(encoding="utf-8"))
+        except ValueError as exc:
+            logging.warning("Ignoring unreadable week digests %s: %s", path, exc)
+            return digests
+        if data.get("calendar_id") != calendar_id:
+            logging.info("Week digests belong to calendar %s; resyncing every week", data.get("calendar_id"))
+            return digests
+        digests.weeks = data.get("weeks", {})
+        return digests
+
+    def save(self) -> None:
+        state_file = Path(self.path)
+        state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = state_file.with_name(state_file.name + ".tmp")
+        tmp_file.write_text(json.dumps({"calendar_id": self.calendar_id, "weeks": self.weeks}), encoding="utf-8")
+        tmp_file.replace(state_file)
+
+    def reset(self) -> None:
+        self.weeks = {}
+
+    def unchanged(self, from_date: date, to_date: date, digest: str) -> bool:
+        return self.weeks.get(_week_key(from_date, to_date)) == digest
+
+    def record(self, from_date: date, to_date: date, digest: str) -> None:
+        self.weeks[_week_key(from_date, to_date)] = digest
+
+
+@dataclass
+class CachedWeek:
+    html_hash: str
+    fetched_at: datetime
+    events: List[Event]
+
+
+class ScheduleCache:
+    def __init__(
+        self,
+        path: str,
+        near_ttl: timedelta = NEAR_TTL,
+        far_ttl: timedelta = FAR_TTL,
+        near_days: int = NEAR_WEEKS_DAYS,
+    ):
+        self.path = Path(path)
+        self.near_ttl = near_ttl
+        self.far_ttl = far_ttl
+        self.near_days = near_days
+        self.weeks: dict[str, CachedWeek] = {}
+        self.changed: set[tuple[date, date]] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ScheduleCache":
+        cache = cls(path, **kwargs)
+        if cache.path.exists():
+            try:
+                data = json.loads(cache.path.read_text(encoding="utf-8"))
+            except ValueError as exc:
+                logging.warning("Ignoring unreadable schedule cache %s: %s", path, exc)
+                return cache
+            for key, entry in data.get("weeks", {}).items():
+                cache.weeks[key] = CachedWeek(
+                    html_hash=entry["html_hash"],
+                    fetched_at=datetime.fromisoformat(entry["fetched_at"]),
+                    events=[Event.from_dict(e) for e in entry["events"]],
+                )
+        return cache
+
+    def save(self) -> None:
+        data = {
+            "weeks": {
+                key: {
+                    "html_hash": week.html_hash,
+                    "fetched_at": week.fetched_at.isoformat(),
+                    "events": [e.to_dict() for e in week.events],
+                }
+                for key, week in self.weeks.items()
+            }
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def get(self, from_date: date, to_date: date) -> Optional[CachedWeek]:
+        return self.weeks.get(_week_key(from_date, to_date))
+
+    def ttl_for(self, from_date: date, to_date: date, today: date) -> Optional[timedelta]:
+        if to_date < today:
+            return None  # past weeks are frozen
+        if from_date <= today + timedelta(days=self.near_days):
+            return self.near_ttl
+        return self.far_ttl
+
+    def is_fresh(self, from_date: date, to_date: date, now: Optional[datetime] = None) -> bool:
+        week = self.get(from_date, to_date)
+        if week is None:
+            return False
+        now = now or datetime.now(timezone.utc)
+        ttl = self.ttl_for(from_date, to_date, now.date())
+        return ttl is None or now - week.fetched_at < ttl
+
+    def reuse(self, from_date: date, to_date: date, html: str) -> Optional[List[Event]]:
+        with self._lock:
+            week = self.get(from_date, to_date)
+            if week is None or week.html_hash != html_digest(html):
+                return None
+            week.fetched_at = datetime.now(timezone.utc)
+            return week.events
+
+    def store(self, from_date: date, to_date: date, html: str, events: List[Event]) -> None:
+        with self._lock:
+            self.weeks[_week_key(from_date, to_date)] = CachedWeek(
+                html_hash=html_digest(html),
+                fetched_at=datetime.now(timezone.utc),
+                events=events,
+            )
+            self.changed.add((from_date, to_date))
+
+
+def parse_week(
+    html: str, from_date: date, to_date: date, tz: ZoneInfo, cache: Optional[ScheduleCache] = None
+) -> List[Event]:
+    metrics.observe("page_bytes", len(html))
+    if cache is not None:
+        cached = cache.reuse(from_date, to_date, html)
+        if cached is not None:
+            logging.info("Week %s - %s unchanged, reusing %d cached events", from_date, to_date, len(cached))
+            metrics.inc("weeks_reused_total")
+            return cached
+    with metrics.span("parse", week=from_date.isoformat(), bytes=len(html)) as span:
+        events = parse_events_from_html(html, tz)
+        span.attrs["events"] = len(events)
+    if events:
+        metrics.observe("parse_seconds_per_event", span.seconds / len(events))
+    if cache is not None:
+        cache.store(from_date, to_date, html, events)
+    return events
@@ -1,83 +1,137 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/msal_sync/config.py b/msal_sync/config.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..5e8a1b3d96ddfdb2b10d34105bf41b295f157a14
---- /dev/null
-+++ b/msal_sync/config.py
-@@ -0,0 +1,73 @@
-+from __future__ import annotations
-+
-+import logging
-+import os
-+from dataclasses import dataclass
-+from datetime import date, timedelta
-+from zoneinfo import ZoneInfo
-+
-+from dotenv import load_dotenv
-+
-+load_dotenv()
-+
-+
-+@dataclass
-+class Settings:
-+    msal_login: str
-+    msal_password: str
-+    calendar_id: str
-+    timezone: ZoneInfo
-+    google_client_secrets: str
-+    google_token_file: str
-+    storage_state_path: str = "storage_state.json"
-+
-+
-+MONTHS_RU = {
-+    "января": 1,
-+    "февраля": 2,
-+    "марта": 3,
-+    "апреля": 4,
-+    "мая": 5,
-+    "июня": 6,
-+    "июля": 7,
-+    "августа": 8,
-+    "сентября": 9,
-+    "октября": 10,
-+    "ноября": 11,
-+    "декабря": 12,
-+}
-+
-+
-+def get_timezone() -> ZoneInfo:
-+    tz_name = os.getenv("TIMEZONE", "Europe/Moscow")
-+    try:
-+        return ZoneInfo(tz_name)
-+    except Exception:  # pragma: no cover - defensive fallback
-+        logging.warning("Invalid TIMEZONE %s, falling back to Europe/Moscow", tz_name)
-+        return ZoneInfo("Europe/Moscow")
-+
-+
-+def get_settings() -> Settings:
-+    timezone = get_timezone()
-+    settings = Settings(
-+        msal_login=os.getenv("MSAL_LOGIN", ""),
-+        msal_password=os.getenv("MSAL_PASSWORD", ""),
-+        calendar_id=os.getenv("CALENDAR_ID", "primary"),
-+        timezone=timezone,
-+        google_client_secrets=os.getenv("GOOGLE_CLIENT_SECRETS", "credentials.json"),
-+        google_token_file=os.getenv("GOOGLE_TOKEN_FILE", "token.json"),
-+    )
-+    if not settings.msal_login:
-+        logging.warning("MSAL_LOGIN is not set")
-+    if not settings.msal_password:
-+        logging.warning("MSAL_PASSWORD is not set")
-+    return settings
-+
-+
-+def daterange_weeks(start: date, weeks: int) -> list[tuple[date, date]]:
-+    windows: list[tuple[date, date]] = []
-+    for i in range(weeks):
-+        from_date = start + timedelta(days=7 * i)
-+        to_date = from_date + timedelta(days=6)
-+        windows.append((from_date, to_date))
-+    return windows
- 
-EOF
-)
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_BLOCKED_RESOURCE_TYPES = ("image", "media", "font", "stylesheet")
+DEFAULT_ALLOWED_HOSTS = ("msal.ru",)
+
+
+@dataclass
+class Settings:
+    msal_login: str
+    msal_password: str
+    calendar_id: str
+    timezone: ZoneInfo
+    google_client_secrets: str
+    google_token_file: str
+    storage_state_path: str = "storage_state.json"
+    session_probe_url: str = ""
+    gcal_batch_size: int = 50
+    portal_base_url: str = "https://lk.msal.ru"
+    schedule_cache_path: str = "artifacts/schedule_cache.json"
+    gcal_state_path: str = "gcal_state.json"
+    week_digests_path: str = "week_digests.json"
+    ready_strategy: str = "networkidle"
+    schedule_xhr_pattern: str = ""
+    lean_browser: bool = True
+    block_resource_types: list[str] = field(default_factory=lambda: list(DEFAULT_BLOCKED_RESOURCE_TYPES))
+    allowed_hosts: list[str] = field(default_factory=lambda: list(DEFAULT_ALLOWED_HOSTS))
+    blocked_hosts: list[str] = field(default_factory=list)
+    account_name: str = "default"
+    artifact_store_path: str = "artifacts/store"
+    artifact_compression: str = "gzip"
+    artifact_retention_days: int = 90
+    metrics_path: str = ""
+    event_store_path: str = "artifacts/events.sqlite"
+    gcal_quota_per_minute: int = 600
+    gcal_max_in_flight: int = 50
+
+
+MONTHS_RU = {
+    "января": 1,
+    "февраля": 2,
+    "марта": 3,
+    "апреля": 4,
+    "мая": 5,
+    "июня": 6,
+    "июля": 7,
+    "августа": 8,
+    "сентября": 9,
+    "октября": 10,
+    "ноября": 11,
+    "декабря": 12,
+}
+
+
+def get_timezone() -> ZoneInfo:
+    tz_name = os.getenv("TIMEZONE", "Europe/Moscow")
+    try:
+        return ZoneInfo(tz_name)
+    except Exception:  # pragma: no cover - defensive fallback
+        logging.warning("Invalid TIMEZONE %s, falling back to Europe/Moscow", tz_name)
+        return ZoneInfo("Europe/Moscow")
+
+
+def _env_list(name: str, default: tuple[str, ...]) -> list[str]:
+    value = os.getenv(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def get_parser_engine() -> str:
+    return os.getenv("PARSER_ENGINE", "bs4")
+
+
+def get_settings() -> Settings:
+    timezone = get_timezone()
+    settings = Settings(
+        msal_login=os.getenv("MSAL_LOGIN", ""),
+        msal_password=os.getenv("MSAL_PASSWORD", ""),
+        calendar_id=os.getenv("CALENDAR_ID", "primary"),
+        timezone=timezone,
+        google_client_secrets=os.getenv("GOOGLE_CLIENT_SECRETS", "credentials.json"),
+        google_token_file=os.getenv("GOOGLE_TOKEN_FILE", "token.json"),
+        gcal_batch_size=int(os.getenv("GCAL_BATCH_SIZE", "50")),
+        portal_base_url=os.getenv("MSAL_BASE_URL", "https://lk.msal.ru"),
+        session_probe_url=os.getenv("SESSION_PROBE_URL", ""),
+        schedule_cache_path=os.getenv("SCHEDULE_CACHE_FILE", "artifacts/schedule_cache.json"),
+        gcal_state_path=os.getenv("GCAL_STATE_FILE", "gcal_state.json"),
+        week_digests_path=os.getenv("WEEK_DIGESTS_FILE", "week_digests.json"),
+        ready_strategy=os.getenv("READY_STRATEGY", "networkidle"),
+        schedule_xhr_pattern=os.getenv("SCHEDULE_XHR_PATTERN", ""),
+        lean_browser=os.getenv("LEAN_BROWSER", "1").lower() not in ("0", "false", "no"),
+        block_resource_types=_env_list("BLOCK_RESOURCE_TYPES", DEFAULT_BLOCKED_RESOURCE_TYPES),
+        allowed_hosts=_env_list("ALLOWED_HOSTS", DEFAULT_ALLOWED_HOSTS),
+        blocked_hosts=_env_list("BLOCKED_HOSTS", ()),
+        account_name=os.getenv("ACCOUNT_NAME", "default"),
+        artifact_store_path=os.getenv("ARTIFACT_STORE_DIR", "artifacts/store"),
+        artifact_compression=os.getenv("ARTIFACT_COMPRESSION", "gzip"),
+        artifact_retention_days=int(os.getenv("ARTIFACT_RETENTION_DAYS", "90")),
+        metrics_path=os.getenv("METRICS_FILE", ""),
+        event_store_path=os.getenv("EVENT_STORE_FILE", "artifacts/events.sqlite"),
+        gcal_quota_per_minute=int(os.getenv("GCAL_QUOTA_PER_MINUTE", "600")),
+        gcal_max_in_flight=int(os.getenv("GCAL_MAX_IN_FLIGHT", "50")),
+    )
+    if not settings.msal_login:
+        logging.warning("MSAL_LOGIN is not set")
+    if not settings.msal_password:
+        logging.warning("MSAL_PASSWORD is not set")
+    return settings
+
+
+def daterange_weeks(start: date, weeks: int) -> list[tuple[date, date]]:
+    windows: list[tuple[date, date]] = []
+    for i in range(weeks):
+        from_date = start + timedelta(days=7 * i)
+        to_date = from_date + timedelta(days=6)
+        windows.append((from_date, to_date))
+    return windows
+
+
+def contiguous_windows(windows: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    ranges: list[tuple[date, date]] = []
+    for from_date, to_date in sorted(windows):
+        if ranges and from_date <= ranges[-1][1] + timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], to_date))
+        else:
+            ranges.append((from_date, to_date))
+    return ranges
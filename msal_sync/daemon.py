@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from playwright.sync_api import Browser
+
+from . import metrics, ratelimit
+from .artifacts import open_artifacts, prune_artifacts
+from .browser import BrowserPool, login_context, new_account_context
+from .cache import ScheduleCache
+from .config import Settings, get_settings
+from .models import Event
+from .schedule import (
+    DEFAULT_CONCURRENCY,
+    WeekTiming,
+    fetch_schedule_for_weeks,
+    log_timing_summary,
+    readiness_from_settings,
+)
+from .session import DEFAULT_REFRESH_MARGIN, needs_refresh
+from .sync import SyncOptions, Windows, fetch_with_replay, run_sync
+
+DEFAULT_INTERVAL = timedelta(hours=1)
+DEFAULT_WORKERS = 4
+# "replay" reads recorded pages from MSAL_BASE_URL (msal_sync.stub_server).
+BACKENDS = ("browser", "replay")
+
+
+@dataclass
+class Account:
+    name: str
+    settings: Settings
+    options: SyncOptions
+    interval: timedelta = DEFAULT_INTERVAL
+    backend: str = "browser"
+    concurrency: int = DEFAULT_CONCURRENCY
+
+
+def load_accounts(path: str, base: Settings, state_dir: str = "state") -> List[Account]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    entries = data["accounts"] if isinstance(data, dict) else data
+    accounts: List[Account] = []
+    for entry in entries:
+        name = entry["name"]
+        account_dir = Path(state_dir) / name
+        password = entry.get("password")
+        if password is None and entry.get("password_env"):
+            password = os.getenv(entry["password_env"], "")
+        settings = replace(
+            base,
+            msal_login=entry.get("login", base.msal_login),
+            msal_password=password if password is not None else base.msal_password,
+            calendar_id=entry.get("calendar_id", base.calendar_id),
+            google_token_file=entry.get("google_token_file", base.google_token_file),
+            account_name=name,
+            storage_state_path=str(account_dir / "storage_state.json"),
+            schedule_cache_path=str(account_dir / "schedule_cache.json"),
+            gcal_state_path=str(account_dir / "gcal_state.json"),
+            week_digests_path=str(account_dir / "week_digests.json"),
+        )
+        options = SyncOptions(
+            start=date.fromisoformat(entry["start"]) if entry.get("start") else None,
+            weeks=entry.get("weeks", 4),
+            delete_missing=entry.get("delete_missing", False),
+            dry_run=entry.get("dry_run", False),
+            list_mode=entry.get("list_mode", "incremental"),
+            ics=entry.get("ics"),
+            ics_only=entry.get("ics_only", False),
+            series=entry.get("series", False),
+        )
+        accounts.append(
+            Account(
+                name=name,
+                settings=settings,
+                options=options,
+                interval=timedelta(minutes=entry.get("interval_minutes", DEFAULT_INTERVAL.total_seconds() / 60)),
+                backend=entry.get("backend", "browser"),
+                concurrency=entry.get("concurrency", DEFAULT_CONCURRENCY),
+            )
+        )
+    for account in accounts:
+        if account.backend not in BACKENDS:
+            raise ValueError(f"Account {account.name}: backend must be one of {', '.join(BACKENDS)}")
+    names = [account.name for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError("Account names must be unique")
+    return accounts
+
+
+def _browser_fetch(
+    browser: Browser,
+    settings: Settings,
+    windows: Windows,
+    cache: Optional[ScheduleCache],
+    concurrency: int,
+    refresh: bool = False,
+) -> List[Event]:
+    context = new_account_context(browser, settings)
+    timings: List[WeekTiming] = []
+    try:
+        page = login_context(context, settings, refresh=refresh)
+        return fetch_schedule_for_weeks(
+            context,
+            windows,
+            settings.timezone,
+            concurrency=concurrency,
+            page=page,
+            cache=cache,
+            readiness=readiness_from_settings(settings),
+            timings=timings,
+            artifacts=open_artifacts(settings),
+        )
+    finally:
+        log_timing_summary(timings)
+        context.storage_state(path=settings.storage_state_path)
+        context.close()
+
+
+class SyncDaemon:
+    def __init__(
+        self,
+        accounts: List[Account],
+        workers: int = DEFAULT_WORKERS,
+        headful: bool = False,
+        refresh_margin: timedelta = DEFAULT_REFRESH_MARGIN,
+    ):
+        self.accounts = accounts
+        self.refresh_margin = refresh_margin
+        self.pool = BrowserPool(headful=headful, lean=all(account.settings.lean_browser for account in accounts))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sync")
+        self.next_run: dict[str, datetime] = {}
+        self.running: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _fetcher(self, account: Account):
+        if account.backend == "replay":
+
+            def fetch(settings: Settings, windows: Windows, cache: Optional[ScheduleCache]) -> List[Event]:
+                return fetch_with_replay(settings, windows, cache, concurrency=account.concurrency)
+
+            return fetch
+
+        refresh = Path(account.settings.storage_state_path).exists() and needs_refresh(
+            account.settings.storage_state_path, self.refresh_margin
+        )
+        if refresh:
+            logging.info("[%s] Session expires soon; logging in again", account.name)
+
+        def fetch(settings: Settings, windows: Windows, cache: Optional[ScheduleCache]) -> List[Event]:
+            return self.pool.submit(
+                lambda browser: _browser_fetch(browser, settings, windows, cache, account.concurrency, refresh)
+            ).result()
+
+        return fetch
+
+    def sync_account(self, account: Account) -> None:
+        logging.info("[%s] Sync started", account.name)
+        result = run_sync(account.settings, account.options, self._fetcher(account))
+        logging.info(
+            "[%s] Sync finished: %d succeeded, %d failed", account.name, result.succeeded, result.failed
+        )
+        prune_artifacts(account.settings)
+
+    def _submit_due(self, now: datetime) -> None:
+        submitted = []
+        with self._lock:
+            for account in self.accounts:
+                if account.name in self.running or self.next_run.get(account.name, now) > now:
+                    continue
+                future = self.executor.submit(self.sync_account, account)
+                self.running[account.name] = future
+                submitted.append((account, future))
+        # Outside the lock: a future that is already done runs its callback here.
+        for account, future in submitted:
+            future.add_done_callback(lambda f, account=account: self._finished(account, f))
+
+    def _finished(self, account: Account, future: Future) -> None:
+        # Runs on a worker thread while run() reads the same dicts.
+        exc = future.exception()
+        if exc is not None:
+            logging.error("[%s] Sync failed: %s", account.name, exc)
+        with self._lock:
+            self.next_run[account.name] = datetime.now(timezone.utc) + account.interval
+            self.running.pop(account.name, None)
+
+    def run(self, once: bool = False) -> None:
+        try:
+            while not self._stop.is_set():
+                now = datetime.now(timezone.utc)
+                self._submit_due(now)
+                if once:
+                    with self._lock:
+                        pending = list(self.running.values())
+                    for future in pending:
+                        future.exception()
+                    break
+                with self._lock:
+                    upcoming = [t for name, t in self.next_run.items() if name not in self.running]
+                wait = min(upcoming, default=now + timedelta(seconds=30)) - now
+                self._stop.wait(timeout=min(max(wait.total_seconds(), 1.0), 30.0))
+        finally:
+            self.executor.shutdown(wait=True)
+            self.pool.close()
+
+    def stop(self, *_args) -> None:
+        self._stop.set()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Sync several MSAL accounts on intervals with one shared browser")
+    parser.add_argument("--accounts", default="accounts.json", help="JSON file with accounts and calendar targets")
+    parser.add_argument("--state-dir", default="state", help="Directory for per-account sessions and caches")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Maximum concurrent account syncs")
+    parser.add_argument("--headful", action="store_true", help="Open browser headful for captcha/2FA")
+    parser.add_argument("--once", action="store_true", help="Sync every account once and exit")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this port (0: off)")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Address for the metrics endpoint")
+    parser.add_argument(
+        "--metrics-file", help="Append timing spans as JSON lines to this file (default: METRICS_FILE)"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(threadName)s %(message)s")
+
+    settings = get_settings()
+    metrics.configure(args.metrics_file or settings.metrics_path)
+    # One limiter for all accounts: they share the OAuth project's quota.
+    ratelimit.configure(settings.gcal_quota_per_minute, settings.gcal_max_in_flight)
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_host, args.metrics_port)
+    accounts = load_accounts(args.accounts, settings, state_dir=args.state_dir)
+    daemon = SyncDaemon(accounts, workers=args.workers, headful=args.headful)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    logging.info("Daemon started with %d accounts and %d workers", len(accounts), args.workers)
+    daemon.run(once=args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Hashable, Iterable, Iterator, List, Optional
+from zoneinfo import ZoneInfo
+
+from .artifacts import ArtifactStore, Snapshot, read_blob
+from .models import Event
+from .parser import ParseError, parse_events_from_html
+
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+ROOM_CHANGED = "room-changed"
+TEACHER_CHANGED = "teacher-changed"
+DETAILS_CHANGED = "details-changed"
+KINDS = (ADDED, REMOVED, MOVED, ROOM_CHANGED, TEACHER_CHANGED, DETAILS_CHANGED)
+
+TEACHER_PREFIX = "Преподаватель: "
+LESSON_TYPE_PREFIX = "Тип: "
+# A paired lesson is classified by the first of its changed fields in this order.
+_KIND_BY_FIELD = (
+    ("time", MOVED),
+    ("location", ROOM_CHANGED),
+    ("teacher", TEACHER_CHANGED),
+    ("details", DETAILS_CHANGED),
+)
+
+
+def _detail(event: Event, prefix: str) -> Optional[str]:
+    for line in (event.description or "").splitlines():
+        if line.startswith(prefix):
+            return line[len(prefix) :].strip()
+    return None
+
+
+def teacher_of(event: Event) -> Optional[str]:
+    return _detail(event, TEACHER_PREFIX)
+
+
+def _other_details(event: Event) -> list[str]:
+    return [line for line in (event.description or "").splitlines() if not line.startswith(TEACHER_PREFIX)]
+
+
+def _span(event: Event) -> str:
+    return f"{event.start:%d.%m %H:%M}-{event.end:%H:%M}"
+
+
+@dataclass(frozen=True)
+class Change:
+    kind: str
+    old: Optional[Event]
+    new: Optional[Event]
+    fields: tuple[str, ...] = ()
+
+    @property
+    def event(self) -> Event:
+        return self.new if self.new is not None else self.old
+
+    def describe(self) -> str:
+        event = self.event
+        if self.kind in (ADDED, REMOVED):
+            return f"{self.kind} {event.title} {_span(event)} ({event.location or '-'})"
+        old, new = self.old, self.new
+        parts = []
+        if "time" in self.fields:
+            parts.append(f"{_span(old)} -> {_span(new)}")
+        else:
+            parts.append(_span(new))
+        if "location" in self.fields:
+            parts.append(f"room {old.location or '-'} -> {new.location or '-'}")
+        if "teacher" in self.fields:
+            parts.append(f"teacher {teacher_of(old) or '-'} -> {teacher_of(new) or '-'}")
+        if "details" in self.fields:
+            parts.append("details changed")
+        return f"{self.kind} {event.title}: " + ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "fields": list(self.fields),
+            "old": self.old.to_dict() if self.old is not None else None,
+            "new": self.new.to_dict() if self.new is not None else None,
+        }
+
+
+def _paired(old: Event, new: Event) -> Optional[Change]:
+    fields = []
+    if old.start != new.start or old.end != new.end:
+        fields.append("time")
+    if (old.location or "") != (new.location or ""):
+        fields.append("location")
+    if teacher_of(old) != teacher_of(new):
+        fields.append("teacher")
+    if _other_details(old) != _other_details(new):
+        fields.append("details")
+    if not fields:
+        return None
+    kind = next(kind for field, kind in _KIND_BY_FIELD if field in fields)
+    return Change(kind, old, new, tuple(fields))
+
+
+def _slot_key(event: Event) -> Hashable:
+    return event.title, event.start, event.end
+
+
+def _lesson_key(event: Event) -> Hashable:
+    return event.title, _detail(event, LESSON_TYPE_PREFIX), teacher_of(event)
+
+
+def _title_key(event: Event) -> Hashable:
+    return event.title
+
+
+def _match(
+    old: List[Event], new: List[Event], key: Callable[[Event], Hashable], changes: List[Change]
+) -> tuple[List[Event], List[Event]]:
+    # Pairs leftovers sharing a key in the order given, so with start-ordered
+    # input each moved lesson pairs with the nearest candidate first.
+    buckets: dict[Hashable, deque[Event]] = defaultdict(deque)
+    for event in old:
+        buckets[key(event)].append(event)
+    unmatched_new = []
+    for event in new:
+        bucket = buckets.get(key(event))
+        if not bucket:
+            unmatched_new.append(event)
+            continue
+        change = _paired(bucket.popleft(), event)
+        if change is not None:
+            changes.append(change)
+    return [event for bucket in buckets.values() for event in bucket], unmatched_new
+
+
+def diff_events(old: Iterable[Event], new: Iterable[Event]) -> List[Change]:
+    """Typed changes between two snapshots of the same lessons.
+
+    Lessons are paired by ``source_id`` first. As the id covers date, time,
+    subject and room, the rest are paired by subject and time (a room change),
+    then by subject, lesson type and teacher, then by subject alone (a move).
+    What is left over was added or removed. Each pass is a dict lookup per
+    lesson, so the cost grows linearly with the snapshot size.
+    """
+    old_by_id = {event.source_id: event for event in old}
+    changes: List[Change] = []
+    unmatched_new: List[Event] = []
+    for event in new:
+        previous = old_by_id.pop(event.source_id, None)
+        if previous is None:
+            unmatched_new.append(event)
+        elif previous.fingerprint != event.fingerprint and (change := _paired(previous, event)) is not None:
+            changes.append(change)
+    unmatched_old = sorted(old_by_id.values(), key=lambda event: event.start)
+    unmatched_new.sort(key=lambda event: event.start)
+    for key in (_slot_key, _lesson_key, _title_key):
+        if not unmatched_old or not unmatched_new:
+            break
+        unmatched_old, unmatched_new = _match(unmatched_old, unmatched_new, key, changes)
+    changes.extend(Change(REMOVED, event, None) for event in unmatched_old)
+    changes.extend(Change(ADDED, None, event) for event in unmatched_new)
+    changes.sort(key=lambda change: (change.event.start, KINDS.index(change.kind)))
+    return changes
+
+
+@dataclass
+class WeekDiff:
+    account: str
+    from_date: date
+    to_date: date
+    before: datetime  # first capture of the older content
+    after: datetime  # first capture of the newer content
+    changes: List[Change]
+
+    def to_dicts(self) -> Iterator[dict]:
+        for change in self.changes:
+            yield {
+                "account": self.account,
+                "week": self.from_date.isoformat(),
+                "before": self.before.isoformat(),
+                "after": self.after.isoformat(),
+                **change.to_dict(),
+            }
+
+
+def _distinct_captures(snapshots: List[Snapshot]) -> List[Snapshot]:
+    # Consecutive captures of the same page collapse into the first one.
+    distinct: List[Snapshot] = []
+    for snapshot in sorted(snapshots, key=lambda s: s.fetched_at):
+        if not distinct or distinct[-1].digest != snapshot.digest:
+            distinct.append(snapshot)
+    return distinct
+
+
+def archive_history(
+    store: ArtifactStore,
+    tz: ZoneInfo,
+    account: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    since: Optional[datetime] = None,
+    latest: bool = False,
+    engine: Optional[str] = None,
+) -> Iterator[WeekDiff]:
+    """Diff consecutive captures of every week in the page archive.
+
+    Only pages whose content differs from the previous capture are parsed, and
+    only the previous week's events are held, so a pass over the archive is
+    linear in the number of captures. ``since`` starts from the last capture
+    before that moment; ``latest`` only compares the two newest versions of
+    each week. Lessons moved to another week show up as removed and added.
+    """
+    weeks: dict[tuple[str, date, date], List[Snapshot]] = defaultdict(list)
+    for snapshot in store.snapshots():
+        if account is not None and snapshot.account != account:
+            continue
+        if (start is not None and snapshot.from_date < start) or (end is not None and snapshot.from_date > end):
+            continue
+        weeks[(snapshot.account, snapshot.from_date, snapshot.to_date)].append(snapshot)
+
+    for (week_account, from_date, to_date), snapshots in sorted(weeks.items()):
+        captures = _distinct_captures(snapshots)
+        if latest:
+            captures = captures[-2:]
+        elif since is not None:
+            first_new = next((i for i, s in enumerate(captures) if s.fetched_at >= since), len(captures))
+            captures = captures[max(0, first_new - 1) :]
+        previous: Optional[tuple[Snapshot, List[Event]]] = None
+        for snapshot in captures:
+            try:
+                events = parse_events_from_html(store.read(snapshot), tz, engine=engine)
+            except (OSError, RuntimeError, ParseError) as exc:
+                logging.warning("Skipping capture %s of %s: %s", snapshot.digest[:12], from_date, exc)
+                continue
+            if previous is not None:
+                changes = diff_events(previous[1], events)
+                if changes:
+                    before = previous[0].fetched_at
+                    yield WeekDiff(week_account, from_date, to_date, before, snapshot.fetched_at, changes)
+            previous = snapshot, events
+
+
+def load_events(path: str, tz: ZoneInfo, engine: Optional[str] = None) -> List[Event]:
+    # A saved page (plain or compressed) or a JSON-lines export from reparse.
+    if ".jsonl" in path:
+        from .reparse import read_events_file
+
+        return list(read_events_file(path))
+    return parse_events_from_html(read_blob(path), tz, engine=engine)
+
+
+def _print_changes(changes: List[Change], as_json: bool, prefix: str = "") -> None:
+    for change in changes:
+        if as_json:
+            print(json.dumps(change.to_dict(), ensure_ascii=False))
+        else:
+            print(prefix + change.describe())
+
+
+def main() -> int:
+    from .config import get_parser_engine, get_settings
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Show timetable changes between schedule snapshots")
+    parser.add_argument("--json", action="store_true", help="One JSON object per change")
+    parser.add_argument("--engine", help="Parser engine (default: PARSER_ENGINE)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    files_cmd = sub.add_parser("files", help="Compare two saved pages or reparse exports")
+    files_cmd.add_argument("old")
+    files_cmd.add_argument("new")
+    history_cmd = sub.add_parser("history", help="Changes between consecutive captures in the page store")
+    history_cmd.add_argument("--store", default=settings.artifact_store_path or "artifacts/store")
+    history_cmd.add_argument("--account")
+    history_cmd.add_argument("--start", type=date.fromisoformat, help="Skip weeks before this date (YYYY-MM-DD)")
+    history_cmd.add_argument("--end", type=date.fromisoformat, help="Skip weeks starting after this date")
+    history_cmd.add_argument("--since", help="Only changes first seen at or after this ISO date or datetime")
+    history_cmd.add_argument("--latest", action="store_true", help="Only the newest change of each week")
+    args = parser.parse_args()
+
+    tz = settings.timezone
+    engine = args.engine or get_parser_engine()
+    if args.command == "files":
+        changes = diff_events(load_events(args.old, tz, engine), load_events(args.new, tz, engine))
+        _print_changes(changes, args.json)
+        logging.info("%d changes", len(changes))
+        return 0
+
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=tz)
+    store = ArtifactStore(args.store, settings.artifact_compression)
+    total = 0
+    for week in archive_history(store, tz, args.account, args.start, args.end, since, args.latest, engine):
+        total += len(week.changes)
+        if args.json:
+            for record in week.to_dicts():
+                print(json.dumps(record, ensure_ascii=False))
+            continue
+        print(f"{week.account} {week.from_date}_{week.to_date} {week.after.astimezone(tz):%Y-%m-%d %H:%M}")
+        _print_changes(week.changes, False, prefix="  ")
+    logging.info("%d changes", total)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
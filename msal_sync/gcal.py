@@ -1,131 +1,608 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/msal_sync/gcal.py b/msal_sync/gcal.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..39bcda51989664f1eb54c7202445fd3af7da9717
---- /dev/null
-+++ b/msal_sync/gcal.py
-@@ -0,0 +1,121 @@
-+from __future__ import annotations
-+
-+import datetime as dt
-+import logging
-+from typing import List
-+
-+from google.auth.transport.requests import Request
-+from google.oauth2.credentials import Credentials
-+from google_auth_oauthlib.flow import InstalledAppFlow
-+from googleapiclient.discovery import build
-+
-+from .models import Event
-+from .utils import events_equal
-+
-+SCOPES = ["https://www.googleapis.com/auth/calendar"]
-+
-+
-+def _load_credentials(client_secrets_file: str, token_file: str) -> Credentials:
-+    creds = None
-+    if token_file:
-+        try:
-+            creds = Credentials.from_authorized_user_file(token_file, SCOPES)
-+        except Exception:
-+            creds = None
-+    if not creds or not creds.valid:
-+        if creds and creds.expired and creds.refresh_token:
-+            creds.refresh(Request())
-+        else:
-+            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, SCOPES)
-+            creds = flow.run_local_server(port=0)
-+        with open(token_file, "w") as token:
-+            token.write(creds.to_json())
-+    return creds
-+
-+
-+def build_service(client_secrets_file: str, token_file: str):
-+    creds = _load_credentials(client_secrets_file, token_file)
-+    return build("calendar", "v3", credentials=creds)
-+
-+
-+def fetch_existing_events(service, calendar_id: str, time_min: dt.datetime, time_max: dt.datetime) -> dict[str, dict]:
-+    logging.info("Fetching existing events from %s to %s", time_min, time_max)
-+    events: dict[str, dict] = {}
-+    page_token = None
-+    while True:
-+        events_result = (
-+            service.events()
-+            .list(
-+                calendarId=calendar_id,
-+                timeMin=time_min.isoformat(),
-+                timeMax=time_max.isoformat(),
-+                singleEvents=True,
-+                showDeleted=False,
-+                maxResults=2500,
-+                pageToken=page_token,
-+            )
-+            .execute()
-+        )
-+        for event in events_result.get("items", []):
-+            props = event.get("extendedProperties", {}).get("private", {})
-+            if props.get("managed_by") == "msal_schedule_sync" and "source_id" in props:
-+                events[props["source_id"]] = event
-+        page_token = events_result.get("nextPageToken")
-+        if not page_token:
-+            break
-+    logging.info("Found %d existing managed events", len(events))
-+    return events
-+
-+
-+def sync_events(
-+    service,
-+    calendar_id: str,
-+    parsed_events: List[Event],
-+    time_min: dt.datetime,
-+    time_max: dt.datetime,
-+    dry_run: bool = False,
-+    delete_missing: bool = False,
-+):
-+    existing = fetch_existing_events(service, calendar_id, time_min, time_max)
-+    actions = []
-+
-+    for event in parsed_events:
-+        body = event.to_gcal_body()
-+        existing_event = existing.get(event.source_id)
-+        if not existing_event:
-+            actions.append(("CREATE", event, body, None))
-+        else:
-+            current = Event(
-+                title=existing_event.get("summary", ""),
-+                start=dt.datetime.fromisoformat(existing_event["start"]["dateTime"]),
-+                end=dt.datetime.fromisoformat(existing_event["end"]["dateTime"]),
-+                location=existing_event.get("location"),
-+                description=existing_event.get("description"),
-+                source_id=event.source_id,
-+            )
-+            if not events_equal(event, current):
-+                actions.append(("UPDATE", event, body, existing_event))
-+
-+    if delete_missing:
-+        managed_ids = {e.source_id for e in parsed_events}
-+        for src_id, existing_event in existing.items():
-+            if src_id not in managed_ids:
-+                actions.append(("DELETE", None, None, existing_event))
-+
-+    for action, event, body, existing_event in actions:
-+        if action == "CREATE":
-+            logging.info("CREATE %s %s-%s", event.title, event.start, event.end)
-+            if not dry_run:
-+                service.events().insert(calendarId=calendar_id, body=body).execute()
-+        elif action == "UPDATE":
-+            logging.info("UPDATE %s %s-%s", event.title, event.start, event.end)
-+            if not dry_run:
-+                service.events().update(calendarId=calendar_id, eventId=existing_event["id"], body=body).execute()
-+        elif action == "DELETE":
-+            summary = existing_event.get("summary", "")
-+            start = existing_event.get("start", {}).get("dateTime")
-+            end = existing_event.get("end", {}).get("dateTime")
-+            logging.info("DELETE %s %s-%s", summary, start, end)
-+            if not dry_run:
-+                service.events().delete(calendarId=calendar_id, eventId=existing_event["id"]).execute()
-+    logging.info("Sync complete. %d actions", len(actions))
- 
-EOF
+from __future__ import annotations
+
+import datetime as dt
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from . import metrics, ratelimit
+from .models import CONTENT_HASH_KEY, MANAGED_BY, Event, event_fingerprint
+from .ratelimit import RateLimiter
+from .series import SERIES_KEY, Series, compress_series, is_series, stored_instances
+
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+STATE_EVENT_FIELDS = (
+    "id",
+    "etag",
+    "summary",
+    "start",
+    "end",
+    "location",
+    "description",
+    "recurrence",
+    "extendedProperties",
 )
+# Only the attributes the diff needs: id for writes, the private properties
+# carrying source_id, content_hash and series instances, and the content
+# fields for events written before content_hash existed.
+EVENT_FIELDS_MASK = "id,etag,summary,start,end,location,description,recurrence,extendedProperties/private"
+LIST_FIELDS = f"nextPageToken,items({EVENT_FIELDS_MASK})"
+SYNC_LIST_FIELDS = f"nextPageToken,nextSyncToken,items(status,{EVENT_FIELDS_MASK})"
+RETRYABLE_STATUSES = {403, 429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 1000
+# events() method each planned action is sent as, for per-verb metrics.
+ACTION_VERBS = {"CREATE": "insert", "UPDATE": "patch", "REPLACE": "update", "DELETE": "delete"}
+
+
+@dataclass
+class SyncResult:
+    succeeded: int = 0
+    failed: int = 0
+    retried: int = 0
+    errors: list[str] = field(default_factory=list)
+    # source_id -> (Google event id, etag) after the sync; None once deleted.
+    calendar_ids: dict[str, Optional[tuple[str, Optional[str]]]] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return self.succeeded + self.failed
+
+    def merge(self, other: "SyncResult") -> None:
+        self.succeeded += other.succeeded
+        self.failed += other.failed
+        self.retried += other.retried
+        self.errors.extend(other.errors)
+        self.calendar_ids.update(other.calendar_ids)
+
+
+@dataclass
+class SyncState:
+    path: str
+    calendar_id: str
+    sync_token: Optional[str] = None
+    events: dict[str, dict] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str, calendar_id: str) -> "SyncState":
+        state = cls(path=path, calendar_id=calendar_id)
+        state_file = Path(path)
+        if not state_file.exists():
+            return state
+        try:
+            data = json.loads(state_file.read_text(encoding="utf-8"))
+        except ValueError as exc:
+            logging.warning("Ignoring unreadable sync state %s: %s", path, exc)
+            return state
+        if data.get("calendar_id") != calendar_id:
+            logging.info("Sync state belongs to calendar %s; starting a full resync", data.get("calendar_id"))
+            return state
+        state.sync_token = data.get("sync_token")
+        state.events = data.get("events", {})
+        return state
+
+    def save(self) -> None:
+        data = {"calendar_id": self.calendar_id, "sync_token": self.sync_token, "events": self.events}
+        state_file = Path(self.path)
+        tmp_file = state_file.with_name(state_file.name + ".tmp")
+        tmp_file.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp_file.replace(state_file)
+
+    def reset(self) -> None:
+        self.sync_token = None
+        self.events = {}
+
+    def apply(self, item: dict) -> None:
+        if item.get("status") == "cancelled":
+            # Deleted events come back without their extended properties.
+            for src_id, known in list(self.events.items()):
+                if known.get("id") == item.get("id"):
+                    del self.events[src_id]
+            return
+        props = item.get("extendedProperties", {}).get("private", {})
+        if props.get("managed_by") == MANAGED_BY and "source_id" in props:
+            self.events[props["source_id"]] = {key: item[key] for key in STATE_EVENT_FIELDS if key in item}
+
+
+def _load_credentials(client_secrets_file: str, token_file: str) -> Credentials:
+    creds = None
+    if token_file:
+        try:
+            creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+        except Exception:
+            creds = None
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        else:
+            flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, SCOPES)
+            creds = flow.run_local_server(port=0)
+        with open(token_file, "w") as token:
+            token.write(creds.to_json())
+    return creds
+
+
+def build_service(client_secrets_file: str, token_file: str):
+    creds = _load_credentials(client_secrets_file, token_file)
+    return build("calendar", "v3", credentials=creds)
+
+
+def _error_status(exc: Exception) -> Optional[int]:
+    if isinstance(exc, HttpError):
+        return exc.resp.status
+    return None
+
+
+def _is_throttled(exc: Exception) -> bool:
+    # 403 also covers permission errors; only rate-limit reasons (or a body
+    # without reasons) count as throttling.
+    status = _error_status(exc)
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    details = getattr(exc, "error_details", None)
+    reasons = {d.get("reason") for d in details if isinstance(d, dict)} if isinstance(details, list) else set()
+    return not reasons or bool(reasons & RATE_LIMIT_REASONS)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    status = _error_status(exc)
+    return status in RETRYABLE_STATUSES and (status != 403 or _is_throttled(exc))
+
+
+def _execute(request, verb: str, limiter: RateLimiter, max_retries: int = DEFAULT_MAX_RETRIES) -> dict:
+    attempt = 0
+    while True:
+        with limiter.slot(), metrics.span("gcal_request", verb=verb, attempt=attempt) as span:
+            try:
+                response = request.execute()
+            except HttpError as exc:
+                span.attrs["http_status"] = exc.resp.status
+                metrics.inc("gcal_requests_total", verb=verb, status=exc.resp.status)
+                if not _is_retryable(exc) or attempt >= max_retries:
+                    raise
+                error = exc
+            else:
+                span.attrs["http_status"] = 200
+                metrics.inc("gcal_requests_total", verb=verb, status=200)
+                limiter.succeeded()
+                return response
+        if _is_throttled(error):
+            limiter.throttled()
+        metrics.inc("gcal_retries_total", verb=verb)
+        delay = 2**attempt
+        logging.warning("Calendar %s failed with %s; retrying in %.1fs", verb, error.resp.status, delay)
+        limiter.pause(delay)
+        attempt += 1
+
+
+def fetch_existing_events(
+    service,
+    calendar_id: str,
+    time_min: dt.datetime,
+    time_max: dt.datetime,
+    server_filter: bool = True,
+    limiter: Optional[RateLimiter] = None,
+) -> dict[str, dict]:
+    limiter = limiter or ratelimit.current()
+    logging.info("Fetching existing events from %s to %s", time_min, time_max)
+    events: dict[str, dict] = {}
+    page_token = None
+    params = {
+        "calendarId": calendar_id,
+        "timeMin": time_min.isoformat(),
+        "timeMax": time_max.isoformat(),
+        # Recurring series come back once, as their master event.
+        "singleEvents": False,
+        "showDeleted": False,
+        "maxResults": 2500,
+    }
+    if server_filter:
+        params["privateExtendedProperty"] = f"managed_by={MANAGED_BY}"
+        params["fields"] = LIST_FIELDS
+    while True:
+        events_result = _execute(service.events().list(pageToken=page_token, **params), "list", limiter)
+        for event in events_result.get("items", []):
+            props = event.get("extendedProperties", {}).get("private", {})
+            if props.get("managed_by") == MANAGED_BY and "source_id" in props:
+                events[props["source_id"]] = event
+        page_token = events_result.get("nextPageToken")
+        if not page_token:
+            break
+    logging.info("Found %d existing managed events", len(events))
+    return events
+
+
+def _list_into_state(service, calendar_id: str, state: SyncState, limiter: RateLimiter) -> None:
+    page_token = None
+    while True:
+        # Recurring masters written by --series are listed as masters, not expanded
+        # into their instances, so each maps to the one managed event it is.
+        params = {
+            "calendarId": calendar_id,
+            "singleEvents": False,
+            "maxResults": 2500,
+            "pageToken": page_token,
+            "fields": SYNC_LIST_FIELDS,
+        }
+        if state.sync_token:
+            params["syncToken"] = state.sync_token
+        events_result = _execute(service.events().list(**params), "list", limiter)
+        for item in events_result.get("items", []):
+            state.apply(item)
+        page_token = events_result.get("nextPageToken")
+        if not page_token:
+            state.sync_token = events_result.get("nextSyncToken")
+            break
+
+
+def _overlaps(event: dict, time_min: dt.datetime, time_max: dt.datetime) -> bool:
+    if is_series(event):
+        days = stored_instances(event)
+        return bool(days) and min(days) <= time_max.date() and max(days) >= time_min.date()
+    start = event.get("start", {}).get("dateTime")
+    end = event.get("end", {}).get("dateTime")
+    if not start or not end:
+        return False
+    return dt.datetime.fromisoformat(end) > time_min and dt.datetime.fromisoformat(start) < time_max
+
+
+def fetch_existing_events_incremental(
+    service,
+    calendar_id: str,
+    time_min: dt.datetime,
+    time_max: dt.datetime,
+    state: SyncState,
+    limiter: Optional[RateLimiter] = None,
+) -> dict[str, dict]:
+    limiter = limiter or ratelimit.current()
+    if state.sync_token:
+        logging.info("Fetching calendar changes since last sync")
+        try:
+            _list_into_state(service, calendar_id, state, limiter)
+        except HttpError as exc:
+            if exc.resp.status != 410:
+                raise
+            logging.warning("Sync token expired (410 Gone); falling back to a full resync")
+            state.reset()
+    if not state.sync_token:
+        logging.info("Performing full calendar sync")
+        state.reset()
+        _list_into_state(service, calendar_id, state, limiter)
+    state.save()
+
+    events = {src_id: event for src_id, event in state.events.items() if _overlaps(event, time_min, time_max)}
+    logging.info("Found %d existing managed events", len(events))
+    return events
+
+
+def _stored_fingerprint(existing_event: dict) -> Optional[str]:
+    return existing_event.get("extendedProperties", {}).get("private", {}).get(CONTENT_HASH_KEY)
+
+
+def _derived_fingerprint(existing_event: dict) -> str:
+    # For events written before content_hash existed. Start and end are
+    # compared as instants, so Google rewriting the offset is not a change.
+    return event_fingerprint(
+        existing_event.get("summary", ""),
+        dt.datetime.fromisoformat(existing_event["start"]["dateTime"]),
+        dt.datetime.fromisoformat(existing_event["end"]["dateTime"]),
+        existing_event.get("location"),
+        existing_event.get("description"),
+    )
+
+
+def _same_instant(existing: dict, value: dt.datetime) -> bool:
+    current = existing.get("dateTime")
+    return current is not None and dt.datetime.fromisoformat(current) == value
+
+
+def _patch_body(event: Event, existing_event: dict) -> dict:
+    # Only the fields that differ, plus the private properties so the new
+    # content_hash is stored. None clears location or description.
+    body = event.to_gcal_body()
+    patch = {"extendedProperties": body["extendedProperties"]}
+    if existing_event.get("summary", "") != event.title:
+        patch["summary"] = body["summary"]
+    if not _same_instant(existing_event.get("start", {}), event.start):
+        patch["start"] = body["start"]
+    if not _same_instant(existing_event.get("end", {}), event.end):
+        patch["end"] = body["end"]
+    if (existing_event.get("location") or "") != (event.location or ""):
+        patch["location"] = body.get("location")
+    if (existing_event.get("description") or "") != (event.description or ""):
+        patch["description"] = body.get("description")
+    return patch
+
+
+def _series_masters(
+    service, calendar_id: str, state: Optional[SyncState], limiter: RateLimiter
+) -> dict[str, dict]:
+    # Every recurring master, not just those overlapping the range, so a series
+    # that ended last week is extended rather than restarted.
+    if state is not None:
+        return {src_id: item for src_id, item in state.events.items() if is_series(item)}
+    masters: dict[str, dict] = {}
+    page_token = None
+    while True:
+        events_result = _execute(
+            service.events().list(
+                calendarId=calendar_id,
+                privateExtendedProperty=[f"managed_by={MANAGED_BY}", f"{SERIES_KEY}=1"],
+                singleEvents=False,
+                maxResults=2500,
+                pageToken=page_token,
+                fields=LIST_FIELDS,
+            ),
+            "list",
+            limiter,
+        )
+        for item in events_result.get("items", []):
+            masters[item["extendedProperties"]["private"]["source_id"]] = item
+        page_token = events_result.get("nextPageToken")
+        if not page_token:
+            return masters
+
+
+def _plan_series(
+    existing: dict[str, dict],
+    parsed_events: List[Event],
+    time_min: dt.datetime,
+    time_max: dt.datetime,
+    delete_missing: bool,
+    min_length: int,
+) -> tuple[list[tuple], List[Event]]:
+    # Returns the actions for recurring masters and the events left to sync one
+    # by one. Runs whenever the calendar holds masters, so a lesson that leaves
+    # a series (or --series being turned off) never ends up written twice.
+    tz = time_min.tzinfo
+    masters = {src_id: item for src_id, item in existing.items() if is_series(item)}
+    if min_length > 0:
+        series, singles = compress_series(parsed_events, tz, min_length, known_series=masters)
+    else:
+        series, singles = [], list(parsed_events)
+    if not series and not masters:
+        return [], singles
+
+    actions: list[tuple] = []
+    parsed_series = {s.series_id: s for s in series}
+    single_ids = {e.source_id for e in singles}
+    range_start, range_end = time_min.date(), time_max.date()
+    for series_id in sorted(parsed_series.keys() | masters.keys()):
+        parsed = parsed_series.get(series_id)
+        master = masters.get(series_id)
+        if master is None:
+            actions.append(("CREATE", parsed, parsed.to_gcal_body(), None))
+            continue
+        # Occurrences outside this sync range are kept as they are.
+        instances = {
+            day: src_id
+            for day, src_id in stored_instances(master).items()
+            if not (delete_missing and range_start <= day <= range_end)
+        }
+        if parsed is not None:
+            instances.update(parsed.instances)
+        instances = {day: src_id for day, src_id in instances.items() if src_id not in single_ids}
+        if not instances:
+            actions.append(("DELETE", None, None, master))
+            continue
+        target = (parsed or Series.from_gcal(master, tz)).with_instances(instances.items())
+        if _stored_fingerprint(master) != target.fingerprint:
+            actions.append(("REPLACE", target, target.to_gcal_body(), master))
+
+    for parsed in series:
+        for src_id in parsed.source_ids:
+            standalone = existing.get(src_id)
+            if standalone is not None and not is_series(standalone):
+                actions.append(("DELETE", None, None, standalone))
+    return actions, singles
+
+
+def _source_ids(event, item: Optional[dict]) -> List[str]:
+    if isinstance(event, Series):
+        return event.source_ids
+    if event is not None:
+        return [event.source_id]
+    if is_series(item):
+        return list(stored_instances(item).values())
+    source_id = item.get("extendedProperties", {}).get("private", {}).get("source_id")
+    return [source_id] if source_id else []
+
+
+def _known_ids(existing: dict[str, dict], parsed_events: List[Event]) -> dict[str, tuple[str, Optional[str]]]:
+    # Calendar ids of parsed lessons that are already in the calendar; series
+    # occurrences map to their master.
+    wanted = {e.source_id for e in parsed_events}
+    ids = {}
+    for item in existing.values():
+        for src_id in _source_ids(None, item):
+            if src_id in wanted:
+                ids[src_id] = (item["id"], item.get("etag"))
+    return ids
+
+
+def _describe(event) -> str:
+    if isinstance(event, Series):
+        first, last = event.instances[0][0], event.instances[-1][0]
+        return (
+            f"{event.title} weekly {event.start_time:%H:%M}-{event.end_time:%H:%M} "
+            f"{first}..{last} ({len(event.instances)} lessons)"
+        )
+    return f"{event.title} {event.start}-{event.end}"
+
+
+def sync_events(
+    service,
+    calendar_id: str,
+    parsed_events: List[Event],
+    time_min: dt.datetime,
+    time_max: dt.datetime,
+    dry_run: bool = False,
+    delete_missing: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    state: Optional[SyncState] = None,
+    server_filter: bool = True,
+    series_min_length: int = 0,
+    limiter: Optional[RateLimiter] = None,
+) -> SyncResult:
+    limiter = limiter or ratelimit.current()
+    if state is not None:
+        existing = fetch_existing_events_incremental(service, calendar_id, time_min, time_max, state, limiter)
+    else:
+        existing = fetch_existing_events(
+            service, calendar_id, time_min, time_max, server_filter=server_filter, limiter=limiter
+        )
+    if series_min_length > 0:
+        for src_id, master in _series_masters(service, calendar_id, state, limiter).items():
+            existing.setdefault(src_id, master)
+    actions, singles = _plan_series(existing, parsed_events, time_min, time_max, delete_missing, series_min_length)
+    unstamped = 0
+
+    for event in singles:
+        existing_event = existing.get(event.source_id)
+        if not existing_event:
+            actions.append(("CREATE", event, event.to_gcal_body(), None))
+            continue
+        stored = _stored_fingerprint(existing_event)
+        if stored == event.fingerprint:
+            continue
+        if stored is None and _derived_fingerprint(existing_event) == event.fingerprint:
+            # Unchanged, but store content_hash once so later runs compare one string.
+            unstamped += 1
+        actions.append(("UPDATE", event, _patch_body(event, existing_event), existing_event))
+    if unstamped:
+        logging.info("Adding content_hash to %d unchanged events written by an older version", unstamped)
+
+    if delete_missing:
+        managed_ids = {e.source_id for e in parsed_events}
+        for src_id, existing_event in existing.items():
+            if src_id not in managed_ids and not is_series(existing_event):
+                actions.append(("DELETE", None, None, existing_event))
+
+    for action, event, body, existing_event in actions:
+        metrics.inc("sync_actions_total", action=action.lower(), dry_run="true" if dry_run else "false")
+        if action == "DELETE":
+            summary = existing_event.get("summary", "")
+            start = existing_event.get("start", {}).get("dateTime")
+            end = existing_event.get("end", {}).get("dateTime")
+            logging.info("DELETE %s %s-%s", summary, start, end)
+        elif action == "UPDATE":
+            changed = sorted(key for key in body if key != "extendedProperties") or ["content_hash"]
+            logging.info("UPDATE %s (%s)", _describe(event), ", ".join(changed))
+        else:
+            logging.info("%s %s", action, _describe(event))
+
+    result = SyncResult()
+    if not dry_run:
+        result = execute_actions(
+            service, calendar_id, actions, batch_size=batch_size, max_retries=max_retries, limiter=limiter
+        )
+        result.calendar_ids = {**_known_ids(existing, parsed_events), **result.calendar_ids}
+        logging.info("Batch results: %d succeeded, %d failed, %d retried", result.succeeded, result.failed, result.retried)
+    logging.info("Sync complete. %d actions", len(actions))
+    return result
+
+
+def _build_request(service, calendar_id: str, action: str, body: Optional[dict], existing_event: Optional[dict]):
+    if action == "CREATE":
+        return service.events().insert(calendarId=calendar_id, body=body)
+    if action == "UPDATE":
+        return service.events().patch(calendarId=calendar_id, eventId=existing_event["id"], body=body)
+    if action == "REPLACE":
+        return service.events().update(calendarId=calendar_id, eventId=existing_event["id"], body=body)
+    if action == "DELETE":
+        return service.events().delete(calendarId=calendar_id, eventId=existing_event["id"])
+    raise ValueError(f"Unknown action '{action}'")
+
+
+def execute_actions(
+    service,
+    calendar_id: str,
+    actions: list[tuple],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    backoff_base: float = 1.0,
+    limiter: Optional[RateLimiter] = None,
+) -> SyncResult:
+    limiter = limiter or ratelimit.current()
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    result = SyncResult()
+    pending = list(range(len(actions)))
+    attempt = 0
+    written: dict[str, tuple[str, Optional[str]]] = {}
+    deleted: set[str] = set()
+    while pending:
+        retry: list[int] = []
+        offset = 0
+        while offset < len(pending):
+            chunk = pending[offset : offset + limiter.batch_size(batch_size)]
+            offset += len(chunk)
+            failures: dict[int, Exception] = {}
+            responses: dict[int, dict] = {}
+
+            def callback(request_id: str, response, exception, failures=failures, responses=responses) -> None:
+                if exception is not None:
+                    failures[int(request_id)] = exception
+                elif isinstance(response, dict):
+                    responses[int(request_id)] = response
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                action, _event, body, existing_event = actions[index]
+                batch.add(_build_request(service, calendar_id, action, body, existing_event), request_id=str(index))
+            with limiter.slot(len(chunk)), metrics.span("gcal_batch", size=len(chunk), attempt=attempt):
+                try:
+                    batch.execute()
+                except HttpError as exc:
+                    for index in chunk:
+                        failures.setdefault(index, exc)
+            if any(_is_throttled(exc) for exc in failures.values()):
+                limiter.throttled()
+            else:
+                limiter.succeeded(len(chunk) - len(failures))
+
+            for index in chunk:
+                exc = failures.get(index)
+                verb = ACTION_VERBS.get(actions[index][0], "unknown")
+                status = 200 if exc is None else _error_status(exc) or "error"
+                metrics.inc("gcal_requests_total", verb=verb, status=status)
+                if exc is None:
+                    result.succeeded += 1
+                    action, event, _body, existing_event = actions[index]
+                    response = responses.get(index, {})
+                    for src_id in _source_ids(event, existing_event):
+                        if action == "DELETE":
+                            deleted.add(src_id)
+                        elif "id" in response:
+                            written[src_id] = (response["id"], response.get("etag"))
+                elif _is_retryable(exc) and attempt < max_retries:
+                    metrics.inc("gcal_retries_total", verb=verb)
+                    retry.append(index)
+                else:
+                    action = actions[index][0]
+                    logging.error("%s failed: %s", action, exc)
+                    result.failed += 1
+                    result.errors.append(f"{action}: {exc}")
+
+        if retry:
+            delay = backoff_base * (2**attempt)
+            logging.warning("Retrying %d throttled or failed requests in %.1fs", len(retry), delay)
+            limiter.pause(delay)
+            result.retried += len(retry)
+            attempt += 1
+        pending = retry
+    # A lesson deleted as a standalone event may live on in a new series.
+    result.calendar_ids = {**{src_id: None for src_id in deleted}, **written}
+    return result
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import itertools
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+from zoneinfo import ZoneInfo
+
+from .models import Event
+
+PRODID = "-//msal-schedule-sync//uni-schedule-ics//RU"
+CRLF = "\r\n"
+
+
+def _escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    # RFC 5545 3.1: lines longer than 75 octets are folded with CRLF + space,
+    # without splitting a UTF-8 sequence.
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + CRLF
+    parts: list[str] = []
+    limit = 75
+    current = ""
+    size = 0
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit:
+            parts.append(current)
+            current = ""
+            size = 0
+            limit = 74  # continuation lines start with a space
+        current += char
+        size += char_size
+    parts.append(current)
+    return (CRLF + " ").join(parts) + CRLF
+
+
+def _format_local(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _format_utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _format_offset(offset: timedelta) -> str:
+    total = int(offset.total_seconds())
+    sign = "+" if total >= 0 else "-"
+    total = abs(total)
+    return f"{sign}{total // 3600:02d}{(total % 3600) // 60:02d}"
+
+
+def _find_transitions(tz: ZoneInfo, start: datetime, end: datetime) -> list[datetime]:
+    transitions: list[datetime] = []
+    step = timedelta(days=1)
+    cursor = start
+    previous = cursor.astimezone(tz).utcoffset()
+    while cursor < end:
+        nxt = cursor + step
+        offset = nxt.astimezone(tz).utcoffset()
+        if offset != previous:
+            low, high = cursor, nxt
+            while high - low > timedelta(minutes=1):
+                mid = low + (high - low) / 2
+                if mid.astimezone(tz).utcoffset() == previous:
+                    low = mid
+                else:
+                    high = mid
+            transitions.append(high.replace(second=0, microsecond=0))
+            previous = offset
+        cursor = nxt
+    return transitions
+
+
+def vtimezone_lines(tz: ZoneInfo, first_year: int, last_year: int) -> Iterator[str]:
+    start = datetime(first_year, 1, 1, tzinfo=timezone.utc)
+    end = datetime(last_year + 1, 1, 1, tzinfo=timezone.utc)
+    yield "BEGIN:VTIMEZONE"
+    yield f"TZID:{tz.key}"
+
+    initial = start.astimezone(tz)
+    periods = [(start, initial.utcoffset(), initial.utcoffset(), initial)]
+    previous_offset = initial.utcoffset()
+    for moment in _find_transitions(tz, start, end):
+        local = moment.astimezone(tz)
+        periods.append((moment, previous_offset, local.utcoffset(), local))
+        previous_offset = local.utcoffset()
+
+    for moment, offset_from, offset_to, local in periods:
+        kind = "DAYLIGHT" if local.dst() else "STANDARD"
+        yield f"BEGIN:{kind}"
+        # DTSTART of an observance is expressed in the offset in effect before it.
+        yield f"DTSTART:{_format_local((moment + offset_from).replace(tzinfo=None))}"
+        yield f"TZOFFSETFROM:{_format_offset(offset_from)}"
+        yield f"TZOFFSETTO:{_format_offset(offset_to)}"
+        name = local.tzname()
+        if name:
+            yield f"TZNAME:{name}"
+        yield f"END:{kind}"
+    yield "END:VTIMEZONE"
+
+
+def vevent_lines(event: Event, tz: ZoneInfo, dtstamp: datetime) -> Iterator[str]:
+    yield "BEGIN:VEVENT"
+    yield f"UID:{event.source_id}"
+    yield f"DTSTAMP:{_format_utc(dtstamp)}"
+    yield f"DTSTART;TZID={tz.key}:{_format_local(event.start.astimezone(tz))}"
+    yield f"DTEND;TZID={tz.key}:{_format_local(event.end.astimezone(tz))}"
+    yield f"SUMMARY:{_escape(event.title)}"
+    if event.location:
+        yield f"LOCATION:{_escape(event.location)}"
+    if event.description:
+        yield f"DESCRIPTION:{_escape(event.description)}"
+    yield "END:VEVENT"
+
+
+def iter_ics(
+    events: Iterable[Event],
+    tz: ZoneInfo,
+    calendar_name: str = "MSAL schedule",
+    years: Optional[tuple[int, int]] = None,
+    dtstamp: Optional[datetime] = None,
+) -> Iterator[str]:
+    """Yield folded VCALENDAR lines for ``events`` without materialising them.
+
+    The VTIMEZONE covers ``years`` (inclusive); by default the year of the
+    first event and the one after it.
+    """
+    dtstamp = dtstamp or datetime.now(timezone.utc)
+    iterator = iter(events)
+    first = next(iterator, None)
+    if years is None:
+        base_year = first.start.year if first is not None else dtstamp.year
+        years = (base_year, base_year + 1)
+
+    header = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(calendar_name)}",
+        f"X-WR-TIMEZONE:{tz.key}",
+    ]
+    for line in itertools.chain(header, vtimezone_lines(tz, *years)):
+        yield _fold(line)
+    if first is not None:
+        for event in itertools.chain([first], iterator):
+            for line in vevent_lines(event, tz, dtstamp):
+                yield _fold(line)
+    yield _fold("END:VCALENDAR")
+
+
+def write_ics(events: Iterable[Event], fp: IO[str], tz: ZoneInfo, **kwargs) -> None:
+    for line in iter_ics(events, tz, **kwargs):
+        fp.write(line)
+
+
+def write_ics_file(events: Iterable[Event], path: str, tz: ZoneInfo, **kwargs) -> None:
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8", newline="") as fp:
+        write_ics(events, fp, tz, **kwargs)
+    tmp_path.replace(target)
+    logging.info("Wrote ICS feed to %s", path)
+
+
+class _FeedFile:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self.body = b""
+        self.gzipped = b""
+        self.etag = ""
+
+    def load(self) -> None:
+        mtime = self.path.stat().st_mtime
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            body = self.path.read_bytes()
+            self.body = body
+            self.gzipped = gzip.compress(body, mtime=0)
+            self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            self._mtime = mtime
+
+
+def make_feed_handler(feed: _FeedFile, max_age: int = 300):
+    class FeedHandler(BaseHTTPRequestHandler):
+        def _respond(self, include_body: bool) -> None:
+            try:
+                feed.load()
+            except FileNotFoundError:
+                self.send_error(404, "Feed not generated yet")
+                return
+            if_none_match = self.headers.get("If-None-Match", "")
+            if feed.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+                self.send_response(304)
+                self.send_header("ETag", feed.etag)
+                self.end_headers()
+                return
+            use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+            body = feed.gzipped if use_gzip else feed.body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/calendar; charset=utf-8")
+            self.send_header("ETag", feed.etag)
+            self.send_header("Cache-Control", f"public, max-age={max_age}")
+            self.send_header("Vary", "Accept-Encoding")
+            if use_gzip:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if include_body:
+                self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            self._respond(include_body=True)
+
+        def do_HEAD(self) -> None:
+            self._respond(include_body=False)
+
+        def log_message(self, format: str, *args) -> None:
+            logging.debug("feed: " + format, *args)
+
+    return FeedHandler
+
+
+def serve_feed(path: str, host: str = "127.0.0.1", port: int = 8080, max_age: int = 300) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), make_feed_handler(_FeedFile(Path(path)), max_age=max_age))
+
+
+def _events_from_pages(pages_dir: str, tz: ZoneInfo, start: Optional[date]) -> Iterator[Event]:
+    from .parser import ParseError, parse_events_from_html
+
+    seen: set[str] = set()
+    for page in sorted(Path(pages_dir).glob("*.html")):
+        if start is not None and page.stem.split("_", 1)[0] < start.isoformat():
+            continue
+        try:
+            events = parse_events_from_html(page.read_text(encoding="utf-8"), tz)
+        except ParseError as exc:
+            logging.warning("Skipping %s: %s", page, exc)
+            continue
+        for event in events:
+            if event.source_id not in seen:
+                seen.add(event.source_id)
+                yield event
+
+
+def main() -> int:
+    from .config import get_timezone
+
+    parser = argparse.ArgumentParser(description="Build or serve an ICS feed of the MSAL schedule")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build", help="Write an ICS feed from saved schedule pages")
+    build_cmd.add_argument("--pages-dir", default="artifacts/pages")
+    build_cmd.add_argument("--start", type=str, default=None, help="Skip weeks before YYYY-MM-DD")
+    build_cmd.add_argument("--output", default="artifacts/schedule.ics")
+    serve_cmd = sub.add_parser("serve", help="Serve an ICS file with ETag and gzip support")
+    serve_cmd.add_argument("--file", default="artifacts/schedule.ics")
+    serve_cmd.add_argument("--host", default="127.0.0.1")
+    serve_cmd.add_argument("--port", type=int, default=8080)
+    serve_cmd.add_argument("--max-age", type=int, default=300)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    if args.command == "build":
+        tz = get_timezone()
+        start = date.fromisoformat(args.start) if args.start else None
+        write_ics_file(_events_from_pages(args.pages_dir, tz, start), args.output, tz)
+        return 0
+
+    server = serve_feed(args.file, args.host, args.port, max_age=args.max_age)
+    logging.info("Serving %s on http://%s:%d", args.file, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import contextvars
+import itertools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+PREFIX = "msal_"
+
+LabelKey = tuple[tuple[str, str], ...]
+
+_account: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("metrics_account", default=None)
+_parent: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("metrics_parent", default=None)
+_span_ids = itertools.count(1)
+
+
+class Registry:
+    # Counters and summaries (count, sum, max) keyed by name and labels, plus
+    # an optional JSON-lines sink that receives every finished span.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[str, dict[LabelKey, float]] = {}
+        self.summaries: dict[str, dict[LabelKey, list[float]]] = {}
+        self._sink: Optional[IO[str]] = None
+
+    def configure(self, path: Optional[str]) -> None:
+        with self._lock:
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
+            if path:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                self._sink = open(path, "a", encoding="utf-8", buffering=1)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            stats = self.summaries.setdefault(name, {}).setdefault(key, [0, 0.0, value])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+
+    def emit(self, record: dict) -> None:
+        if self._sink is None:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._sink is not None:
+                self._sink.write(line + "\n")
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.summaries.clear()
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                lines.extend(f"{PREFIX}{name}{_labels(key)} {value:g}" for key, value in sorted(series.items()))
+            for name, series in sorted(self.summaries.items()):
+                lines.append(f"# TYPE {PREFIX}{name} summary")
+                for key, (count, total, _peak) in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}_count{_labels(key)} {count:g}")
+                    lines.append(f"{PREFIX}{name}_sum{_labels(key)} {total:g}")
+                lines.append(f"# TYPE {PREFIX}{name}_max gauge")
+                for key, (_count, _total, peak) in sorted(series.items()):
+                    lines.append(f"{PREFIX}{name}_max{_labels(key)} {peak:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: dict) -> LabelKey:
+    account = _account.get()
+    if account is not None:
+        labels.setdefault("account", account)
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+REGISTRY = Registry()
+
+
+class Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.seconds = 0.0
+
+
+def configure(path: Optional[str]) -> None:
+    REGISTRY.configure(path)
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    REGISTRY.observe(name, value, **labels)
+
+
+@contextmanager
+def bind_account(name: str) -> Iterator[None]:
+    # Labels every metric and span recorded in this context with the account.
+    token = _account.set(name)
+    try:
+        yield
+    finally:
+        _account.reset(token)
+
+
+def record_span(name: str, seconds: float, status: str = "ok", span_id: Optional[int] = None, **attrs) -> None:
+    # Also used directly for work timed elsewhere, e.g. a week whose phases
+    # interleave with other weeks' in a wave.
+    REGISTRY.observe("span_seconds", seconds, span=name, status=status)
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "span": name,
+        "id": span_id if span_id is not None else next(_span_ids),
+        "parent": _parent.get(),
+        "seconds": round(seconds, 6),
+        "status": status,
+    }
+    account = _account.get()
+    if account is not None:
+        record["account"] = account
+    record.update(attrs)
+    REGISTRY.emit(record)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time a block as a span; nested spans record their parent's id.
+
+    Attributes set on the yielded span's ``attrs`` end up in its JSON line.
+    """
+    current = Span(name, attrs)
+    token = _parent.set(current.span_id)
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        _parent.reset(token)
+        record_span(name, current.seconds, status, current.span_id, **current.attrs)
+
+
+def log_summary() -> None:
+    # One line per run answering "where did the time go".
+    totals: dict[str, float] = {}
+    with REGISTRY._lock:
+        for key, (_count, total, _peak) in REGISTRY.summaries.get("span_seconds", {}).items():
+            name = dict(key)["span"]
+            totals[name] = totals.get(name, 0.0) + total
+    if totals:
+        breakdown = " ".join(f"{name}={seconds:.2f}s" for name, seconds in sorted(totals.items()))
+        logging.info("Time by span: %s", breakdown)
+
+
+def make_metrics_handler(registry: Registry = REGISTRY):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            logging.debug("metrics: " + format, *args)
+
+    return MetricsHandler
+
+
+def serve_metrics(host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_metrics_handler())
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info("Serving Prometheus metrics on http://%s:%d/metrics", host, port)
+    return server
@@ -1,44 +1,81 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/msal_sync/models.py b/msal_sync/models.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..56ddaf496508403383a071f7e25f57b74376fad4
---- /dev/null
-+++ b/msal_sync/models.py
-@@ -0,0 +1,34 @@
-+from __future__ import annotations
-+
-+from dataclasses import dataclass, field
-+from datetime import datetime
-+from typing import Optional
-+
-+
-+@dataclass
-+class Event:
-+    title: str
-+    start: datetime
-+    end: datetime
-+    location: Optional[str]
-+    description: Optional[str]
-+    source_id: str
-+    raw: Optional[dict] = field(default=None)
-+
-+    def to_gcal_body(self) -> dict:
-+        body = {
-+            "summary": self.title,
-+            "start": {"dateTime": self.start.isoformat()},
-+            "end": {"dateTime": self.end.isoformat()},
-+            "extendedProperties": {
-+                "private": {
-+                    "managed_by": "msal_schedule_sync",
-+                    "source_id": self.source_id,
-+                }
-+            },
-+        }
-+        if self.location:
-+            body["location"] = self.location
-+        if self.description:
-+            body["description"] = self.description
-+        return body
- 
-EOF
-)
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+MANAGED_BY = "msal_schedule_sync"
+CONTENT_HASH_KEY = "content_hash"
+
+
+def event_fingerprint(
+    title: str, start: datetime, end: datetime, location: Optional[str], description: Optional[str]
+) -> str:
+    # Instants rather than ISO strings, so the same time in another offset
+    # hashes the same; None and "" are treated alike.
+    parts = [title, str(int(start.timestamp())), str(int(end.timestamp())), location or "", description or ""]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    title: str
+    start: datetime
+    end: datetime
+    location: Optional[str]
+    description: Optional[str]
+    source_id: str
+    _fingerprint: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def fingerprint(self) -> str:
+        # Computed on first use: events only read from the cache or written to
+        # ICS never pay for it.
+        if self._fingerprint is None:
+            object.__setattr__(
+                self,
+                "_fingerprint",
+                event_fingerprint(self.title, self.start, self.end, self.location, self.description),
+            )
+        return self._fingerprint
+
+    def to_gcal_body(self) -> dict:
+        body = {
+            "summary": self.title,
+            "start": {"dateTime": self.start.isoformat()},
+            "end": {"dateTime": self.end.isoformat()},
+            "extendedProperties": {
+                "private": {
+                    "managed_by": MANAGED_BY,
+                    "source_id": self.source_id,
+                    CONTENT_HASH_KEY: self.fingerprint,
+                }
+            },
+        }
+        if self.location:
+            body["location"] = self.location
+        if self.description:
+            body["description"] = self.description
+        return body
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "location": self.location,
+            "description": self.description,
+            "source_id": self.source_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Event":
+        return cls(
+            title=data["title"],
+            start=datetime.fromisoformat(data["start"]),
+            end=datetime.fromisoformat(data["end"]),
+            location=data.get("location"),
+            description=data.get("description"),
+            source_id=data["source_id"],
+        )
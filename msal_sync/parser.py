@@ -1,205 +1,371 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/msal_sync/parser.py b/msal_sync/parser.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..a18a6c09325df8e162936594610f17cb1b13ffdd
---- /dev/null
-+++ b/msal_sync/parser.py
-@@ -0,0 +1,195 @@
-+from __future__ import annotations
-+
-+import logging
-+import re
-+from collections import defaultdict
-+from datetime import date
-+from typing import List, Optional
-+from zoneinfo import ZoneInfo
-+
-+from bs4 import BeautifulSoup
-+
-+from .config import MONTHS_RU
-+from .models import Event
-+from .utils import build_datetime, hash_source
-+
-+DATE_REGEX = re.compile(r"\b\d{1,2}\s+[А-Яа-я]+\s+\d{4}\b")
-+TIME_REGEX = re.compile(r"\b\d{2}:\d{2}\b")
-+
-+
-+class ParseError(Exception):
-+    pass
-+
-+
-+def parse_ru_date(s: str) -> date:
-+    parts = s.strip().split()
-+    if len(parts) != 3:
-+        raise ValueError(f"Cannot parse date from '{s}'")
-+    day_str, month_ru, year_str = parts
-+    day = int(day_str)
-+    year = int(year_str)
-+    month = MONTHS_RU.get(month_ru.lower())
-+    if not month:
-+        raise ValueError(f"Unknown month '{month_ru}' in '{s}'")
-+    return date(year, month, day)
-+
-+
-+def _extract_dates(schedule_root: BeautifulSoup) -> List[date]:
-+    headers = schedule_root.select("div.table-header div.table-header-columns")
-+    dates: List[date] = []
-+    for header in headers:
-+        match = DATE_REGEX.search(header.get_text(" ", strip=True))
-+        if match:
-+            try:
-+                dates.append(parse_ru_date(match.group(0)))
-+            except Exception as exc:
-+                logging.warning("Failed to parse date '%s': %s", match.group(0), exc)
-+    if len(dates) != 7:
-+        logging.warning("Expected 7 dates in header, got %d", len(dates))
-+    return dates
-+
-+
-+def _extract_text(node) -> str:
-+    return node.get_text(" ", strip=True) if node else ""
-+
-+
-+def _extract_times(card) -> Optional[tuple[str, str]]:
-+    times = TIME_REGEX.findall(card.get_text(" ", strip=True))
-+    if len(times) >= 2:
-+        return times[0], times[1]
-+    return None
-+
-+
-+def _extract_lesson_type(card) -> Optional[str]:
-+    span = card.find("span", attrs={"title": True})
-+    if span:
-+        return _extract_text(span)
-+    return None
-+
-+
-+def _extract_subject(card) -> str:
-+    subject_block = card.find(attrs={"class": re.compile(r"mb-1")})
-+    if not subject_block:
-+        return ""
-+    direct = subject_block.find("div", class_=re.compile(r"text-left"))
-+    if direct:
-+        text = _extract_text(direct)
-+        if text:
-+            return text
-+    btn = subject_block.find("button")
-+    if btn:
-+        text = _extract_text(btn)
-+        if text:
-+            return text
-+    return _extract_text(subject_block)
-+
-+
-+def _extract_location_and_lines(card) -> tuple[Optional[str], list[str], list[str]]:
-+    ten_px_lines = [
-+        _extract_text(p)
-+        for p in card.find_all("p", class_=re.compile(r"text-\[10px\]"))
-+    ]
-+    location: Optional[str] = None
-+    extras: list[str] = []
-+    subgroups: list[str] = []
-+    for line in ten_px_lines:
-+        if not line:
-+            continue
-+        if line.startswith("Подгруппы"):
-+            subgroups.append(line)
-+            continue
-+        if location is None:
-+            location = line
-+        else:
-+            extras.append(line)
-+    return location, extras, subgroups
-+
-+
-+def _extract_teacher(card) -> Optional[str]:
-+    teacher_line = card.find("p", class_=re.compile(r"text-\[12px\]"))
-+    if teacher_line:
-+        text = _extract_text(teacher_line)
-+        if text:
-+            return text
-+    return None
-+
-+
-+def _is_remote(card) -> bool:
-+    return bool(card.find("button", attrs={"title": "Удаленное занятие"}))
-+
-+
-+def parse_events_from_html(html: str, tz: ZoneInfo) -> List[Event]:
-+    soup = BeautifulSoup(html, "lxml")
-+    schedule_root = soup.select_one("div.days-schedule")
-+    if not schedule_root:
-+        raise ParseError("Schedule root not found")
-+
-+    dates = _extract_dates(schedule_root)
-+    if not dates:
-+        raise ParseError("No dates found in header")
-+
-+    events: List[Event] = []
-+    source_counts: dict[str, int] = defaultdict(int)
-+
-+    data_rows = schedule_root.select("div.table-data")
-+    for row in data_rows:
-+        day_cells = [child for child in row.find_all("div", recursive=False) if "border" in child.get("class", [])]
-+        if len(day_cells) != len(dates):
-+            logging.warning("Day cells count %d does not match dates %d", len(day_cells), len(dates))
-+        for idx, cell in enumerate(day_cells[: len(dates)]):
-+            cards = cell.find_all("div", class_=re.compile(r"shadow-md"))
-+            for card in cards:
-+                times = _extract_times(card)
-+                if not times:
-+                    logging.debug("Skipping card without times")
-+                    continue
-+                start_str, end_str = times
-+                lesson_type = _extract_lesson_type(card)
-+                subject = _extract_subject(card) or "Без названия"
-+                location, extra_lines, subgroups = _extract_location_and_lines(card)
-+                teacher = _extract_teacher(card)
-+                is_remote = _is_remote(card)
-+
-+                lesson_date = dates[idx]
-+                start_dt = build_datetime(lesson_date, start_str, tz)
-+                end_dt = build_datetime(lesson_date, end_str, tz)
-+
-+                description_lines: list[str] = []
-+                if lesson_type:
-+                    description_lines.append(f"Тип: {lesson_type}")
-+                if teacher:
-+                    description_lines.append(f"Преподаватель: {teacher}")
-+                for sg in subgroups:
-+                    description_lines.append(sg.replace("Подгруппы:", "Подгруппа:").strip())
-+                if is_remote:
-+                    description_lines.append("Формат: дистанционно")
-+                for line in extra_lines:
-+                    description_lines.append(line)
-+
-+                description = "\n".join(description_lines) if description_lines else None
-+
-+                location_for_id = location or ""
-+                base_key = "|".join(
-+                    [
-+                        lesson_date.isoformat(),
-+                        start_str,
-+                        end_str,
-+                        subject.strip(),
-+                        location_for_id.strip(),
-+                    ]
-+                )
-+                source_counts[base_key] += 1
-+                suffix = "" if source_counts[base_key] == 1 else f"|#{source_counts[base_key]-1}"
-+                source_id = hash_source([base_key + suffix])
-+
-+                event = Event(
-+                    title=subject.strip(),
-+                    start=start_dt,
-+                    end=end_dt,
-+                    location=location.strip() if location else None,
-+                    description=description,
-+                    source_id=source_id,
-+                    raw=None,
-+                )
-+                events.append(event)
-+    return events
- 
-EOF
+from __future__ import annotations
+
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from .config import MONTHS_RU, get_parser_engine
+from .models import Event
+from .utils import build_datetime, hash_source
+
+DATE_REGEX = re.compile(r"\b\d{1,2}\s+[А-Яа-я]+\s+\d{4}\b")
+TIME_REGEX = re.compile(r"\b\d{2}:\d{2}\b")
+
+
+class ParseError(Exception):
+    pass
+
+
+def parse_ru_date(s: str) -> date:
+    parts = s.strip().split()
+    if len(parts) != 3:
+        raise ValueError(f"Cannot parse date from '{s}'")
+    day_str, month_ru, year_str = parts
+    day = int(day_str)
+    year = int(year_str)
+    month = MONTHS_RU.get(month_ru.lower())
+    if not month:
+        raise ValueError(f"Unknown month '{month_ru}' in '{s}'")
+    return date(year, month, day)
+
+
+def _extract_dates(schedule_root: BeautifulSoup) -> List[date]:
+    headers = schedule_root.select("div.table-header div.table-header-columns")
+    dates: List[date] = []
+    for header in headers:
+        match = DATE_REGEX.search(header.get_text(" ", strip=True))
+        if match:
+            try:
+                dates.append(parse_ru_date(match.group(0)))
+            except Exception as exc:
+                logging.warning("Failed to parse date '%s': %s", match.group(0), exc)
+    if len(dates) != 7:
+        logging.warning("Expected 7 dates in header, got %d", len(dates))
+    return dates
+
+
+def _extract_text(node) -> str:
+    return node.get_text(" ", strip=True) if node else ""
+
+
+def _extract_times(card) -> Optional[tuple[str, str]]:
+    times = TIME_REGEX.findall(card.get_text(" ", strip=True))
+    if len(times) >= 2:
+        return times[0], times[1]
+    return None
+
+
+def _extract_lesson_type(card) -> Optional[str]:
+    span = card.find("span", attrs={"title": True})
+    if span:
+        return _extract_text(span)
+    return None
+
+
+def _extract_subject(card) -> str:
+    subject_block = card.find(attrs={"class": re.compile(r"mb-1")})
+    if not subject_block:
+        return ""
+    direct = subject_block.find("div", class_=re.compile(r"text-left"))
+    if direct:
+        text = _extract_text(direct)
+        if text:
+            return text
+    btn = subject_block.find("button")
+    if btn:
+        text = _extract_text(btn)
+        if text:
+            return text
+    return _extract_text(subject_block)
+
+
+def _extract_location_and_lines(card) -> tuple[Optional[str], list[str], list[str]]:
+    ten_px_lines = [
+        _extract_text(p)
+        for p in card.find_all("p", class_=re.compile(r"text-\[10px\]"))
+    ]
+    return _split_location_lines(ten_px_lines)
+
+
+def _split_location_lines(ten_px_lines: list[str]) -> tuple[Optional[str], list[str], list[str]]:
+    location: Optional[str] = None
+    extras: list[str] = []
+    subgroups: list[str] = []
+    for line in ten_px_lines:
+        if not line:
+            continue
+        if line.startswith("Подгруппы"):
+            subgroups.append(line)
+            continue
+        if location is None:
+            location = line
+        else:
+            extras.append(line)
+    return location, extras, subgroups
+
+
+def _extract_teacher(card) -> Optional[str]:
+    teacher_line = card.find("p", class_=re.compile(r"text-\[12px\]"))
+    if teacher_line:
+        text = _extract_text(teacher_line)
+        if text:
+            return text
+    return None
+
+
+def _is_remote(card) -> bool:
+    return bool(card.find("button", attrs={"title": "Удаленное занятие"}))
+
+
+def _build_event(
+    lesson_date: date,
+    times: tuple[str, str],
+    lesson_type: Optional[str],
+    subject: str,
+    location: Optional[str],
+    extra_lines: list[str],
+    subgroups: list[str],
+    teacher: Optional[str],
+    is_remote: bool,
+    tz: ZoneInfo,
+    source_counts: dict[str, int],
+) -> Event:
+    start_str, end_str = times
+    try:
+        start_dt = build_datetime(lesson_date, start_str, tz)
+        end_dt = build_datetime(lesson_date, end_str, tz)
+    except ValueError as exc:
+        raise ParseError(f"Bad lesson time {start_str}-{end_str} on {lesson_date}: {exc}") from exc
+
+    description_lines: list[str] = []
+    if lesson_type:
+        description_lines.append(f"Тип: {lesson_type}")
+    if teacher:
+        description_lines.append(f"Преподаватель: {teacher}")
+    for sg in subgroups:
+        description_lines.append(sg.replace("Подгруппы:", "Подгруппа:").strip())
+    if is_remote:
+        description_lines.append("Формат: дистанционно")
+    for line in extra_lines:
+        description_lines.append(line)
+
+    description = "\n".join(description_lines) if description_lines else None
+
+    location_for_id = location or ""
+    base_key = "|".join(
+        [
+            lesson_date.isoformat(),
+            start_str,
+            end_str,
+            subject.strip(),
+            location_for_id.strip(),
+        ]
+    )
+    source_counts[base_key] += 1
+    suffix = "" if source_counts[base_key] == 1 else f"|#{source_counts[base_key]-1}"
+    source_id = hash_source([base_key + suffix])
+
+    return Event(
+        title=subject.strip(),
+        start=start_dt,
+        end=end_dt,
+        location=location.strip() if location else None,
+        description=description,
+        source_id=source_id,
+    )
+
+
+def _parse_events_bs4(html: str, tz: ZoneInfo) -> List[Event]:
+    soup = BeautifulSoup(html, "lxml")
+    schedule_root = soup.select_one("div.days-schedule")
+    if not schedule_root:
+        raise ParseError("Schedule root not found")
+
+    dates = _extract_dates(schedule_root)
+    if not dates:
+        raise ParseError("No dates found in header")
+
+    events: List[Event] = []
+    source_counts: dict[str, int] = defaultdict(int)
+
+    data_rows = schedule_root.select("div.table-data")
+    for row in data_rows:
+        day_cells = [child for child in row.find_all("div", recursive=False) if "border" in child.get("class", [])]
+        if len(day_cells) != len(dates):
+            logging.warning("Day cells count %d does not match dates %d", len(day_cells), len(dates))
+        for idx, cell in enumerate(day_cells[: len(dates)]):
+            cards = cell.find_all("div", class_=re.compile(r"shadow-md"))
+            for card in cards:
+                times = _extract_times(card)
+                if not times:
+                    logging.debug("Skipping card without times")
+                    continue
+                location, extra_lines, subgroups = _extract_location_and_lines(card)
+                event = _build_event(
+                    dates[idx],
+                    times,
+                    lesson_type=_extract_lesson_type(card),
+                    subject=_extract_subject(card) or "Без названия",
+                    location=location,
+                    extra_lines=extra_lines,
+                    subgroups=subgroups,
+                    teacher=_extract_teacher(card),
+                    is_remote=_is_remote(card),
+                    tz=tz,
+                    source_counts=source_counts,
+                )
+                events.append(event)
+    return events
+
+
+# The lxml engine walks the tree itself rather than evaluating an XPath per
+# field: each card is visited once, and class tests mirror BeautifulSoup's
+# (a whole class token for select(), a substring for the re.compile() finds).
+_X_HEADER_COLUMNS = etree.XPath(
+    ".//div[contains(concat(' ', normalize-space(@class), ' '), ' table-header ')]"
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' table-header-columns ')]"
 )
+_X_SUBJECT_TEXT = etree.XPath("(.//div[contains(@class, 'text-left')])[1]")
+_X_SUBJECT_BUTTON = etree.XPath("(.//button)[1]")
+# Pages are decoded text already; feeding UTF-8 bytes with a fixed encoding
+# lets lxml ignore an <?xml encoding=...?> prolog, as BeautifulSoup does. The
+# plain etree parser also skips lxml.html's per-element class lookup.
+_LXML_PARSER = etree.HTMLParser(remove_comments=True, encoding="utf-8")
+
+
+@dataclass
+class _LxmlCard:
+    lesson_type: Optional[str] = None
+    subject_block: Optional[etree._Element] = None
+    teacher: Optional[etree._Element] = None
+    ten_px_lines: list[str] = field(default_factory=list)
+    is_remote: bool = False
+
+
+def _lxml_text(node) -> str:
+    if node is None:
+        return ""
+    return " ".join(part for part in (text.strip() for text in node.itertext()) if part)
+
+
+def _lxml_first(xpath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def _lxml_has_class(node, name: str) -> bool:
+    return name in node.get("class", "").split()
+
+
+def _lxml_card(card) -> _LxmlCard:
+    parts = _LxmlCard()
+    for node in card.iterdescendants(etree.Element):
+        tag = node.tag
+        classes = node.get("class", "")
+        if parts.subject_block is None and "mb-1" in classes:
+            parts.subject_block = node
+        if tag == "p":
+            if "text-[10px]" in classes:
+                parts.ten_px_lines.append(_lxml_text(node))
+            if parts.teacher is None and "text-[12px]" in classes:
+                parts.teacher = node
+        elif tag == "span":
+            if parts.lesson_type is None and node.get("title") is not None:
+                parts.lesson_type = _lxml_text(node)
+        elif tag == "button" and node.get("title") == "Удаленное занятие":
+            parts.is_remote = True
+    return parts
+
+
+def _lxml_subject(block) -> str:
+    if block is None:
+        return ""
+    for xpath in (_X_SUBJECT_TEXT, _X_SUBJECT_BUTTON):
+        text = _lxml_text(_lxml_first(xpath, block))
+        if text:
+            return text
+    return _lxml_text(block)
+
+
+def _parse_events_lxml(html: str, tz: ZoneInfo) -> List[Event]:
+    try:
+        document = etree.fromstring(html.encode("utf-8"), parser=_LXML_PARSER)
+    except (etree.XMLSyntaxError, ValueError):
+        document = None
+    if document is None:
+        raise ParseError("Schedule root not found")
+    # BeautifulSoup's get_text() skips script and style contents; drop them so
+    # itertext() yields the same text.
+    etree.strip_elements(document, "script", "style", with_tail=False)
+    schedule_root = next((div for div in document.iter("div") if _lxml_has_class(div, "days-schedule")), None)
+    if schedule_root is None:
+        raise ParseError("Schedule root not found")
+
+    dates: List[date] = []
+    for header in _X_HEADER_COLUMNS(schedule_root):
+        match = DATE_REGEX.search(_lxml_text(header))
+        if match:
+            try:
+                dates.append(parse_ru_date(match.group(0)))
+            except Exception as exc:
+                logging.warning("Failed to parse date '%s': %s", match.group(0), exc)
+    if len(dates) != 7:
+        logging.warning("Expected 7 dates in header, got %d", len(dates))
+    if not dates:
+        raise ParseError("No dates found in header")
+
+    events: List[Event] = []
+    source_counts: dict[str, int] = defaultdict(int)
+
+    rows = [div for div in schedule_root.iterdescendants("div") if _lxml_has_class(div, "table-data")]
+    for row in rows:
+        day_cells = [child for child in row.iterchildren("div") if _lxml_has_class(child, "border")]
+        if len(day_cells) != len(dates):
+            logging.warning("Day cells count %d does not match dates %d", len(day_cells), len(dates))
+        for idx, cell in enumerate(day_cells[: len(dates)]):
+            for card in cell.iterdescendants("div"):
+                if "shadow-md" not in card.get("class", ""):
+                    continue
+                times = TIME_REGEX.findall(_lxml_text(card))
+                if len(times) < 2:
+                    logging.debug("Skipping card without times")
+                    continue
+                parts = _lxml_card(card)
+                location, extra_lines, subgroups = _split_location_lines(parts.ten_px_lines)
+                event = _build_event(
+                    dates[idx],
+                    (times[0], times[1]),
+                    lesson_type=parts.lesson_type or None,
+                    subject=_lxml_subject(parts.subject_block) or "Без названия",
+                    location=location,
+                    extra_lines=extra_lines,
+                    subgroups=subgroups,
+                    teacher=_lxml_text(parts.teacher) or None,
+                    is_remote=parts.is_remote,
+                    tz=tz,
+                    source_counts=source_counts,
+                )
+                events.append(event)
+    return events
+
+
+PARSER_ENGINES = {
+    "bs4": _parse_events_bs4,
+    "lxml": _parse_events_lxml,
+}
+
+
+def parse_events_from_html(html: str, tz: ZoneInfo, engine: Optional[str] = None) -> List[Event]:
+    engine = engine or get_parser_engine()
+    try:
+        parse = PARSER_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown parser engine '{engine}'") from None
+    return parse(html, tz)
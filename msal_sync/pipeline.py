@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import queue
+import threading
+from datetime import date
+from typing import Callable, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+
+from .cache import ScheduleCache, parse_week
+from .gcal import SyncResult
+from .models import Event
+
+DEFAULT_QUEUE_SIZE = 2
+
+WeekPage = tuple[date, date, str]
+WeekEvents = tuple[date, date, List[Event]]
+_DONE = object()
+
+
+class _Stage(threading.Thread):
+    # One pipeline stage: takes items from inbox, hands results to outbox.
+    # After a failure anywhere it keeps draining its inbox so upstream puts on
+    # the bounded queues never block forever.
+
+    def __init__(
+        self,
+        name: str,
+        inbox: queue.Queue,
+        handler: Callable[[object], Optional[object]],
+        outbox: Optional[queue.Queue],
+        failed: threading.Event,
+    ):
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.handler = handler
+        self.outbox = outbox
+        self.failed = failed
+        self.error: Optional[BaseException] = None
+        self.context = contextvars.copy_context()
+
+    def run(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                break
+            if self.failed.is_set():
+                continue
+            try:
+                result = self.context.run(self.handler, item)
+            except BaseException as exc:
+                logging.error("Pipeline stage %s failed: %s", self.name, exc)
+                self.error = exc
+                self.failed.set()
+                continue
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+        if self.outbox is not None:
+            self.outbox.put(_DONE)
+
+
+def run_pipeline(
+    pages: Iterable[WeekPage],
+    tz: ZoneInfo,
+    sync_week: Callable[[date, date, List[Event]], SyncResult],
+    cache: Optional[ScheduleCache] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    on_parsed: Optional[Callable[[date, date, List[Event]], None]] = None,
+) -> SyncResult:
+    """Overlap fetching, parsing and calendar writes across weeks.
+
+    ``pages`` is consumed on the calling thread (the sync Playwright API must
+    stay on the thread that started it) while one thread parses and another
+    diffs and writes. Bounded queues between the stages provide backpressure,
+    so at most ``queue_size`` weeks wait in front of each stage.
+    """
+    failed = threading.Event()
+    parse_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    sync_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    result = SyncResult()
+
+    def parse(item: WeekPage) -> Optional[WeekEvents]:
+        from_date, to_date, html = item
+        events = parse_week(html, from_date, to_date, tz, cache=cache)
+        logging.info("Parsed %d events for %s - %s", len(events), from_date, to_date)
+        if on_parsed is not None:
+            on_parsed(from_date, to_date, events)
+        if cache is not None and (from_date, to_date) not in cache.changed:
+            return None
+        return from_date, to_date, events
+
+    def sync(item: WeekEvents) -> None:
+        from_date, to_date, events = item
+        result.merge(sync_week(from_date, to_date, events))
+
+    stages = [
+        _Stage("parse", parse_queue, parse, sync_queue, failed),
+        _Stage("sync", sync_queue, sync, None, failed),
+    ]
+    for stage in stages:
+        stage.start()
+    try:
+        for page in pages:
+            if failed.is_set():
+                break
+            parse_queue.put(page)
+    finally:
+        parse_queue.put(_DONE)
+        for stage in stages:
+            stage.join()
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+    return result
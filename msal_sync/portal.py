@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .artifacts import AccountArtifacts
+from .cache import ScheduleCache, parse_week
+from .models import Event
+
+# Replays rendered week pages over plain HTTP from a server that returns them,
+# such as stub_server serving recorded pages. lk.msal.ru itself builds the
+# schedule in the browser (its /schedule route is only the app shell), so it
+# is refused rather than fetched and reported as empty.
+LIVE_PORTAL_URL = "https://lk.msal.ru"
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0 Safari/537.36"
+)
+
+
+class ScheduleNotRendered(Exception):
+    """The server answered with the app shell; the schedule is only built in a browser."""
+
+
+def new_session(pool_size: int = 8) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"})
+    return session
+
+
+class PortalClient:
+    def __init__(
+        self,
+        session: requests.Session,
+        base_url: str,
+        timeout: float = 15.0,
+        artifacts: Optional[AccountArtifacts] = None,
+    ):
+        if urlparse(base_url).hostname == urlparse(LIVE_PORTAL_URL).hostname:
+            raise ScheduleNotRendered(
+                f"{base_url} renders the schedule in the browser; replay recorded pages from msal_sync.stub_server"
+            )
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.artifacts = artifacts
+
+    @classmethod
+    def connect(cls, base_url: str, pool_size: int = 8, artifacts: Optional[AccountArtifacts] = None):
+        return cls(new_session(pool_size), base_url=base_url, artifacts=artifacts)
+
+    def _get(self, path: str, params: dict) -> requests.Response:
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def fetch_week_html(self, from_date: date, to_date: date) -> str:
+        logging.info("Replaying schedule %s - %s", from_date, to_date)
+        with metrics.span("fetch_week", backend="replay", week=from_date.isoformat()) as span:
+            response = self._get("/schedule", {"from": from_date.isoformat(), "to": to_date.isoformat()})
+            html = response.text
+            span.attrs.update(http_status=response.status_code, bytes=len(html))
+        metrics.observe("week_phase_seconds", span.seconds, phase="http")
+        if "days-schedule" not in html:
+            raise ScheduleNotRendered(f"{self.base_url} returned no rendered schedule for {from_date}")
+
+        if self.artifacts is not None:
+            self.artifacts.save(html, from_date, to_date)
+        else:
+            pages_dir = Path("artifacts/pages")
+            pages_dir.mkdir(parents=True, exist_ok=True)
+            artifact_path = pages_dir / f"{from_date.isoformat()}_{to_date.isoformat()}.html"
+            artifact_path.write_text(html, encoding="utf-8")
+        return html
+
+    def fetch_week(
+        self, from_date: date, to_date: date, tz: ZoneInfo, cache: Optional[ScheduleCache] = None
+    ) -> List[Event]:
+        html = self.fetch_week_html(from_date, to_date)
+        events = parse_week(html, from_date, to_date, tz, cache=cache)
+        logging.info("Parsed %d events for %s - %s", len(events), from_date, to_date)
+        return events
+
+    def fetch_weeks(
+        self,
+        windows: Sequence[tuple[date, date]],
+        tz: ZoneInfo,
+        concurrency: int = 4,
+        cache: Optional[ScheduleCache] = None,
+    ) -> List[Event]:
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            results = list(
+                pool.map(
+                    lambda window: context.copy().run(self.fetch_week, window[0], window[1], tz, cache=cache), windows
+                )
+            )
+        return [event for week_events in results for event in week_events]
+
+    def iter_week_html(
+        self, windows: Sequence[tuple[date, date]], concurrency: int = 4
+    ) -> Iterator[tuple[date, date, str]]:
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            pages = pool.map(lambda window: context.copy().run(self.fetch_week_html, window[0], window[1]), windows)
+            for (from_date, to_date), html in zip(windows, pages):
+                yield from_date, to_date, html
+
+    def close(self) -> None:
+        self.session.close()
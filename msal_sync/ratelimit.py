@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from . import metrics
+
+# Calendar API default: 600 queries per minute per user.
+DEFAULT_QUOTA_PER_MINUTE = 600
+DEFAULT_MAX_IN_FLIGHT = 50
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, count: float = 1.0) -> float:
+        # A request larger than the bucket waits for a full bucket and leaves
+        # it in debt, so the next callers pay for the overshoot.
+        waited = 0.0
+        needed = min(count, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= count
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+    def drain(self) -> None:
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    """Shared throttle for Calendar API calls.
+
+    A token bucket holds the request rate to the configured quota, and an
+    AIMD window bounds how many requests (a batch counts each of its parts)
+    are in flight across threads: it grows by one per window of successes
+    and halves on a rate-limit error, which also empties the bucket.
+    """
+
+    def __init__(
+        self,
+        quota_per_minute: float = DEFAULT_QUOTA_PER_MINUTE,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        min_in_flight: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.sleep = sleep
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        # Holds a full minute of quota, refilled at the per-second rate.
+        self.bucket = TokenBucket(quota_per_minute / 60.0, quota_per_minute, clock=clock, sleep=sleep)
+        self.window = float(self.max_in_flight)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def batch_size(self, requested: int) -> int:
+        # Batches shrink with the window after throttling.
+        with self._cond:
+            return max(1, min(requested, int(self.window)))
+
+    @contextmanager
+    def slot(self, count: int = 1) -> Iterator[None]:
+        with self._cond:
+            # An idle limiter always admits, however large the request.
+            while self.in_flight and self.in_flight + count > self.window:
+                self._cond.wait()
+            self.in_flight += count
+        try:
+            waited = self.bucket.acquire(count)
+            if waited:
+                metrics.observe("gcal_rate_wait_seconds", waited)
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= count
+                self._cond.notify_all()
+
+    def succeeded(self, count: int = 1) -> None:
+        with self._cond:
+            self.window = min(float(self.max_in_flight), self.window + count / self.window)
+            self._cond.notify_all()
+
+    def throttled(self) -> None:
+        with self._cond:
+            self.window = max(float(self.min_in_flight), self.window / 2)
+            window = self.window
+        self.bucket.drain()
+        metrics.inc("gcal_throttled_total")
+        logging.warning("Calendar API rate limit hit; in-flight window now %d", int(window))
+
+    def pause(self, seconds: float) -> None:
+        # Retry backoff goes through the limiter's sleep so tests can fake time.
+        self.sleep(seconds)
+
+
+LIMITER = RateLimiter()
+
+
+def configure(quota_per_minute: Optional[float] = None, max_in_flight: Optional[int] = None) -> RateLimiter:
+    # Replaces the process-wide limiter; every account syncing in this process shares it.
+    global LIMITER
+    LIMITER = RateLimiter(
+        quota_per_minute=quota_per_minute or DEFAULT_QUOTA_PER_MINUTE,
+        max_in_flight=max_in_flight or DEFAULT_MAX_IN_FLIGHT,
+    )
+    return LIMITER
+
+
+def current() -> RateLimiter:
+    return LIMITER
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import IO, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .artifacts import ArtifactStore, read_blob
+from .config import get_parser_engine, get_timezone
+from .models import Event
+from .parser import PARSER_ENGINES, ParseError, parse_events_from_html
+from .utils import partition_events_by_source
+
+FileResult = Tuple[str, List[Event], Optional[str]]
+
+
+@dataclass
+class ReparseStats:
+    files: int = 0
+    failed: int = 0
+    events: int = 0
+    unique: int = 0
+    duplicates: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+
+def archive_files(pages_dir: str, start: Optional[date] = None, end: Optional[date] = None) -> List[Path]:
+    files = []
+    for path in sorted(Path(pages_dir).glob("*.html")):
+        week_start = path.stem.split("_", 1)[0]
+        if start is not None and week_start < start.isoformat():
+            continue
+        if end is not None and week_start > end.isoformat():
+            continue
+        files.append(path)
+    return files
+
+
+def store_files(
+    store_dir: str, account: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None
+) -> List[Path]:
+    # Newest capture of each week; workers decompress the blobs themselves.
+    store = ArtifactStore(store_dir)
+    return [Path(store.blob_path(snapshot)) for snapshot in store.latest(account, start, end)]
+
+
+def _parse_file(path: str, tz: ZoneInfo, engine: str) -> FileResult:
+    # Runs in a worker process; errors come back as text so one bad page does
+    # not abort the whole archive.
+    try:
+        html = read_blob(path)
+        return path, parse_events_from_html(html, tz, engine=engine), None
+    except (OSError, RuntimeError, ParseError) as exc:
+        return path, [], str(exc)
+
+
+def _parse_all(files: List[Path], tz: ZoneInfo, engine: str, workers: int) -> Iterable[FileResult]:
+    paths = [str(path) for path in files]
+    if workers <= 1 or len(paths) <= 1:
+        return (_parse_file(path, tz, engine) for path in paths)
+    # Chunks amortise the per-task pickling round trip; small pages parse in a few ms.
+    chunksize = max(1, len(paths) // (workers * 8))
+    executor = ProcessPoolExecutor(max_workers=workers)
+
+    def results() -> Iterable[FileResult]:
+        with executor:
+            yield from executor.map(_parse_file, paths, [tz] * len(paths), [engine] * len(paths), chunksize=chunksize)
+
+    return results()
+
+
+def reparse_archive(
+    files: List[Path], tz: ZoneInfo, engine: Optional[str] = None, workers: Optional[int] = None
+) -> Tuple[List[Event], ReparseStats]:
+    engine = engine or get_parser_engine()
+    workers = workers or os.cpu_count() or 1
+    stats = ReparseStats()
+    started = time.perf_counter()
+
+    parsed: List[Event] = []
+    for path, events, error in _parse_all(files, tz, engine, workers):
+        stats.files += 1
+        if error is not None:
+            stats.failed += 1
+            logging.warning("Skipping %s: %s", path, error)
+            continue
+        parsed.extend(events)
+
+    # Files are in week order, so the first copy of a lesson is the one kept.
+    unique, duplicates = partition_events_by_source(parsed)
+    stats.events = len(parsed)
+    stats.unique = len(unique)
+    stats.duplicates = sum(len(copies) - 1 for copies in duplicates.values())
+    stats.elapsed = time.perf_counter() - started
+    return list(unique.values()), stats
+
+
+def write_events(events: Iterable[Event], fp: IO[str]) -> None:
+    for event in events:
+        fp.write(json.dumps(event.to_dict(), ensure_ascii=False, separators=(",", ":")))
+        fp.write("\n")
+
+
+def write_events_file(events: Iterable[Event], path: str) -> None:
+    # JSON lines, gzip-compressed when the path ends in .gz.
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8", newline="\n") as fp:
+        write_events(events, fp)
+    logging.info("Wrote events to %s", path)
+
+
+def read_events_file(path: str) -> Iterable[Event]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fp:
+        for line in fp:
+            if line.strip():
+                yield Event.from_dict(json.loads(line))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-parse the saved schedule pages in parallel")
+    parser.add_argument("--pages-dir", default="artifacts/pages", help="Directory with saved week pages")
+    parser.add_argument("--store", help="Read the newest captures from this artifact store instead of --pages-dir")
+    parser.add_argument("--account", help="Only this account's captures (with --store)")
+    parser.add_argument(
+        "--output", default="artifacts/events.jsonl.gz", help="Events as JSON lines (gzip when ending in .gz)"
+    )
+    parser.add_argument("--ics", help="Also write the events to this .ics file")
+    parser.add_argument("--start", type=date.fromisoformat, help="Skip weeks before this date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Skip weeks starting after this date (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--engine", choices=sorted(PARSER_ENGINES), help="Parser engine (default: PARSER_ENGINE)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    tz = get_timezone()
+    if args.store:
+        files = store_files(args.store, args.account, args.start, args.end)
+    else:
+        files = archive_files(args.pages_dir, args.start, args.end)
+    if not files:
+        logging.warning("No pages found in %s", args.store or args.pages_dir)
+        return 1
+
+    events, stats = reparse_archive(files, tz, engine=args.engine, workers=args.workers)
+    events.sort(key=lambda e: (e.start, e.source_id))
+    write_events_file(events, args.output)
+    if args.ics:
+        from .ics import write_ics_file
+
+        write_ics_file(events, args.ics, tz)
+
+    logging.info(
+        "Parsed %d files (%d failed), %d events, %d unique, %d duplicates in %.2fs: %.1f files/s, %.0f events/s",
+        stats.files,
+        stats.failed,
+        stats.events,
+        stats.unique,
+        stats.duplicates,
+        stats.elapsed,
+        stats.files_per_second,
+        stats.events_per_second,
+    )
+    return 0 if stats.failed < stats.files else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
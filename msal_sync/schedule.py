@@ -1,55 +1,393 @@
- (cd "$(git rev-parse --show-toplevel)" && git apply --3way <<'EOF' 
-diff --git a/msal_sync/schedule.py b/msal_sync/schedule.py
-new file mode 100644
-index 0000000000000000000000000000000000000000..769ef802fe90981f0a3864e22f01c100e5496f46
---- /dev/null
-+++ b/msal_sync/schedule.py
-@@ -0,0 +1,45 @@
-+from __future__ import annotations
-+
-+import logging
-+from datetime import date
-+from pathlib import Path
-+from typing import List
-+from zoneinfo import ZoneInfo
-+
-+from playwright.sync_api import Page
-+
-+from .models import Event
-+from .parser import ParseError, parse_events_from_html
-+
-+BASE_URL = "https://lk.msal.ru/schedule"
-+
-+
-+def fetch_schedule_for_week(page: Page, from_date: date, to_date: date, tz: ZoneInfo) -> List[Event]:
-+    url = f"{BASE_URL}?from={from_date.isoformat()}&to={to_date.isoformat()}"
-+    logging.info("Fetching schedule %s", url)
-+    page.goto(url, wait_until="networkidle")
-+    page.wait_for_timeout(500)
-+    page.wait_for_selector("div.days-schedule", timeout=10_000)
-+    html = page.content()
-+
-+    pages_dir = Path("artifacts/pages")
-+    pages_dir.mkdir(parents=True, exist_ok=True)
-+    artifact_path = pages_dir / f"{from_date.isoformat()}_{to_date.isoformat()}.html"
-+    artifact_path.write_text(html, encoding="utf-8")
-+
-+    try:
-+        events = parse_events_from_html(html, tz)
-+    except ParseError as exc:
-+        logging.error("Failed to parse schedule for %s-%s: %s", from_date, to_date, exc)
-+        screenshots_dir = Path("artifacts/screenshots")
-+        screenshots_dir.mkdir(parents=True, exist_ok=True)
-+        screenshot_path = screenshots_dir / f"{from_date.isoformat()}_{to_date.isoformat()}.png"
-+        try:
-+            page.screenshot(path=str(screenshot_path), full_page=True)
-+            logging.info("Saved screenshot to %s", screenshot_path)
-+        except Exception as shot_exc:
-+            logging.warning("Unable to capture screenshot: %s", shot_exc)
-+        raise
-+
-+    logging.info("Parsed %d events for %s - %s", len(events), from_date, to_date)
-+    return events
- 
-EOF
-)
+from __future__ import annotations
+
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from playwright.sync_api import BrowserContext, Page, Response
+
+from . import metrics
+from .artifacts import AccountArtifacts
+from .cache import ScheduleCache, parse_week
+from .models import Event
+from .parser import ParseError
+
+BASE_URL = "https://lk.msal.ru/schedule"
+DEFAULT_CONCURRENCY = 2
+MAX_CONCURRENCY = 8
+SCHEDULE_SELECTOR = "div.days-schedule"
+
+# Resolves once the schedule root exists and its card count and markup size
+# have not changed for quiet_ms.
+_DOM_STABLE_JS = """
+([selector, quietMs]) => {
+  const root = document.querySelector(selector);
+  if (!root) return false;
+  const signature = root.querySelectorAll('div[class*="shadow-md"]').length + ':' + root.innerHTML.length;
+  const now = performance.now();
+  const state = window.__msalScheduleReady || (window.__msalScheduleReady = {signature: null, since: now});
+  if (state.signature !== signature) {
+    state.signature = signature;
+    state.since = now;
+    return false;
+  }
+  return now - state.since >= quietMs;
+}
+"""
+
+
+class ScheduleNotReady(RuntimeError):
+    """The schedule data response never arrived, so the DOM cannot be trusted."""
+
+
+@dataclass
+class Readiness:
+    strategy: str = "networkidle"  # "networkidle", "xhr" or "stable"
+    xhr_pattern: Optional[str] = None
+    quiet_ms: int = 300
+    timeout_ms: int = 10_000
+
+    def __post_init__(self) -> None:
+        # A quiet DOM alone cannot tell an empty skeleton from a loaded week,
+        # so the faster strategies are only safe when the data response is known.
+        if self.strategy != "networkidle" and not self.xhr_pattern:
+            logging.warning(
+                "READY_STRATEGY=%s needs SCHEDULE_XHR_PATTERN; falling back to networkidle", self.strategy
+            )
+            self.strategy = "networkidle"
+
+
+@dataclass
+class WeekTiming:
+    from_date: date
+    to_date: date
+    phases: dict[str, float] = field(default_factory=dict)
+
+    def record(self, phase: str, started: float) -> float:
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - started)
+        metrics.observe("week_phase_seconds", now - started, phase=phase)
+        return now
+
+
+def log_timing_summary(timings: Sequence[WeekTiming]) -> None:
+    if not timings:
+        return
+    phases = ["navigate", "ready", "content", "parse"]
+    averages = {
+        phase: sum(t.phases.get(phase, 0.0) for t in timings) / len(timings) * 1000 for phase in phases
+    }
+    logging.info(
+        "Fetch phases, average over %d weeks: %s",
+        len(timings),
+        " ".join(f"{phase}={averages[phase]:.0f}ms" for phase in phases),
+    )
+
+
+class _ResponseMatcher:
+    # Flags the first OK response whose URL matches pattern. The sync and
+    # async watchers only differ in how they wait for that flag.
+
+    def __init__(self, page, pattern: str):
+        self.page = page
+        self.pattern = re.compile(pattern)
+        page.on("response", self._on_response)
+
+    def _on_response(self, response: Response) -> None:
+        if response.ok and self.pattern.search(response.url):
+            self._set_matched()
+
+    def _set_matched(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.page.remove_listener("response", self._on_response)
+
+
+class _ResponseWatcher(_ResponseMatcher):
+    def __init__(self, page: Page, pattern: str):
+        self.matched = False
+        super().__init__(page, pattern)
+
+    def _set_matched(self) -> None:
+        self.matched = True
+
+    def wait(self, timeout_ms: int) -> bool:
+        deadline = time.monotonic() + timeout_ms / 1000
+        while not self.matched and time.monotonic() < deadline:
+            # Short waits keep the sync dispatcher pumping response events.
+            self.page.wait_for_timeout(25)
+        return self.matched
+
+
+def week_url(from_date: date, to_date: date) -> str:
+    return f"{BASE_URL}?from={from_date.isoformat()}&to={to_date.isoformat()}"
+
+
+def readiness_from_settings(settings) -> Readiness:
+    return Readiness(strategy=settings.ready_strategy, xhr_pattern=settings.schedule_xhr_pattern or None)
+
+
+# Strategy decisions shared by the sync fetchers here and schedule_async.py;
+# those two only issue the Playwright calls.
+
+
+def _watches_response(readiness: Readiness) -> bool:
+    return readiness.strategy != "networkidle"
+
+
+def _require_response(readiness: Readiness, matched: bool) -> None:
+    if not matched:
+        raise ScheduleNotReady(f"Schedule response matching {readiness.xhr_pattern} not seen")
+
+
+def _settle_ms(readiness: Readiness) -> int:
+    # After network idle or the data response only the render from it is left
+    # to settle; "stable" keeps the full quiet window.
+    return readiness.quiet_ms if readiness.strategy == "stable" else min(readiness.quiet_ms, 100)
+
+
+def _report_parse_failure(from_date: date, to_date: date, exc: ParseError) -> Path:
+    logging.error("Failed to parse schedule for %s-%s: %s", from_date, to_date, exc)
+    return _screenshot_path(from_date, to_date)
+
+
+def _navigate(page: Page, url: str, readiness: Readiness) -> Optional[_ResponseWatcher]:
+    logging.info("Fetching schedule %s", url)
+    watcher = _ResponseWatcher(page, readiness.xhr_pattern) if _watches_response(readiness) else None
+    # Only the commit is awaited, so a wave of pages loads in parallel.
+    page.goto(url, wait_until="commit")
+    return watcher
+
+
+def _wait_ready(page: Page, readiness: Readiness, watcher: Optional[_ResponseWatcher]) -> None:
+    if watcher is None:
+        page.wait_for_load_state("networkidle")
+    else:
+        try:
+            matched = watcher.wait(readiness.timeout_ms)
+        finally:
+            watcher.close()
+        _require_response(readiness, matched)
+    page.wait_for_selector(SCHEDULE_SELECTOR, timeout=readiness.timeout_ms)
+    page.wait_for_function(
+        _DOM_STABLE_JS, arg=[SCHEDULE_SELECTOR, _settle_ms(readiness)], polling=50, timeout=readiness.timeout_ms
+    )
+
+
+def save_page_artifact(
+    html: str, from_date: date, to_date: date, artifacts: Optional[AccountArtifacts] = None
+) -> None:
+    if artifacts is not None:
+        artifacts.save(html, from_date, to_date)
+        return
+    pages_dir = Path("artifacts/pages")
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    artifact_path = pages_dir / f"{from_date.isoformat()}_{to_date.isoformat()}.html"
+    artifact_path.write_text(html, encoding="utf-8")
+
+
+def _capture_week(
+    page: Page,
+    from_date: date,
+    to_date: date,
+    readiness: Readiness,
+    watcher: Optional[_ResponseWatcher],
+    timing: WeekTiming,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> str:
+    started = time.perf_counter()
+    _wait_ready(page, readiness, watcher)
+    started = timing.record("ready", started)
+    html = page.content()
+    timing.record("content", started)
+    save_page_artifact(html, from_date, to_date, artifacts)
+    return html
+
+
+def _parse_captured(
+    html: str,
+    from_date: date,
+    to_date: date,
+    tz: ZoneInfo,
+    cache: Optional[ScheduleCache],
+    timing: WeekTiming,
+) -> List[Event]:
+    started = time.perf_counter()
+    events = parse_week(html, from_date, to_date, tz, cache=cache)
+    timing.record("parse", started)
+    return events
+
+
+def _screenshot_path(from_date: date, to_date: date) -> Path:
+    screenshots_dir = Path("artifacts/screenshots")
+    screenshots_dir.mkdir(parents=True, exist_ok=True)
+    return screenshots_dir / f"{from_date.isoformat()}_{to_date.isoformat()}.png"
+
+
+def _log_parsed(events: List[Event], timing: WeekTiming) -> None:
+    metrics.record_span(
+        "week",
+        sum(timing.phases.values()),
+        week=timing.from_date.isoformat(),
+        events=len(events),
+        **{phase: round(seconds, 6) for phase, seconds in timing.phases.items()},
+    )
+    logging.info(
+        "Parsed %d events for %s - %s (%s)",
+        len(events),
+        timing.from_date,
+        timing.to_date,
+        " ".join(f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in timing.phases.items()),
+    )
+
+
+def _collect_week(
+    page: Page,
+    from_date: date,
+    to_date: date,
+    tz: ZoneInfo,
+    cache: Optional[ScheduleCache] = None,
+    readiness: Optional[Readiness] = None,
+    watcher: Optional[_ResponseWatcher] = None,
+    timing: Optional[WeekTiming] = None,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> List[Event]:
+    readiness = readiness or Readiness()
+    timing = timing or WeekTiming(from_date, to_date)
+    html = _capture_week(page, from_date, to_date, readiness, watcher, timing, artifacts)
+
+    try:
+        events = _parse_captured(html, from_date, to_date, tz, cache, timing)
+    except ParseError as exc:
+        screenshot_path = _report_parse_failure(from_date, to_date, exc)
+        try:
+            page.screenshot(path=str(screenshot_path), full_page=True)
+            logging.info("Saved screenshot to %s", screenshot_path)
+        except Exception as shot_exc:
+            logging.warning("Unable to capture screenshot: %s", shot_exc)
+        raise
+
+    _log_parsed(events, timing)
+    return events
+
+
+def fetch_schedule_for_week(
+    page: Page,
+    from_date: date,
+    to_date: date,
+    tz: ZoneInfo,
+    cache: Optional[ScheduleCache] = None,
+    readiness: Optional[Readiness] = None,
+    timings: Optional[List[WeekTiming]] = None,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> List[Event]:
+    readiness = readiness or Readiness()
+    timing = WeekTiming(from_date, to_date)
+    started = time.perf_counter()
+    watcher = _navigate(page, week_url(from_date, to_date), readiness)
+    timing.record("navigate", started)
+    if timings is not None:
+        timings.append(timing)
+    return _collect_week(
+        page,
+        from_date,
+        to_date,
+        tz,
+        cache=cache,
+        readiness=readiness,
+        watcher=watcher,
+        timing=timing,
+        artifacts=artifacts,
+    )
+
+
+def _iter_loaded_pages(
+    context: BrowserContext,
+    windows: Sequence[tuple[date, date]],
+    readiness: Readiness,
+    concurrency: int,
+    page: Optional[Page],
+    timings: Optional[List[WeekTiming]],
+) -> Iterator[tuple[Page, date, date, Optional[_ResponseWatcher], WeekTiming]]:
+    # Start a wave of navigations (waiting only for commit) so the browser loads
+    # them in parallel, then hand each page out in window order.
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY, len(windows) or 1))
+    pages: list[Page] = [page] if page is not None else []
+    opened: list[Page] = []
+    while len(pages) < concurrency:
+        new_page = context.new_page()
+        pages.append(new_page)
+        opened.append(new_page)
+
+    try:
+        for offset in range(0, len(windows), concurrency):
+            started_wave = []
+            for worker, (from_date, to_date) in zip(pages, windows[offset : offset + concurrency]):
+                timing = WeekTiming(from_date, to_date)
+                started = time.perf_counter()
+                watcher = _navigate(worker, week_url(from_date, to_date), readiness)
+                timing.record("navigate", started)
+                if timings is not None:
+                    timings.append(timing)
+                started_wave.append((worker, from_date, to_date, watcher, timing))
+            yield from started_wave
+    finally:
+        for extra in opened:
+            try:
+                extra.close()
+            except Exception as exc:
+                logging.warning("Unable to close page: %s", exc)
+
+
+def fetch_schedule_for_weeks(
+    context: BrowserContext,
+    windows: Sequence[tuple[date, date]],
+    tz: ZoneInfo,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    page: Optional[Page] = None,
+    cache: Optional[ScheduleCache] = None,
+    readiness: Optional[Readiness] = None,
+    timings: Optional[List[WeekTiming]] = None,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> List[Event]:
+    readiness = readiness or Readiness()
+    results: list[List[Event]] = []
+    for worker, from_date, to_date, watcher, timing in _iter_loaded_pages(
+        context, windows, readiness, concurrency, page, timings
+    ):
+        results.append(
+            _collect_week(
+                worker,
+                from_date,
+                to_date,
+                tz,
+                cache=cache,
+                readiness=readiness,
+                watcher=watcher,
+                timing=timing,
+                artifacts=artifacts,
+            )
+        )
+    return [event for week_events in results for event in week_events]
+
+
+def iter_week_html(
+    context: BrowserContext,
+    windows: Sequence[tuple[date, date]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    page: Optional[Page] = None,
+    readiness: Optional[Readiness] = None,
+    timings: Optional[List[WeekTiming]] = None,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> Iterator[tuple[date, date, str]]:
+    readiness = readiness or Readiness()
+    for worker, from_date, to_date, watcher, timing in _iter_loaded_pages(
+        context, windows, readiness, concurrency, page, timings
+    ):
+        yield from_date, to_date, _capture_week(worker, from_date, to_date, readiness, watcher, timing, artifacts)
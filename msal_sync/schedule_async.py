@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from playwright.async_api import BrowserContext, Page
+
+from .artifacts import AccountArtifacts
+from .cache import ScheduleCache
+from .models import Event
+from .parser import ParseError
+from .schedule import (
+    DEFAULT_CONCURRENCY,
+    SCHEDULE_SELECTOR,
+    _DOM_STABLE_JS,
+    Readiness,
+    WeekTiming,
+    _ResponseMatcher,
+    _log_parsed,
+    _parse_captured,
+    _report_parse_failure,
+    _require_response,
+    _settle_ms,
+    _watches_response,
+    save_page_artifact,
+    week_url,
+)
+
+# asyncio counterparts of the schedule.py fetchers. Weeks are independent
+# coroutines; a shared semaphore bounds how many pages are open at once, so
+# one event loop can drive several accounts. Parsing and artifact writes run
+# in worker threads to keep the loop free for page I/O.
+
+
+class _ResponseWatcher(_ResponseMatcher):
+    def __init__(self, page: Page, pattern: str):
+        self.matched = asyncio.Event()
+        super().__init__(page, pattern)
+
+    def _set_matched(self) -> None:
+        self.matched.set()
+
+    async def wait(self, timeout_ms: int) -> bool:
+        try:
+            await asyncio.wait_for(self.matched.wait(), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        return self.matched.is_set()
+
+
+async def _navigate(page: Page, url: str, readiness: Readiness) -> Optional[_ResponseWatcher]:
+    logging.info("Fetching schedule %s", url)
+    watcher = _ResponseWatcher(page, readiness.xhr_pattern) if _watches_response(readiness) else None
+    # Only the commit is awaited, so a wave of pages loads in parallel.
+    await page.goto(url, wait_until="commit")
+    return watcher
+
+
+async def _wait_ready(page: Page, readiness: Readiness, watcher: Optional[_ResponseWatcher]) -> None:
+    if watcher is None:
+        await page.wait_for_load_state("networkidle")
+    else:
+        try:
+            matched = await watcher.wait(readiness.timeout_ms)
+        finally:
+            watcher.close()
+        _require_response(readiness, matched)
+    await page.wait_for_selector(SCHEDULE_SELECTOR, timeout=readiness.timeout_ms)
+    await page.wait_for_function(
+        _DOM_STABLE_JS, arg=[SCHEDULE_SELECTOR, _settle_ms(readiness)], polling=50, timeout=readiness.timeout_ms
+    )
+
+
+async def fetch_schedule_for_week(
+    page: Page,
+    from_date: date,
+    to_date: date,
+    tz: ZoneInfo,
+    cache: Optional[ScheduleCache] = None,
+    readiness: Optional[Readiness] = None,
+    timings: Optional[List[WeekTiming]] = None,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> List[Event]:
+    readiness = readiness or Readiness()
+    timing = WeekTiming(from_date, to_date)
+    if timings is not None:
+        timings.append(timing)
+    started = time.perf_counter()
+    watcher = await _navigate(page, week_url(from_date, to_date), readiness)
+    started = timing.record("navigate", started)
+    await _wait_ready(page, readiness, watcher)
+    started = timing.record("ready", started)
+    html = await page.content()
+    timing.record("content", started)
+    await asyncio.to_thread(save_page_artifact, html, from_date, to_date, artifacts)
+
+    try:
+        events = await asyncio.to_thread(_parse_captured, html, from_date, to_date, tz, cache, timing)
+    except ParseError as exc:
+        screenshot_path = _report_parse_failure(from_date, to_date, exc)
+        try:
+            await page.screenshot(path=str(screenshot_path), full_page=True)
+            logging.info("Saved screenshot to %s", screenshot_path)
+        except Exception as shot_exc:
+            logging.warning("Unable to capture screenshot: %s", shot_exc)
+        raise
+
+    _log_parsed(events, timing)
+    return events
+
+
+async def fetch_schedule_for_weeks(
+    context: BrowserContext,
+    windows: Sequence[tuple[date, date]],
+    tz: ZoneInfo,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    cache: Optional[ScheduleCache] = None,
+    readiness: Optional[Readiness] = None,
+    timings: Optional[List[WeekTiming]] = None,
+    artifacts: Optional[AccountArtifacts] = None,
+) -> List[Event]:
+    # Each week gets its own page, opened only once the semaphore admits it.
+    semaphore = semaphore or asyncio.Semaphore(DEFAULT_CONCURRENCY)
+    readiness = readiness or Readiness()
+
+    async def fetch_week(from_date: date, to_date: date) -> List[Event]:
+        async with semaphore:
+            page = await context.new_page()
+            try:
+                return await fetch_schedule_for_week(
+                    page,
+                    from_date,
+                    to_date,
+                    tz,
+                    cache=cache,
+                    readiness=readiness,
+                    timings=timings,
+                    artifacts=artifacts,
+                )
+            finally:
+                try:
+                    await page.close()
+                except Exception as exc:
+                    logging.warning("Unable to close page: %s", exc)
+
+    results = await asyncio.gather(*(fetch_week(from_date, to_date) for from_date, to_date in windows))
+    return [event for week_events in results for event in week_events]
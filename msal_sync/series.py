@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Iterable, List, Optional, Tuple
+
+from .models import CONTENT_HASH_KEY, MANAGED_BY, Event
+from .utils import hash_source
+
+DEFAULT_MIN_SERIES_LENGTH = 3
+SERIES_KEY = "series"
+INSTANCE_KEY_PREFIX = "sid_"
+
+# (date of the occurrence, source_id of the lesson on that date)
+Instance = Tuple[date, str]
+
+
+@dataclass(frozen=True, slots=True)
+class Series:
+    # One weekly lesson written as a single recurring calendar event. Each
+    # occurrence keeps the source_id it would have as a standalone event.
+    series_id: str
+    title: str
+    start_time: time
+    end_time: time
+    location: Optional[str]
+    description: Optional[str]
+    tz: tzinfo
+    instances: Tuple[Instance, ...]
+
+    @property
+    def source_ids(self) -> List[str]:
+        return [source_id for _day, source_id in self.instances]
+
+    @property
+    def exdates(self) -> List[date]:
+        present = {day for day, _source_id in self.instances}
+        first, last = self.instances[0][0], self.instances[-1][0]
+        return [
+            first + timedelta(weeks=week)
+            for week in range((last - first).days // 7 + 1)
+            if first + timedelta(weeks=week) not in present
+        ]
+
+    @property
+    def fingerprint(self) -> str:
+        parts = [
+            self.title,
+            self.start_time.isoformat(),
+            self.end_time.isoformat(),
+            self.location or "",
+            self.description or "",
+            str(self.tz),
+        ]
+        parts.extend(f"{day.isoformat()}={source_id}" for day, source_id in self.instances)
+        return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+    def with_instances(self, instances: Iterable[Instance]) -> "Series":
+        return Series(
+            series_id=self.series_id,
+            title=self.title,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            location=self.location,
+            description=self.description,
+            tz=self.tz,
+            instances=tuple(sorted(dict(instances).items())),
+        )
+
+    def to_gcal_body(self) -> dict:
+        first, last = self.instances[0][0], self.instances[-1][0]
+        last_start = datetime.combine(last, self.start_time, tzinfo=self.tz).astimezone(timezone.utc)
+        recurrence = [f"RRULE:FREQ=WEEKLY;UNTIL={last_start:%Y%m%dT%H%M%SZ}"]
+        if self.exdates:
+            local = ",".join(f"{day:%Y%m%d}T{self.start_time:%H%M%S}" for day in self.exdates)
+            recurrence.append(f"EXDATE;TZID={self.tz}:{local}")
+
+        private = {
+            "managed_by": MANAGED_BY,
+            "source_id": self.series_id,
+            CONTENT_HASH_KEY: self.fingerprint,
+            SERIES_KEY: "1",
+        }
+        for day, source_id in self.instances:
+            private[f"{INSTANCE_KEY_PREFIX}{day:%Y%m%d}"] = source_id
+        start = datetime.combine(first, self.start_time, tzinfo=self.tz)
+        end = datetime.combine(first, self.end_time, tzinfo=self.tz)
+        body = {
+            "summary": self.title,
+            "start": {"dateTime": start.isoformat(), "timeZone": str(self.tz)},
+            "end": {"dateTime": end.isoformat(), "timeZone": str(self.tz)},
+            "recurrence": recurrence,
+            "extendedProperties": {"private": private},
+        }
+        if self.location:
+            body["location"] = self.location
+        if self.description:
+            body["description"] = self.description
+        return body
+
+    @classmethod
+    def from_gcal(cls, item: dict, tz: tzinfo) -> "Series":
+        props = item.get("extendedProperties", {}).get("private", {})
+        start = datetime.fromisoformat(item["start"]["dateTime"]).astimezone(tz)
+        end = datetime.fromisoformat(item["end"]["dateTime"]).astimezone(tz)
+        return cls(
+            series_id=props["source_id"],
+            title=item.get("summary", ""),
+            start_time=start.time(),
+            end_time=end.time(),
+            location=item.get("location"),
+            description=item.get("description"),
+            tz=tz,
+            instances=tuple(sorted(stored_instances(item).items())),
+        )
+
+
+def is_series(item: dict) -> bool:
+    return item.get("extendedProperties", {}).get("private", {}).get(SERIES_KEY) == "1"
+
+
+def stored_instances(item: dict) -> dict[date, str]:
+    instances = {}
+    for key, value in item.get("extendedProperties", {}).get("private", {}).items():
+        if key.startswith(INSTANCE_KEY_PREFIX):
+            instances[datetime.strptime(key[len(INSTANCE_KEY_PREFIX) :], "%Y%m%d").date()] = value
+    return instances
+
+
+def series_id_for(event: Event, tz: tzinfo) -> str:
+    start = event.start.astimezone(tz)
+    end = event.end.astimezone(tz)
+    return hash_source(
+        [
+            "series",
+            event.title,
+            str(start.weekday()),
+            start.strftime("%H:%M"),
+            end.strftime("%H:%M"),
+            event.location or "",
+            event.description or "",
+        ]
+    )
+
+
+def compress_series(
+    events: List[Event],
+    tz: tzinfo,
+    min_length: int = DEFAULT_MIN_SERIES_LENGTH,
+    known_series: Iterable[str] = (),
+) -> Tuple[List[Series], List[Event]]:
+    """Fold weekly repeats of a lesson into recurring series.
+
+    Lessons with the same title, weekday, times, location and description
+    (which carries the teacher) form a series once they occur min_length
+    times, or at all when the calendar already holds that series. Everything
+    else is returned as standalone events. Weeks a series skips become
+    EXDATEs; a lesson that moved room or teacher for one week is one of those
+    standalone events.
+    """
+    known = set(known_series)
+    groups: dict[str, List[Event]] = defaultdict(list)
+    for event in events:
+        groups[series_id_for(event, tz)].append(event)
+
+    series: List[Series] = []
+    singles: List[Event] = []
+    for series_id, members in groups.items():
+        by_day: dict[date, Event] = {}
+        for event in members:
+            day = event.start.astimezone(tz).date()
+            if day in by_day:
+                singles.append(event)  # a second identical lesson on the same day
+            else:
+                by_day[day] = event
+        if len(by_day) < min_length and series_id not in known:
+            singles.extend(by_day.values())
+            continue
+        first = by_day[min(by_day)]
+        series.append(
+            Series(
+                series_id=series_id,
+                title=first.title,
+                start_time=first.start.astimezone(tz).time(),
+                end_time=first.end.astimezone(tz).time(),
+                location=first.location,
+                description=first.description,
+                tz=tz,
+                instances=tuple(sorted((day, event.source_id) for day, event in by_day.items())),
+            )
+        )
+
+    if series:
+        covered = sum(len(s.instances) for s in series)
+        overrides = _count_overrides(series, singles, tz)
+        logging.info(
+            "Folded %d of %d lessons into %d weekly series (%d exceptions kept as single events)",
+            covered,
+            len(events),
+            len(series),
+            overrides,
+        )
+    return series, singles
+
+
+def _count_overrides(series: List[Series], singles: List[Event], tz: tzinfo) -> int:
+    skipped = {(s.title, s.start_time, day) for s in series for day in s.exdates}
+    return sum(
+        1
+        for event in singles
+        if (event.title, event.start.astimezone(tz).time(), event.start.astimezone(tz).date()) in skipped
+    )
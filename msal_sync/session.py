@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+SESSION_COOKIE_DOMAIN = "msal.ru"
+DEFAULT_REFRESH_MARGIN = timedelta(hours=6)
+
+
+@dataclass
+class SessionInfo:
+    checked_at: datetime
+    valid: bool
+    expires_at: Optional[datetime]
+
+
+def session_info_path(storage_state_path: str) -> Path:
+    path = Path(storage_state_path)
+    return path.with_name(path.stem + ".session.json")
+
+
+def cookie_expiry(storage_state_path: str, domain: str = SESSION_COOKIE_DOMAIN) -> Optional[datetime]:
+    # The earliest expiry of the portal's persistent cookies. Session cookies
+    # (expires == -1) carry no expiry and are ignored.
+    path = Path(storage_state_path)
+    if not path.exists():
+        return None
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+    expiries = [
+        cookie["expires"]
+        for cookie in state.get("cookies", [])
+        if domain in cookie.get("domain", "") and cookie.get("expires", -1) > 0
+    ]
+    if not expiries:
+        return None
+    return datetime.fromtimestamp(min(expiries), tz=timezone.utc)
+
+
+def record_session(storage_state_path: str, valid: bool) -> SessionInfo:
+    info = SessionInfo(
+        checked_at=datetime.now(timezone.utc),
+        valid=valid,
+        expires_at=cookie_expiry(storage_state_path),
+    )
+    data = {
+        "checked_at": info.checked_at.isoformat(),
+        "valid": info.valid,
+        "expires_at": info.expires_at.isoformat() if info.expires_at else None,
+    }
+    target = session_info_path(storage_state_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps(data), encoding="utf-8")
+    return info
+
+
+def load_session_info(storage_state_path: str) -> Optional[SessionInfo]:
+    path = session_info_path(storage_state_path)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        return None
+    return SessionInfo(
+        checked_at=datetime.fromisoformat(data["checked_at"]),
+        valid=data["valid"],
+        expires_at=datetime.fromisoformat(data["expires_at"]) if data.get("expires_at") else None,
+    )
+
+
+def needs_refresh(
+    storage_state_path: str, margin: timedelta = DEFAULT_REFRESH_MARGIN, now: Optional[datetime] = None
+) -> bool:
+    if not Path(storage_state_path).exists():
+        return True
+    now = now or datetime.now(timezone.utc)
+    info = load_session_info(storage_state_path)
+    if info is not None and not info.valid:
+        return True
+    expires_at = info.expires_at if info is not None and info.expires_at else cookie_expiry(storage_state_path)
+    return expires_at is not None and expires_at - margin <= now
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report whether a stored portal session needs refreshing")
+    parser.add_argument("storage_state", nargs="?", default="storage_state.json")
+    parser.add_argument("--margin-hours", type=float, default=DEFAULT_REFRESH_MARGIN.total_seconds() / 3600)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    info = load_session_info(args.storage_state)
+    expires_at = info.expires_at if info and info.expires_at else cookie_expiry(args.storage_state)
+    stale = needs_refresh(args.storage_state, timedelta(hours=args.margin_hours))
+    logging.info(
+        "Session %s: last checked %s, expires %s, %s",
+        args.storage_state,
+        info.checked_at.isoformat() if info else "never",
+        expires_at.isoformat() if expires_at else "unknown",
+        "refresh needed" if stale else "ok",
+    )
+    return 1 if stale else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
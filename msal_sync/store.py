@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .models import Event
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    account TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    week_start TEXT NOT NULL,
+    week_end TEXT NOT NULL,
+    title TEXT NOT NULL,
+    start_at TEXT NOT NULL,
+    end_at TEXT NOT NULL,
+    location TEXT,
+    description TEXT,
+    content_hash TEXT NOT NULL,
+    gcal_id TEXT,
+    etag TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    changed_at TEXT NOT NULL,
+    removed_at TEXT,
+    PRIMARY KEY (account, source_id)
+);
+CREATE INDEX IF NOT EXISTS events_by_week ON events (account, week_start);
+CREATE INDEX IF NOT EXISTS events_by_start ON events (account, start_at);
+"""
+
+# Content columns follow the parsed event; changed_at moves only when the
+# fingerprint differs or a removed lesson comes back.
+_UPSERT = """
+INSERT INTO events (
+    account, source_id, week_start, week_end, title, start_at, end_at, location, description,
+    content_hash, first_seen, last_seen, changed_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (account, source_id) DO UPDATE SET
+    week_start = excluded.week_start,
+    week_end = excluded.week_end,
+    title = excluded.title,
+    start_at = excluded.start_at,
+    end_at = excluded.end_at,
+    location = excluded.location,
+    description = excluded.description,
+    changed_at = CASE
+        WHEN events.content_hash != excluded.content_hash OR events.removed_at IS NOT NULL
+        THEN excluded.last_seen ELSE events.changed_at END,
+    content_hash = excluded.content_hash,
+    last_seen = excluded.last_seen,
+    removed_at = NULL
+"""
+
+
+@dataclass
+class Changes:
+    added: List[Event] = field(default_factory=list)
+    changed: List[Event] = field(default_factory=list)
+    removed: List[Event] = field(default_factory=list)
+
+
+def _row_event(row: sqlite3.Row) -> Event:
+    return Event(
+        title=row["title"],
+        start=datetime.fromisoformat(row["start_at"]),
+        end=datetime.fromisoformat(row["end_at"]),
+        location=row["location"],
+        description=row["description"],
+        source_id=row["source_id"],
+    )
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class EventStore:
+    """Parsed lessons per account in SQLite, keyed by source_id.
+
+    Every fetched week is recorded with first/last-seen times and the moment
+    its content last changed or disappeared; calendar writes add the Google
+    event id and etag. Reports and feeds are then local queries.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the pipeline's parse and sync threads, hence the lock.
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "EventStore":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+    def record_week(
+        self, account: str, from_date: date, to_date: date, events: Iterable[Event], seen_at: Optional[str] = None
+    ) -> None:
+        # Lessons of this week that were not seen now are marked removed.
+        seen_at = seen_at or _now()
+        week_start, week_end = from_date.isoformat(), to_date.isoformat()
+        rows = [
+            (
+                account,
+                e.source_id,
+                week_start,
+                week_end,
+                e.title,
+                e.start.isoformat(),
+                e.end.isoformat(),
+                e.location,
+                e.description,
+                e.fingerprint,
+                seen_at,
+                seen_at,
+                seen_at,
+            )
+            for e in events
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany(_UPSERT, rows)
+            self.conn.execute(
+                "UPDATE events SET removed_at = ? "
+                "WHERE account = ? AND week_start = ? AND removed_at IS NULL AND last_seen != ?",
+                (seen_at, account, week_start, seen_at),
+            )
+
+    def record_calendar_ids(self, account: str, ids: dict[str, Optional[tuple[str, Optional[str]]]]) -> None:
+        rows = [
+            (ref[0] if ref else None, ref[1] if ref else None, account, src_id) for src_id, ref in ids.items()
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE events SET gcal_id = ?, etag = ? WHERE account = ? AND source_id = ?", rows)
+
+    def events(
+        self,
+        account: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        include_removed: bool = False,
+    ) -> List[Event]:
+        query = "SELECT * FROM events WHERE account = ?"
+        params: list = [account]
+        if start is not None:
+            query += " AND week_start >= ?"
+            params.append(start.isoformat())
+        if end is not None:
+            query += " AND week_start <= ?"
+            params.append(end.isoformat())
+        if not include_removed:
+            query += " AND removed_at IS NULL"
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY start_at", params).fetchall()
+        return [_row_event(row) for row in rows]
+
+    def changes_since(self, account: str, since: datetime) -> Changes:
+        mark = since.astimezone(timezone.utc).isoformat(timespec="seconds")
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM events WHERE account = ? AND (changed_at >= ? OR removed_at >= ?) ORDER BY start_at",
+                (account, mark, mark),
+            ).fetchall()
+        changes = Changes()
+        for row in rows:
+            if row["removed_at"] is not None:
+                changes.removed.append(_row_event(row))
+            elif row["first_seen"] >= mark:
+                changes.added.append(_row_event(row))
+            else:
+                changes.changed.append(_row_event(row))
+        return changes
+
+    def calendar_id_of(self, account: str, source_id: str) -> Optional[tuple[str, Optional[str]]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT gcal_id, etag FROM events WHERE account = ? AND source_id = ?", (account, source_id)
+            ).fetchone()
+        if row is None or row["gcal_id"] is None:
+            return None
+        return row["gcal_id"], row["etag"]
+
+    def accounts(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT account FROM events ORDER BY account")]
+
+
+def open_event_store(settings) -> Optional[EventStore]:
+    if not settings.event_store_path:
+        return None
+    return EventStore(settings.event_store_path)
+
+
+def _print_events(marker: str, events: List[Event]) -> None:
+    for event in events:
+        print(f"{marker} {event.start:%Y-%m-%d %H:%M}-{event.end:%H:%M} {event.title} ({event.location or '-'})")
+
+
+def main() -> int:
+    from .config import get_settings
+    from .ics import write_ics_file
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Query the local event store")
+    parser.add_argument("--db", default=settings.event_store_path or "artifacts/events.sqlite")
+    parser.add_argument("--account", default=settings.account_name)
+    sub = parser.add_subparsers(dest="command", required=True)
+    changes_cmd = sub.add_parser("changes", help="Lessons added, changed or removed since a point in time")
+    changes_cmd.add_argument("--since", help="ISO date or datetime (default: 24 hours ago)")
+    ics_cmd = sub.add_parser("ics", help="Write the stored lessons as an ICS feed")
+    ics_cmd.add_argument("--output", default="artifacts/schedule.ics")
+    ics_cmd.add_argument("--start", help="First week (YYYY-MM-DD)")
+    ics_cmd.add_argument("--end", help="Last week (YYYY-MM-DD)")
+    sub.add_parser("accounts", help="List accounts in the store")
+    args = parser.parse_args()
+
+    with EventStore(args.db) as store:
+        if args.command == "changes":
+            if args.since:
+                since = datetime.fromisoformat(args.since)
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=settings.timezone)
+            else:
+                since = datetime.now(timezone.utc) - timedelta(days=1)
+            changes = store.changes_since(args.account, since)
+            _print_events("+", changes.added)
+            _print_events("~", changes.changed)
+            _print_events("-", changes.removed)
+            logging.info(
+                "%d added, %d changed, %d removed since %s",
+                len(changes.added),
+                len(changes.changed),
+                len(changes.removed),
+                since.isoformat(),
+            )
+        elif args.command == "ics":
+            events = store.events(
+                args.account,
+                start=date.fromisoformat(args.start) if args.start else None,
+                end=date.fromisoformat(args.end) if args.end else None,
+            )
+            write_ics_file(events, args.output, settings.timezone)
+        else:
+            for account in store.accounts():
+                print(account)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
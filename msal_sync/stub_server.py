@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Serves recorded week pages from artifacts/pages so a sync can be replayed
+# offline: MSAL_BASE_URL=http://127.0.0.1:8765 python main.py --backend replay
+
+
+def make_handler(pages_dir: Path):
+    class RecordedScheduleHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path != "/schedule" or "from" not in query or "to" not in query:
+                self.send_error(404)
+                return
+            page = pages_dir / f"{query['from'][0]}_{query['to'][0]}.html"
+            if not page.exists():
+                self.send_error(404, f"No recorded page {page.name}")
+                return
+            body = page.read_bytes()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            logging.debug("stub: " + format, *args)
+
+    return RecordedScheduleHandler
+
+
+def serve(pages_dir: str = "artifacts/pages", host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), make_handler(Path(pages_dir)))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve recorded schedule pages for offline runs")
+    parser.add_argument("--pages-dir", default="artifacts/pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    server = serve(args.pages_dir, args.host, args.port)
+    logging.info("Serving %s on http://%s:%d", args.pages_dir, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Awaitable, Callable, Iterator, List, Optional
+
+from playwright.async_api import Browser as AsyncBrowser
+
+from . import browser_async, metrics, schedule_async
+from .artifacts import open_artifacts
+from .browser import ensure_login
+from .cache import ScheduleCache, WeekDigests, events_digest
+from .config import Settings, contiguous_windows, daterange_weeks
+from .gcal import SyncResult, SyncState, build_service, sync_events
+from .ics import write_ics_file
+from .models import Event
+from .pipeline import DEFAULT_QUEUE_SIZE, WeekPage, run_pipeline
+from .portal import PortalClient
+from .schedule import (
+    DEFAULT_CONCURRENCY,
+    MAX_CONCURRENCY,
+    WeekTiming,
+    iter_week_html,
+    log_timing_summary,
+    readiness_from_settings,
+)
+from .series import DEFAULT_MIN_SERIES_LENGTH
+from .store import EventStore, open_event_store
+
+Windows = List[tuple[date, date]]
+Fetcher = Callable[[Settings, Windows, Optional[ScheduleCache]], List[Event]]
+AsyncFetcher = Callable[[Settings, Windows, Optional[ScheduleCache]], Awaitable[List[Event]]]
+PageStreamer = Callable[[Settings, Windows], Iterator[WeekPage]]
+
+
+@dataclass
+class SyncOptions:
+    start: Optional[date] = None
+    weeks: int = 4
+    dry_run: bool = False
+    delete_missing: bool = False
+    use_cache: bool = True
+    list_mode: str = "incremental"
+    full_resync: bool = False
+    ics: Optional[str] = None
+    ics_only: bool = False
+    series: bool = False
+
+
+async def fetch_account_async(
+    browser: AsyncBrowser,
+    settings: Settings,
+    windows: Windows,
+    cache: Optional[ScheduleCache] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    refresh: bool = False,
+) -> List[Event]:
+    # One context per account on a shared browser; the semaphore is shared
+    # too, so it bounds open pages across every account in the loop.
+    semaphore = semaphore or asyncio.Semaphore(DEFAULT_CONCURRENCY)
+    context = await browser_async.new_account_context(browser, settings)
+    timings: List[WeekTiming] = []
+    try:
+        async with semaphore:
+            page = await browser_async.login_context(context, settings, refresh=refresh)
+            await page.close()
+        return await schedule_async.fetch_schedule_for_weeks(
+            context,
+            windows,
+            settings.timezone,
+            semaphore=semaphore,
+            cache=cache,
+            readiness=readiness_from_settings(settings),
+            timings=timings,
+            artifacts=open_artifacts(settings),
+        )
+    finally:
+        log_timing_summary(timings)
+        await context.storage_state(path=settings.storage_state_path)
+        await context.close()
+
+
+async def fetch_with_browser_async(
+    settings: Settings,
+    windows: Windows,
+    cache: Optional[ScheduleCache] = None,
+    headful: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Event]:
+    playwright, browser, context, page = await browser_async.ensure_login(settings, headful=headful)
+    timings: List[WeekTiming] = []
+    try:
+        await page.close()
+        return await schedule_async.fetch_schedule_for_weeks(
+            context,
+            windows,
+            settings.timezone,
+            semaphore=asyncio.Semaphore(max(1, min(concurrency, MAX_CONCURRENCY))),
+            cache=cache,
+            readiness=readiness_from_settings(settings),
+            timings=timings,
+            artifacts=open_artifacts(settings),
+        )
+    finally:
+        log_timing_summary(timings)
+        await context.storage_state(path=settings.storage_state_path)
+        await context.close()
+        await browser.close()
+        await playwright.stop()
+
+
+def fetch_with_browser(
+    settings: Settings,
+    windows: Windows,
+    cache: Optional[ScheduleCache] = None,
+    headful: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Event]:
+    return asyncio.run(fetch_with_browser_async(settings, windows, cache, headful=headful, concurrency=concurrency))
+
+
+def stream_with_browser(
+    settings: Settings, windows: Windows, headful: bool = False, concurrency: int = DEFAULT_CONCURRENCY
+) -> Iterator[WeekPage]:
+    playwright, browser, context, page = ensure_login(settings, headful=headful)
+    timings: List[WeekTiming] = []
+    try:
+        yield from iter_week_html(
+            context,
+            windows,
+            concurrency=concurrency,
+            page=page,
+            readiness=readiness_from_settings(settings),
+            timings=timings,
+            artifacts=open_artifacts(settings),
+        )
+    finally:
+        log_timing_summary(timings)
+        context.storage_state(path=settings.storage_state_path)
+        context.close()
+        browser.close()
+        playwright.stop()
+
+
+def _open_portal(settings: Settings, concurrency: int) -> PortalClient:
+    return PortalClient.connect(settings.portal_base_url, pool_size=concurrency, artifacts=open_artifacts(settings))
+
+
+def stream_with_replay(
+    settings: Settings, windows: Windows, headful: bool = False, concurrency: int = DEFAULT_CONCURRENCY
+) -> Iterator[WeekPage]:
+    # Recorded pages from MSAL_BASE_URL (msal_sync.stub_server); headful is
+    # accepted so the browser and replay streamers share one signature.
+    client = _open_portal(settings, concurrency)
+    try:
+        yield from client.iter_week_html(windows, concurrency=concurrency)
+    finally:
+        client.close()
+
+
+def fetch_with_replay(
+    settings: Settings,
+    windows: Windows,
+    cache: Optional[ScheduleCache] = None,
+    headful: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> List[Event]:
+    client = _open_portal(settings, concurrency)
+    try:
+        return client.fetch_weeks(windows, settings.timezone, concurrency=concurrency, cache=cache)
+    finally:
+        client.close()
+
+
+def _plan_windows(settings: Settings, options: SyncOptions) -> tuple[Windows, Optional[ScheduleCache], Windows]:
+    start_date = options.start or datetime.now(settings.timezone).date()
+
+    windows = daterange_weeks(start_date, options.weeks)
+    cache = ScheduleCache.load(settings.schedule_cache_path) if options.use_cache else None
+    stale_windows = [w for w in windows if cache is None or not cache.is_fresh(*w)]
+    if len(stale_windows) < len(windows):
+        logging.info("%d of %d weeks are fresh in the cache", len(windows) - len(stale_windows), len(windows))
+    return windows, cache, stale_windows
+
+
+def _write_feed(
+    settings: Settings, options: SyncOptions, windows: Windows, cache: Optional[ScheduleCache], events: List[Event]
+) -> None:
+    if cache is not None:
+        events = [e for w in windows if (week := cache.get(*w)) is not None for e in week.events]
+    write_ics_file(events, options.ics, settings.timezone)
+
+
+class _CalendarWriter:
+    def __init__(self, settings: Settings, options: SyncOptions):
+        self.settings = settings
+        self.options = options
+        self.service = build_service(settings.google_client_secrets, settings.google_token_file)
+        self.state = None
+        if options.list_mode == "incremental":
+            self.state = SyncState.load(settings.gcal_state_path, settings.calendar_id)
+            if options.full_resync:
+                self.state.reset()
+
+    def sync_range(self, range_start: date, range_end: date, events: List[Event]) -> SyncResult:
+        with metrics.span("sync_range", start=range_start.isoformat(), end=range_end.isoformat()) as span:
+            result = self._sync_range(range_start, range_end, events)
+            span.attrs.update(events=len(events), succeeded=result.succeeded, failed=result.failed)
+        return result
+
+    def _sync_range(self, range_start: date, range_end: date, events: List[Event]) -> SyncResult:
+        tz = self.settings.timezone
+        return sync_events(
+            service=self.service,
+            calendar_id=self.settings.calendar_id,
+            parsed_events=events,
+            time_min=datetime.combine(range_start, datetime.min.time(), tzinfo=tz),
+            time_max=datetime.combine(range_end, datetime.max.time(), tzinfo=tz),
+            dry_run=self.options.dry_run,
+            delete_missing=self.options.delete_missing,
+            batch_size=self.settings.gcal_batch_size,
+            state=self.state,
+            server_filter=self.options.list_mode == "filtered",
+            series_min_length=DEFAULT_MIN_SERIES_LENGTH if self.options.series else 0,
+        )
+
+
+def _save_cache(cache: Optional[ScheduleCache], options: SyncOptions, result: SyncResult) -> None:
+    if cache is None or options.dry_run:
+        return
+    if result.failed:
+        logging.warning("%d calendar actions failed; schedule cache not updated", result.failed)
+    else:
+        cache.save()
+
+
+class _WeekLedger:
+    # Per-week digests of what the calendar last received. Only fetched weeks
+    # whose digest moved get listed, diffed and (with --delete-missing) pruned;
+    # --no-cache and --full-resync send every fetched week through again.
+
+    def __init__(self, settings: Settings, options: SyncOptions):
+        self.options = options
+        self.digests = WeekDigests.load(settings.week_digests_path, settings.calendar_id)
+        if options.full_resync:
+            self.digests.reset()
+        # Both options change what a week looks like in the calendar.
+        self.salt = f"series={int(options.series)};delete_missing={int(options.delete_missing)}"
+
+    def changed(self, window: tuple[date, date], events: List[Event]) -> Optional[str]:
+        digest = events_digest(events, self.salt)
+        if self.options.use_cache and self.digests.unchanged(*window, digest):
+            return None
+        return digest
+
+    def record(self, digests: dict[tuple[date, date], str], result: SyncResult) -> None:
+        if result.failed or self.options.dry_run:
+            return
+        for window, digest in digests.items():
+            self.digests.record(*window, digest)
+
+    def save(self) -> None:
+        if not self.options.dry_run:
+            self.digests.save()
+
+
+def _events_by_week(windows: Windows, events: List[Event]) -> dict[tuple[date, date], List[Event]]:
+    by_week: dict[tuple[date, date], List[Event]] = {window: [] for window in windows}
+    for event in events:
+        day = event.start.date()
+        for window in windows:
+            if window[0] <= day <= window[1]:
+                by_week[window].append(event)
+                break
+    return by_week
+
+
+def _open_store(settings: Settings, options: SyncOptions) -> Optional[EventStore]:
+    return None if options.dry_run else open_event_store(settings)
+
+
+def _sync_fetched(
+    settings: Settings,
+    options: SyncOptions,
+    windows: Windows,
+    cache: Optional[ScheduleCache],
+    fetched: Windows,
+    all_events: List[Event],
+) -> SyncResult:
+    store = _open_store(settings, options)
+    try:
+        return _sync_fetched_into(settings, options, windows, cache, fetched, all_events, store)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def _sync_fetched_into(
+    settings: Settings,
+    options: SyncOptions,
+    windows: Windows,
+    cache: Optional[ScheduleCache],
+    fetched: Windows,
+    all_events: List[Event],
+    store: Optional[EventStore],
+) -> SyncResult:
+    result = SyncResult()
+    if options.ics:
+        _write_feed(settings, options, windows, cache, all_events)
+    by_week = _events_by_week(fetched, all_events)
+    # An empty fetch only counts as "every lesson removed" where it would for the calendar.
+    if store is not None and (all_events or options.delete_missing):
+        for window, events in by_week.items():
+            store.record_week(settings.account_name, *window, events)
+    if options.ics_only:
+        return result
+    if not fetched:
+        logging.info("Every week is fresh in the cache; nothing to sync")
+        return result
+    if not all_events and not options.delete_missing:
+        logging.warning("No events parsed from %d fetched weeks; nothing to sync", len(fetched))
+        return result
+
+    ledger = _WeekLedger(settings, options)
+    changed = {w: d for w, events in by_week.items() if (d := ledger.changed(w, events)) is not None}
+    if not changed:
+        logging.info("No schedule changes since last run; nothing to sync")
+        _save_cache(cache, options, result)
+        return result
+    logging.info("%d of %d fetched weeks changed since the last sync", len(changed), len(fetched))
+
+    writer = _CalendarWriter(settings, options)
+    try:
+        for range_start, range_end in contiguous_windows(list(changed)):
+            range_weeks = {w: d for w, d in changed.items() if range_start <= w[0] <= range_end}
+            range_events = [e for w in range_weeks for e in by_week[w]]
+            range_result = writer.sync_range(range_start, range_end, range_events)
+            ledger.record(range_weeks, range_result)
+            if store is not None:
+                store.record_calendar_ids(settings.account_name, range_result.calendar_ids)
+            result.merge(range_result)
+    finally:
+        ledger.save()
+    _save_cache(cache, options, result)
+    return result
+
+
+def run_sync(settings: Settings, options: SyncOptions, fetch: Fetcher) -> SyncResult:
+    with metrics.bind_account(settings.account_name), metrics.span("sync", weeks=options.weeks):
+        windows, cache, stale_windows = _plan_windows(settings, options)
+        all_events: List[Event] = []
+        if stale_windows:
+            with metrics.span("fetch", weeks=len(stale_windows)) as span:
+                all_events = fetch(settings, stale_windows, cache)
+                span.attrs["events"] = len(all_events)
+        return _sync_fetched(settings, options, windows, cache, stale_windows, all_events)
+
+
+async def run_sync_async(settings: Settings, options: SyncOptions, fetch: AsyncFetcher) -> SyncResult:
+    with metrics.bind_account(settings.account_name), metrics.span("sync", weeks=options.weeks):
+        windows, cache, stale_windows = _plan_windows(settings, options)
+        all_events: List[Event] = []
+        if stale_windows:
+            with metrics.span("fetch", weeks=len(stale_windows)) as span:
+                all_events = await fetch(settings, stale_windows, cache)
+                span.attrs["events"] = len(all_events)
+        # The Calendar client blocks; a worker thread keeps other fetches in the loop moving.
+        return await asyncio.to_thread(_sync_fetched, settings, options, windows, cache, stale_windows, all_events)
+
+
+def run_sync_streaming(
+    settings: Settings, options: SyncOptions, stream: PageStreamer, queue_size: int = DEFAULT_QUEUE_SIZE
+) -> SyncResult:
+    with metrics.bind_account(settings.account_name), metrics.span("sync", weeks=options.weeks, stream=True):
+        return _run_sync_streaming(settings, options, stream, queue_size)
+
+
+def _run_sync_streaming(
+    settings: Settings, options: SyncOptions, stream: PageStreamer, queue_size: int
+) -> SyncResult:
+    windows, cache, stale_windows = _plan_windows(settings, options)
+    parsed: List[Event] = []
+    writer: Optional[_CalendarWriter] = None
+    ledger = None if options.ics_only else _WeekLedger(settings, options)
+    store = _open_store(settings, options)
+
+    def collect(from_date: date, to_date: date, events: List[Event]) -> None:
+        if options.ics and cache is None:
+            parsed.extend(events)
+        if store is not None and (events or options.delete_missing):
+            store.record_week(settings.account_name, from_date, to_date, events)
+
+    def sync_week(from_date: date, to_date: date, events: List[Event]) -> SyncResult:
+        nonlocal writer
+        if ledger is None or (not events and not options.delete_missing):
+            return SyncResult()
+        digest = ledger.changed((from_date, to_date), events)
+        if digest is None:
+            logging.info("Week %s - %s matches the last sync; skipping", from_date, to_date)
+            return SyncResult()
+        if writer is None:
+            writer = _CalendarWriter(settings, options)
+        week_result = writer.sync_range(from_date, to_date, events)
+        ledger.record({(from_date, to_date): digest}, week_result)
+        if store is not None:
+            store.record_calendar_ids(settings.account_name, week_result.calendar_ids)
+        return week_result
+
+    result = SyncResult()
+    try:
+        if stale_windows:
+            result = run_pipeline(
+                stream(settings, stale_windows),
+                settings.timezone,
+                sync_week,
+                cache=cache,
+                queue_size=queue_size,
+                on_parsed=collect,
+            )
+    finally:
+        if ledger is not None:
+            ledger.save()
+        if store is not None:
+            store.close()
+    if options.ics:
+        _write_feed(settings, options, windows, cache, parsed)
+    if ledger is not None:
+        _save_cache(cache, options, result)
+    return result
@@ -0,0 +1,34 @@
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from msal_sync.artifacts import BLOB_GRACE, ArtifactStore
+
+
+def test_prune_keeps_fresh_and_in_flight_blobs(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    week = date(2025, 9, 1)
+    fetched = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    dropped_capture = store.put("<html>old</html>", "default", week, week + timedelta(days=6), fetched_at=fetched)
+    kept = store.put("<html>new</html>", "default", week, week + timedelta(days=6), fetched_at=fetched)
+    blobs = tmp_path / "blobs" / "ab"
+    blobs.mkdir(parents=True, exist_ok=True)
+    in_flight = blobs / "ab12.html.gz.123.456.tmp"
+    in_flight.write_bytes(b"partial")
+    unindexed = blobs / "ab34.html.gz"
+    unindexed.write_bytes(b"written, index line pending")
+    stale = blobs / "ab56.html.gz"
+    stale.write_bytes(b"orphan")
+    old = time.time() - BLOB_GRACE.total_seconds() - 60
+    for path in (in_flight, stale, tmp_path / dropped_capture.blob, tmp_path / kept.blob):
+        os.utime(path, (old, old))
+
+    dropped, removed = store.prune(timedelta(days=30), now=fetched + timedelta(days=60))
+
+    assert dropped == 1
+    assert removed == 2  # the old capture's blob and the stale orphan
+    assert in_flight.exists()
+    assert unindexed.exists()
+    assert not stale.exists()
+    assert not (tmp_path / dropped_capture.blob).exists()
+    assert (tmp_path / kept.blob).exists()
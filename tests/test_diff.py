@@ -0,0 +1,50 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from benchmarks.synthetic import render_week
+from msal_sync.artifacts import ArtifactStore
+from msal_sync.diff import MOVED, archive_history, diff_events
+from msal_sync.models import Event
+
+TZ = ZoneInfo("Europe/Moscow")
+
+
+def _lesson(day: int, source_id: str) -> Event:
+    start = datetime(2025, 9, day, 9, 0, tzinfo=TZ)
+    return Event(
+        title="Право",
+        start=start,
+        end=start + timedelta(minutes=90),
+        location="101",
+        description=None,
+        source_id=source_id,
+    )
+
+
+def test_moved_lessons_pair_with_nearest_candidate():
+    old = [_lesson(3, "wed"), _lesson(1, "mon")]
+    new = [_lesson(2, "tue"), _lesson(4, "thu")]
+
+    changes = diff_events(old, new)
+
+    assert [change.kind for change in changes] == [MOVED, MOVED]
+    assert [(change.old.start.day, change.new.start.day) for change in changes] == [(1, 2), (3, 4)]
+
+
+def test_history_skips_corrupt_capture(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    week = date(2025, 9, 1)
+    first = render_week(week, seed=1)
+    corrupt = first.replace(">09:00<", ">29:00<")
+    assert corrupt != first
+    last = render_week(week, seed=2)
+    fetched = datetime(2025, 9, 1, tzinfo=timezone.utc)
+    for hours, html in enumerate((first, corrupt, last)):
+        store.put(html, "default", week, week + timedelta(days=6), fetched_at=fetched + timedelta(hours=hours))
+
+    diffs = list(archive_history(store, TZ, engine="bs4"))
+
+    assert len(diffs) == 1
+    assert diffs[0].before == fetched
+    assert diffs[0].after == fetched + timedelta(hours=2)
+    assert diffs[0].changes
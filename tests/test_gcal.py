@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from benchmarks.fake_calendar import FakeCalendarService, _Response
+from msal_sync.gcal import _execute, _is_throttled, execute_actions
+from msal_sync.models import Event
+from msal_sync.ratelimit import RateLimiter
+
+TZ = ZoneInfo("Europe/Moscow")
+
+
+def _limiter() -> RateLimiter:
+    return RateLimiter(quota_per_minute=6000, max_in_flight=8, sleep=lambda _seconds: None)
+
+
+def _event(index: int) -> Event:
+    start = datetime(2025, 9, 1, 9, 0, tzinfo=TZ) + timedelta(days=index)
+    return Event(
+        title=f"Lesson {index}",
+        start=start,
+        end=start + timedelta(minutes=90),
+        location=None,
+        description=None,
+        source_id=f"src{index}",
+    )
+
+
+def test_execute_retries_throttled_list_call():
+    service = FakeCalendarService()
+    service.inject_throttling(2, method="list")
+    limiter = _limiter()
+
+    response = _execute(service.events().list(calendarId="primary"), "list", limiter)
+
+    assert "items" in response
+    assert service.calls["throttled"] == 2
+    assert service.calls["list"] == 1
+    # Halved twice (8 -> 2), then one success adds 1/window.
+    assert limiter.window == 2.5
+
+
+def test_execute_actions_resends_only_throttled_sub_requests():
+    service = FakeCalendarService()
+    service.inject_throttling(2, method="insert")
+    events = [_event(i) for i in range(4)]
+    actions = [("CREATE", event, event.to_gcal_body(), None) for event in events]
+
+    result = execute_actions(service, "primary", actions, batch_size=10, limiter=_limiter())
+
+    assert result.succeeded == 4
+    assert result.failed == 0
+    assert result.retried == 2
+    assert service.calls["batch"] == 2
+    # Six insert attempts: four in the first batch, the two throttled ones again.
+    assert service.calls["insert"] + service.calls["throttled"] == 6
+    assert len(service.events_by_id) == 4
+    assert set(result.calendar_ids) == {event.source_id for event in events}
+
+
+def test_forbidden_without_reasons_counts_as_throttle():
+    assert _is_throttled(HttpError(_Response(403), b"{}"))
+    assert _is_throttled(HttpError(_Response(429), b"{}"))
+
+
+def test_forbidden_for_other_reasons_is_not_a_throttle():
+    body = b'{"error": {"code": 403, "message": "Forbidden", "errors": [{"reason": "forbidden"}]}}'
+    assert not _is_throttled(HttpError(_Response(403), body))
@@ -0,0 +1,48 @@
+from datetime import date
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from benchmarks.synthetic import render_week
+from msal_sync.parser import parse_events_from_html
+
+TZ = ZoneInfo("Europe/Moscow")
+
+_CARD_WITH_SCRIPT = (
+    '<div class="rounded shadow-md p-2">'
+    '<div class="flex"><span>09:00</span> - <span>10:30</span><span title="Лекция">Лекция</span></div>'
+    '<div class="mb-1"><button><div class="text-left">Право<script>var t = "12:00";</script></div></button></div>'
+    '<p class="text-[10px]">Ауд. 101<style>p { color: red }</style></p>'
+    '<p class="text-[12px]">Иванов И.И.<script>track("teacher")</script></p>'
+    "</div>"
+)
+
+
+def _with_card(html: str, card: str) -> str:
+    return html.replace('<div class="border cell">', f'<div class="border cell">{card}', 1)
+
+
+FIXTURES = {
+    "synthetic": render_week(date(2025, 9, 1), seed=3),
+    "script-in-card": _with_card(render_week(date(2025, 9, 8), seed=4), _CARD_WITH_SCRIPT),
+    "xml-prolog": '<?xml version="1.0" encoding="windows-1251"?>\n' + render_week(date(2025, 9, 15), seed=5),
+}
+
+
+@pytest.mark.filterwarnings("ignore::bs4.XMLParsedAsHTMLWarning")
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_engines_agree(name):
+    html = FIXTURES[name]
+
+    expected = parse_events_from_html(html, TZ, engine="bs4")
+
+    assert expected
+    assert parse_events_from_html(html, TZ, engine="lxml") == expected
+
+
+def test_script_text_stays_out_of_lessons():
+    events = parse_events_from_html(FIXTURES["script-in-card"], TZ, engine="lxml")
+    lesson = next(event for event in events if event.title == "Право")
+
+    assert lesson.location == "Ауд. 101"
+    assert "track" not in (lesson.description or "")
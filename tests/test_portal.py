@@ -0,0 +1,61 @@
+import threading
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from benchmarks.synthetic import render_week
+from msal_sync.artifacts import AccountArtifacts, ArtifactStore
+from msal_sync.parser import parse_events_from_html
+from msal_sync.portal import PortalClient, ScheduleNotRendered
+from msal_sync.stub_server import serve
+
+TZ = ZoneInfo("Europe/Moscow")
+WEEK = (date(2025, 9, 1), date(2025, 9, 7))
+
+
+@pytest.fixture
+def stub(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / f"{WEEK[0].isoformat()}_{WEEK[1].isoformat()}.html").write_text(render_week(WEEK[0]), encoding="utf-8")
+    shell = (WEEK[0] + timedelta(days=7), WEEK[1] + timedelta(days=7))
+    (pages / f"{shell[0].isoformat()}_{shell[1].isoformat()}.html").write_text(
+        '<html><body><div id="app"></div></body></html>', encoding="utf-8"
+    )
+    server = serve(str(pages), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    client = PortalClient.connect(
+        f"http://{host}:{port}", pool_size=2, artifacts=AccountArtifacts(ArtifactStore(str(tmp_path / "store")), "t")
+    )
+    try:
+        yield client, pages
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_replays_recorded_page(stub):
+    client, pages = stub
+    recorded = (pages / f"{WEEK[0].isoformat()}_{WEEK[1].isoformat()}.html").read_text(encoding="utf-8")
+
+    html = client.fetch_week_html(*WEEK)
+
+    assert html == recorded
+    assert client.fetch_week(*WEEK, TZ) == parse_events_from_html(recorded, TZ)
+    assert len(client.artifacts.store.snapshots()) == 2
+
+
+def test_app_shell_is_not_parsed_as_empty(stub):
+    client, _pages = stub
+
+    with pytest.raises(ScheduleNotRendered):
+        client.fetch_week_html(WEEK[0] + timedelta(days=7), WEEK[1] + timedelta(days=7))
+
+
+def test_live_portal_is_refused():
+    with pytest.raises(ScheduleNotRendered):
+        PortalClient.connect("https://lk.msal.ru")
@@ -0,0 +1,45 @@
+from msal_sync.ratelimit import RateLimiter
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_window_halves_on_throttle_and_grows_back_additively():
+    time = FakeTime()
+    limiter = RateLimiter(quota_per_minute=600, max_in_flight=16, clock=time.clock, sleep=time.sleep)
+
+    limiter.throttled()
+    assert limiter.window == 8
+    limiter.throttled()
+    assert limiter.window == 4
+
+    # One full window of successes adds one slot.
+    limiter.succeeded(4)
+    assert limiter.window == 5
+    limiter.succeeded(5)
+    assert limiter.window == 6
+    assert limiter.batch_size(50) == 6
+
+
+def test_throttle_drains_the_bucket():
+    time = FakeTime()
+    limiter = RateLimiter(quota_per_minute=60, max_in_flight=4, clock=time.clock, sleep=time.sleep)
+
+    with limiter.slot():
+        pass
+    assert time.sleeps == []
+
+    limiter.throttled()
+    with limiter.slot():
+        pass
+    assert time.sleeps == [1.0]  # one token at 60 per minute
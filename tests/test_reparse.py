@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+from benchmarks.synthetic import render_week
+from msal_sync.reparse import reparse_archive
+
+TZ = ZoneInfo("Europe/Moscow")
+
+
+def _write_week(pages_dir, start: date, html: str):
+    path = pages_dir / f"{start.isoformat()}_{(start + timedelta(days=6)).isoformat()}.html"
+    path.write_text(html, encoding="utf-8")
+    return path
+
+
+def test_corrupt_page_is_skipped(tmp_path):
+    weeks = [date(2025, 9, 1) + timedelta(days=7 * i) for i in range(3)]
+    pages = [render_week(start, seed=i) for i, start in enumerate(weeks)]
+    assert ">09:00<" in pages[1]
+    pages[1] = pages[1].replace(">09:00<", ">29:00<")
+    files = [_write_week(tmp_path, start, html) for start, html in zip(weeks, pages)]
+
+    events, stats = reparse_archive(files, TZ, engine="bs4", workers=2)
+
+    assert stats.files == 3
+    assert stats.failed == 1
+    assert events
+    assert all(not weeks[1] <= event.start.date() < weeks[2] for event in events)